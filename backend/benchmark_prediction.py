@@ -0,0 +1,526 @@
+"""
+Benchmark del Sistema de Predicción de Sentencias
+=================================================
+Mide el rendimiento de predict_api fuera del servidor HTTP para poder
+comparar cambios entre commits.
+
+Comandos:
+- latency: latencia por predicción de los modos 'reglas' y 'modelo'
+- features: memoria pico (RSS) del pipeline de características con N casos
+- startup: tiempo de importación, de arranque (liveness) y hasta estar listo (readiness)
+- evaluate: entrena con una partición de historical_cases y mide exactitud y
+  calibración por tipo de caso, tiempo de entrenamiento, latencia, throughput
+  por lotes y tamaño del modelo; con --onnx compara paridad y latencia con
+  ONNX Runtime
+
+Uso:
+    py benchmark_prediction.py latency --cases 500 --output bench_latency.json
+    py benchmark_prediction.py latency --db bench.db
+    py benchmark_prediction.py evaluate --db predictions.db --output eval.json
+    py benchmark_prediction.py evaluate --backend auto --latency-budget-ms 5
+    py benchmark_prediction.py evaluate --onnx
+    py benchmark_prediction.py features --rows 1000000
+    py benchmark_prediction.py features --text-featurizer hashing --jobs 4
+    py benchmark_prediction.py startup --runs 5
+"""
+
+import argparse
+import json
+import os
+import pickle
+import platform
+import random
+import sqlite3
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import scipy.sparse as sp
+
+from model_backends import BACKEND_CHOICES, DEFAULT_LATENCY_BUDGET_MS
+from prediction_db import init_predictions_db
+from prediction_features import TEXT_FEATURIZERS
+
+def percentile_summary(samples_ms: List[float]) -> Dict:
+    """Resumen de latencias en milisegundos"""
+    values = np.asarray(samples_ms)
+    return {
+        "n": int(values.size),
+        "mean": round(float(values.mean()), 4),
+        "p50": round(float(np.percentile(values, 50)), 4),
+        "p95": round(float(np.percentile(values, 95)), 4),
+        "p99": round(float(np.percentile(values, 99)), 4),
+        "max": round(float(values.max()), 4)
+    }
+
+def run_metadata() -> Dict:
+    """Datos del entorno para comparar corridas entre commits"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, timeout=5,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        commit = ""
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine()
+    }
+
+def peak_rss_mb() -> Optional[float]:
+    """Memoria residente pico del proceso en MB (None si no se puede medir)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta KB, macOS bytes
+        return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+    except ImportError:
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)
+        except Exception:
+            return None
+
+# Vocabulario para variar las descripciones sintéticas
+LEGAL_TERMS = [
+    "contrato", "arrendamiento", "incumplimiento", "indemnización", "perjuicios", "deuda",
+    "factura", "despido", "salario", "prestaciones", "custodia", "alimentos", "divorcio",
+    "sociedad", "accionistas", "competencia", "marca", "hurto", "lesiones", "estafa",
+    "fraude", "testigos", "peritaje", "embargo", "hipoteca", "pagaré", "herencia",
+    "sucesión", "tutela", "conciliación", "mediación", "apelación", "recurso", "nulidad"
+]
+
+def synthetic_frame(db_path: str, rows: int, seed: int = 42) -> Dict[str, list]:
+    """Columnas de casos sintéticos para medir el pipeline a escala"""
+    conn = sqlite3.connect(db_path)
+    templates = conn.execute('''
+        SELECT tipo_caso, descripcion, evidencias FROM historical_cases ORDER BY id LIMIT 1000
+    ''').fetchall()
+    conn.close()
+    if not templates:
+        raise SystemExit(f"No hay casos en historical_cases de {db_path} "
+                         "(genérelos con generate_synthetic_cases.py o import_historical_cases.py)")
+
+    rng = np.random.default_rng(seed)
+    template_idx = rng.integers(0, len(templates), rows)
+    term_idx = rng.integers(0, len(LEGAL_TERMS), (rows, 3))
+    return {
+        "tipo_caso": [templates[i][0] for i in template_idx],
+        "descripcion": [
+            f"{templates[i][1]} {LEGAL_TERMS[a]} {LEGAL_TERMS[b]} {LEGAL_TERMS[c]}"
+            for i, (a, b, c) in zip(template_idx, term_idx)
+        ],
+        "monto_disputa": rng.lognormal(10, 1.5, rows).round(-2).tolist(),
+        "complejidad": rng.choice(["baja", "media", "alta"], rows).tolist(),
+        "evidencias": [templates[i][2] for i in template_idx]
+    }
+
+def benchmark_features(args) -> Dict:
+    """Memoria y tiempo del pipeline disperso de características"""
+    from prediction_features import CaseFeaturePipeline
+
+    # Las descripciones se toman de historical_cases como plantilla
+    init_predictions_db(args.db)
+    rss_start = peak_rss_mb()
+    frame = synthetic_frame(args.db, args.rows, args.seed)
+    rss_frame = peak_rss_mb()
+
+    pipeline = CaseFeaturePipeline(max_features=args.max_features, text_featurizer=args.text_featurizer)
+    started = time.perf_counter()
+    pipeline.fit(frame)
+    # Bloques como en el entrenamiento, transformados en paralelo con --jobs
+    chunks = ({column: values[start:start + args.chunk_rows] for column, values in frame.items()}
+              for start in range(0, args.rows, args.chunk_rows))
+    X = sp.vstack(pipeline.transform_chunks(chunks, args.jobs), format="csr")
+    featurize_seconds = time.perf_counter() - started
+    rss_features = peak_rss_mb()
+
+    sparse_bytes = X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+    result = {
+        "benchmark": "features",
+        "rows": args.rows,
+        "text_featurizer": args.text_featurizer,
+        "jobs": args.jobs,
+        "pipeline_artifact_kb": round(len(pickle.dumps(pipeline)) / 1024, 1),
+        "n_features": X.shape[1],
+        "nnz": int(X.nnz),
+        "featurize_seconds": round(featurize_seconds, 2),
+        "sparse_matrix_mb": round(sparse_bytes / 2**20, 1),
+        "dense_float64_equivalent_mb": round(X.shape[0] * X.shape[1] * 8 / 2**20, 1),
+        "peak_rss_mb": {"start": rss_start, "after_input": rss_frame, "after_features": rss_features}
+    }
+
+    if args.train:
+        from sklearn.ensemble import RandomForestClassifier
+
+        y = np.random.default_rng(args.seed).choice(["favorable", "parcial", "desfavorable"], args.rows)
+        model = RandomForestClassifier(n_estimators=args.trees, max_depth=12, n_jobs=-1, random_state=42)
+        started = time.perf_counter()
+        model.fit(X, y)
+        result["train_seconds"] = round(time.perf_counter() - started, 2)
+        result["peak_rss_mb"]["after_train"] = peak_rss_mb()
+
+    return result
+
+def wait_for_model(system, timeout: float = 600):
+    """Esperar el entrenamiento en segundo plano del arranque o entrenar si no hay modelo"""
+    system.initialize()
+    deadline = time.time() + timeout
+    while system.retrain_status.get("state") == "running" and time.time() < deadline:
+        time.sleep(0.2)
+    if system.model is None:
+        system.train_model()
+
+def load_benchmark_cases(db_path: str, n: int, seed: int = 42):
+    """Construir casos de prueba a partir de historical_cases"""
+    from predict_api import CaseData
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT tipo_caso, descripcion, monto_disputa, complejidad, evidencias
+        FROM historical_cases
+        ORDER BY id
+        LIMIT 10000
+    ''').fetchall()
+    conn.close()
+
+    rng = random.Random(seed)
+    cases = []
+    for i in range(n):
+        tipo_caso, descripcion, monto, complejidad, evidencias = rows[i % len(rows)]
+        cases.append(CaseData(
+            tipo_caso=tipo_caso,
+            descripcion=descripcion,
+            monto_disputa=monto or 0,
+            complejidad=rng.choice(["baja", "media", "alta"]) if i >= len(rows) else complejidad,
+            evidencias=[e for e in (evidencias or "").split(",") if e]
+        ))
+    return cases
+
+def benchmark_latency(args) -> Dict:
+    """Latencia por predicción de cada modo sobre los mismos casos"""
+    from predict_api import prediction_system, PREDICTION_MODES
+
+    wait_for_model(prediction_system)
+    cases = load_benchmark_cases(args.db, args.cases, args.seed)
+    results = {}
+    for modo in PREDICTION_MODES:
+        # Calentamiento
+        for case in cases[:args.warmup]:
+            prediction_system.predict_case_outcome(case, modo)
+
+        samples = []
+        started = time.perf_counter()
+        for case in cases:
+            t0 = time.perf_counter()
+            prediction_system.predict_case_outcome(case, modo)
+            samples.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - started
+
+        results[modo] = {
+            "latency_ms": percentile_summary(samples),
+            "throughput_per_second": round(len(cases) / elapsed, 1)
+        }
+
+    return {"benchmark": "latency", "cases": len(cases), "modes": results}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def http_status(url: str) -> Optional[int]:
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        return None
+
+def benchmark_startup(args) -> Dict:
+    """Tiempo de importación de predict_api y de arranque de uvicorn hasta liveness y readiness"""
+    backend_dir = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import predict_api"], cwd=os.getcwd(), check=True,
+                       env={**os.environ, "PYTHONPATH": backend_dir}, capture_output=True)
+        import_seconds = time.perf_counter() - started
+
+        port = free_port()
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "predict_api:app", "--app-dir", backend_dir,
+             "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        live_seconds = ready_seconds = None
+        try:
+            deadline = started + args.timeout
+            while time.perf_counter() < deadline and ready_seconds is None:
+                if live_seconds is None and http_status(f"http://127.0.0.1:{port}/health/live") == 200:
+                    live_seconds = time.perf_counter() - started
+                if live_seconds is not None and http_status(f"http://127.0.0.1:{port}/health/ready") == 200:
+                    ready_seconds = time.perf_counter() - started
+                time.sleep(0.02)
+        finally:
+            server.terminate()
+            server.wait(timeout=10)
+
+        runs.append({
+            "import_seconds": round(import_seconds, 3),
+            "live_seconds": round(live_seconds, 3) if live_seconds is not None else None,
+            "ready_seconds": round(ready_seconds, 3) if ready_seconds is not None else None
+        })
+
+    def median(key):
+        values = [run[key] for run in runs if run[key] is not None]
+        return round(float(np.median(values)), 3) if values else None
+
+    return {
+        "benchmark": "startup",
+        "runs": runs,
+        "median": {key: median(key) for key in ("import_seconds", "live_seconds", "ready_seconds")}
+    }
+
+# Intervalos de la confianza predicha para el error de calibración esperado (ECE)
+CALIBRATION_BINS = 10
+
+def load_evaluation_frame(db_path: str, max_rows: Optional[int] = None):
+    """Casos históricos en orden de id (los primeros max_rows si se indica)"""
+    import pandas as pd
+    from model_training import iter_training_chunks, training_bounds
+
+    conn = sqlite3.connect(db_path)
+    max_historical_id = training_bounds(conn)[0]
+    conn.close()
+
+    chunks, rows = [], 0
+    # Sin predicciones resueltas (marca de agua 0): solo sentencias reales
+    for chunk in iter_training_chunks(db_path, (max_historical_id, 0)):
+        chunks.append(chunk)
+        rows += len(chunk)
+        if max_rows and rows >= max_rows:
+            break
+    if not chunks:
+        raise SystemExit(f"No hay casos en historical_cases de {db_path}")
+    frame = pd.concat(chunks, ignore_index=True)
+    return frame.iloc[:max_rows] if max_rows else frame
+
+def quality_metrics(y_true: np.ndarray, probabilities: np.ndarray, classes: np.ndarray,
+                    success_weights: np.ndarray) -> Dict:
+    """Exactitud, Brier multiclase, ECE y calibración de la probabilidad de éxito"""
+    predicted = classes[np.argmax(probabilities, axis=1)]
+    correct = predicted == y_true
+    one_hot = (y_true[:, None] == classes[None, :]).astype(float)
+
+    # ECE: diferencia entre confianza y exactitud por intervalo de confianza
+    confidence = probabilities.max(axis=1)
+    bins = np.minimum((confidence * CALIBRATION_BINS).astype(int), CALIBRATION_BINS - 1)
+    counts = np.bincount(bins, minlength=CALIBRATION_BINS)
+    gap = np.abs(np.bincount(bins, weights=correct, minlength=CALIBRATION_BINS)
+                 - np.bincount(bins, weights=confidence, minlength=CALIBRATION_BINS))
+
+    # Probabilidad de éxito prevista vs resultado observado (mismos pesos que predict_api)
+    predicted_success = probabilities @ success_weights
+    observed_success = one_hot @ success_weights
+    return {
+        "n": int(y_true.size),
+        "accuracy": round(float(correct.mean()), 4),
+        "brier": round(float(((probabilities - one_hot) ** 2).sum(axis=1).mean()), 4),
+        "ece": round(float(gap.sum() / max(counts.sum(), 1)), 4),
+        "success_probability_mean": round(float(predicted_success.mean()), 4),
+        "success_observed_mean": round(float(observed_success.mean()), 4),
+        "success_mae": round(float(np.abs(predicted_success - observed_success).mean()), 4)
+    }
+
+def directory_mb(path: str) -> float:
+    total = sum(os.path.getsize(os.path.join(root, name))
+                for root, _, names in os.walk(path) for name in names)
+    return round(total / 2**20, 2)
+
+EVALUATION_COLUMNS = ["tipo_caso", "descripcion", "monto_disputa", "complejidad", "evidencias"]
+
+def inference_timings(bundle, records: Dict[str, list], args) -> Dict:
+    """Latencia caso por caso (características + modelo) y throughput por lotes"""
+    n_cases = len(records["tipo_caso"])
+    single = [{c: records[c][i:i + 1] for c in EVALUATION_COLUMNS}
+              for i in range(min(args.latency_cases, n_cases))]
+    for case in single[:args.warmup]:
+        bundle.model.predict_proba(bundle.feature_pipeline.transform(case))
+    samples = []
+    for case in single:
+        t0 = time.perf_counter()
+        bundle.model.predict_proba(bundle.feature_pipeline.transform(case))
+        samples.append((time.perf_counter() - t0) * 1000)
+
+    started = time.perf_counter()
+    for start in range(0, n_cases, args.batch_size):
+        batch = {c: records[c][start:start + args.batch_size] for c in EVALUATION_COLUMNS}
+        bundle.model.predict_proba(bundle.feature_pipeline.transform(batch))
+    batch_seconds = time.perf_counter() - started
+
+    return {
+        "single_prediction_ms": percentile_summary(samples),
+        "batch": {"batch_size": args.batch_size, "cases_per_second": round(n_cases / batch_seconds, 1)}
+    }
+
+def benchmark_evaluate(args) -> Dict:
+    """Evaluación reproducible del modelo: calidad por tipo de caso y costo de entrenar y predecir"""
+    from model_backends import BACKEND_PARAMS, build_model, resolve_backend
+    from model_registry import ModelRegistry
+    from model_training import TEXT_MAX_FEATURES
+    from predict_api import MODEL_MMAP_MODE, OUTCOME_SUCCESS_WEIGHTS
+    from prediction_features import CaseFeaturePipeline
+
+    frame = load_evaluation_frame(args.db, args.max_rows)
+    order = np.random.default_rng(args.seed).permutation(len(frame))
+    n_test = max(1, int(len(frame) * args.test_size))
+    test = frame.iloc[order[:n_test]].reset_index(drop=True)
+    train = frame.iloc[order[n_test:]].reset_index(drop=True)
+
+    started = time.perf_counter()
+    pipeline = CaseFeaturePipeline(max_features=TEXT_MAX_FEATURES, text_featurizer=args.text_featurizer)
+    X_train = pipeline.fit_transform(train)
+    featurize_seconds = time.perf_counter() - started
+    y_train = train["resultado"].to_numpy(dtype=object)
+    started = time.perf_counter()
+    backend, selection = resolve_backend(args.backend, X_train, y_train, args.latency_budget_ms)
+    selection_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    model = build_model(backend).fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as models_dir:
+        # Mismo formato en disco y misma carga (mmap) que la API
+        registry = ModelRegistry(models_dir)
+        version = registry.save_version(model, pipeline, {"rows": len(train)})
+        bundle = registry.load(version, mmap_mode=MODEL_MMAP_MODE)
+        version_dir = registry.version_dir(version)
+        size = {
+            "total_mb": directory_mb(version_dir),
+            "joblib_mb": round(registry.metadata(version)["size_bytes"] / 2**20, 2),
+            "packed_forest_mb": (directory_mb(os.path.join(version_dir, "forest"))
+                                 if os.path.isdir(os.path.join(version_dir, "forest")) else None)
+        }
+
+        classes = np.asarray(bundle.model.classes_, dtype=object)
+        success_weights = np.array([OUTCOME_SUCCESS_WEIGHTS.get(c, 0.0) for c in classes])
+        probabilities = bundle.model.predict_proba(bundle.feature_pipeline.transform(test))
+        y_test = test["resultado"].to_numpy(dtype=object)
+        tipos = test["tipo_caso"].to_numpy(dtype=object)
+        quality = {"overall": quality_metrics(y_test, probabilities, classes, success_weights)}
+        quality["by_tipo_caso"] = {
+            tipo: quality_metrics(y_test[tipos == tipo], probabilities[tipos == tipo], classes, success_weights)
+            for tipo in sorted(set(tipos))
+        }
+
+        records = test[EVALUATION_COLUMNS].to_dict("list")
+        timings = inference_timings(bundle, records, args)
+
+        onnx = None
+        if args.onnx:
+            # Exportar con la verificación de paridad y medir lo mismo con ONNX Runtime
+            from model_onnx import export_version
+
+            X_test = bundle.feature_pipeline.transform(test)
+            export = export_version(registry, version, X_test, model)
+            onnx_bundle = registry.load(version, mmap_mode=MODEL_MMAP_MODE, runtime="onnx")
+            onnx_probabilities = onnx_bundle.model.predict_proba(X_test)
+            onnx = {
+                "runtime": onnx_bundle.runtime,
+                "export": export,
+                "test_max_abs_diff": float(np.abs(onnx_probabilities - probabilities).max()),
+                "test_argmax_agreement": round(float(np.mean(
+                    onnx_probabilities.argmax(axis=1) == probabilities.argmax(axis=1))), 6),
+                **inference_timings(onnx_bundle, records, args)
+            }
+            onnx["speedup_p50"] = round(timings["single_prediction_ms"]["p50"]
+                                        / onnx["single_prediction_ms"]["p50"], 2)
+
+    return {
+        "benchmark": "evaluate",
+        "db": args.db,
+        "seed": args.seed,
+        "rows": {"train": len(train), "test": len(test)},
+        "model": {"backend": backend, "text_featurizer": args.text_featurizer,
+                  "type": type(model).__name__, "params": BACKEND_PARAMS[backend],
+                  "n_features": X_train.shape[1], "inference": bundle.runtime},
+        "backend_selection": selection,
+        "quality": quality,
+        "training_seconds": {"features": round(featurize_seconds, 2), "fit": round(fit_seconds, 2),
+                             "backend_selection": round(selection_seconds, 2) if selection else None},
+        **timings,
+        "model_size": size,
+        "onnx": onnx
+    }
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Benchmark del sistema de predicción de sentencias")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    latency = subparsers.add_parser("latency", help="Latencia por predicción (reglas vs modelo)")
+    latency.add_argument("--cases", type=int, default=500)
+    latency.add_argument("--warmup", type=int, default=20)
+    latency.add_argument("--seed", type=int, default=42)
+    latency.set_defaults(handler=benchmark_latency)
+
+    features = subparsers.add_parser("features", help="Memoria pico del pipeline de características")
+    features.add_argument("--rows", type=int, default=1_000_000)
+    features.add_argument("--max-features", type=int, default=1000)
+    features.add_argument("--seed", type=int, default=42)
+    features.add_argument("--train", action="store_true", help="Entrenar también un bosque sobre la matriz")
+    features.add_argument("--trees", type=int, default=20)
+    features.add_argument("--text-featurizer", choices=TEXT_FEATURIZERS, default="tfidf")
+    features.add_argument("--jobs", type=int, default=1, help="Procesos para transformar los bloques")
+    features.add_argument("--chunk-rows", type=int, default=50000)
+    features.set_defaults(handler=benchmark_features)
+
+    startup = subparsers.add_parser("startup", help="Tiempo de arranque hasta liveness y readiness")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--timeout", type=float, default=600)
+    startup.set_defaults(handler=benchmark_startup)
+
+    evaluate = subparsers.add_parser("evaluate", help="Calidad y costo del modelo con una partición de prueba")
+    evaluate.add_argument("--test-size", type=float, default=0.2)
+    evaluate.add_argument("--max-rows", type=int, help="Usar solo los primeros N casos históricos")
+    evaluate.add_argument("--latency-cases", type=int, default=500)
+    evaluate.add_argument("--warmup", type=int, default=20)
+    evaluate.add_argument("--batch-size", type=int, default=100)
+    evaluate.add_argument("--seed", type=int, default=42)
+    evaluate.add_argument("--backend", choices=BACKEND_CHOICES, default="forest")
+    evaluate.add_argument("--text-featurizer", choices=TEXT_FEATURIZERS, default="tfidf")
+    evaluate.add_argument("--onnx", action="store_true",
+                          help="Exportar a ONNX y comparar paridad y latencia (requiere skl2onnx y onnxruntime)")
+    evaluate.add_argument("--latency-budget-ms", type=float, default=DEFAULT_LATENCY_BUDGET_MS,
+                          help="Latencia p99 máxima por predicción para --backend auto")
+    evaluate.set_defaults(handler=benchmark_evaluate)
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("--db", default=os.getenv("PREDICTIONS_DB_PATH", "predictions.db"),
+                               help="Base de predicciones (por defecto PREDICTIONS_DB_PATH)")
+        subparser.add_argument("--output", help="Guardar resultados en JSON")
+
+    args = parser.parse_args()
+    # predict_api (latency y el servidor de startup) lee la ruta al importarse: la misma base para todo
+    os.environ["PREDICTIONS_DB_PATH"] = args.db
+    report = {"run": run_metadata(), **args.handler(args)}
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados guardados en: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Caché de la Matriz de Entrenamiento
+===================================
+Guarda en disco las características de historical_cases para que un
+reentrenamiento solo lea y tokenice los casos agregados desde el anterior.
+
+- Con TF-IDF se guardan los conteos de todos los términos (sin tope de
+  vocabulario), no la matriz TF-IDF: el vocabulario y el idf se vuelven a
+  ajustar en cada entrenamiento a partir de los conteos (fit_counts), con
+  el mismo resultado que leer todos los textos otra vez
+- Con hashing (sin estado) se guardan directamente las columnas de texto
+- Las columnas estructuradas, los ids y los resultados van con cada bloque
+- Segmentos .npz + manifest.json por huella del pipeline (FEATURE_CACHE_PATH):
+  cambiar el featurizador o la normalización usa otra carpeta
+- Si historical_cases perdió filas ya guardadas, la caché se reconstruye
+
+Las predicciones con resultado real no se guardan: pueden resolverse en
+cualquier orden y son pocas frente a los casos históricos.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from prediction_features import COMPLEJIDADES, TIPOS_CASO, CaseFeaturePipeline
+
+logger = logging.getLogger(__name__)
+
+# Cambiar al modificar la tokenización o las columnas estructuradas para no reutilizar matrices viejas
+FEATURE_CACHE_VERSION = "1"
+
+MAX_SEGMENTS = 8
+MANIFEST_FILE = "manifest.json"
+
+CASE_COLUMNS = "id, tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado"
+
+def pipeline_fingerprint(pipeline: CaseFeaturePipeline) -> str:
+    """Huella de lo que determina las características guardadas (no incluye max_features)"""
+    vectorizer = pipeline.vectorizer
+    if pipeline.text_featurizer == "hashing":
+        text = {"n_features": vectorizer.n_features, "analyzer": vectorizer.analyzer.__name__,
+                "norm": vectorizer.norm, "alternate_sign": vectorizer.alternate_sign}
+    else:
+        stop_words = vectorizer.stop_words
+        text = {"stop_words": sorted(stop_words) if isinstance(stop_words, (list, set, frozenset)) else stop_words,
+                "lowercase": vectorizer.lowercase, "token_pattern": vectorizer.token_pattern,
+                "ngram_range": list(vectorizer.ngram_range), "strip_accents": vectorizer.strip_accents}
+    payload = json.dumps({"v": FEATURE_CACHE_VERSION, "featurizer": pipeline.text_featurizer, "text": text,
+                          "complejidades": COMPLEJIDADES, "tipos_caso": TIPOS_CASO}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class FeatureSegment:
+    """Bloque de casos: columnas de texto (conteos o hashing), estructuradas, ids y resultados"""
+
+    def __init__(self, text: sp.csr_matrix, structured: np.ndarray, ids: np.ndarray, labels: np.ndarray):
+        self.text = text
+        self.structured = structured
+        self.ids = ids
+        self.labels = labels
+
+    @property
+    def n_rows(self) -> int:
+        return self.text.shape[0]
+
+    def save(self, path: str):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp.npz"
+        np.savez(tmp_path, data=self.text.data, indices=self.text.indices, indptr=self.text.indptr,
+                 shape=np.asarray(self.text.shape), structured=self.structured, ids=self.ids,
+                 labels=self.labels.astype(str))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureSegment":
+        with np.load(path) as f:
+            text = sp.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+            return cls(text, f["structured"], f["ids"], f["labels"].astype(object))
+
+def _stack(segments: List[FeatureSegment], n_columns: int) -> FeatureSegment:
+    """Unir segmentos; los más viejos tienen menos columnas de conteo (términos nuevos al final)"""
+    texts = [sp.csr_matrix((s.text.data, s.text.indices, s.text.indptr), shape=(s.n_rows, n_columns))
+             for s in segments]
+    return FeatureSegment(
+        sp.vstack(texts, format="csr"),
+        np.vstack([s.structured for s in segments]),
+        np.concatenate([s.ids for s in segments]),
+        np.concatenate([s.labels for s in segments])
+    )
+
+class FeatureCache:
+    """Matriz de entrenamiento de historical_cases, persistida y ampliada por incrementos"""
+
+    def __init__(self, cache_dir: str, pipeline: CaseFeaturePipeline):
+        self.pipeline = pipeline
+        self.fingerprint = pipeline_fingerprint(pipeline)
+        self.cache_dir = os.path.join(cache_dir, self.fingerprint)
+        self.counts = pipeline.text_featurizer != "hashing"
+        self.terms: List[str] = []
+        self.term_index: Dict[str, int] = {}
+        self.segment_files: List[str] = []
+        self.segments: List[FeatureSegment] = []
+        self.last_id = 0
+
+    # === PERSISTENCIA ===
+
+    def load(self) -> bool:
+        """Cargar el manifest y los segmentos; False si no existen o están incompletos"""
+        try:
+            with open(os.path.join(self.cache_dir, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+            segments = [FeatureSegment.load(os.path.join(self.cache_dir, name)) for name in manifest["segments"]]
+        except (OSError, ValueError, KeyError) as e:
+            logger.info(f"No se pudo cargar la caché de características: {e}")
+            return False
+
+        self.terms = list(manifest.get("terms", []))
+        self.term_index = {term: i for i, term in enumerate(self.terms)}
+        self.segment_files = list(manifest["segments"])
+        self.segments = segments
+        self.last_id = manifest["last_id"]
+        return True
+
+    def _save(self, new_segments: List[FeatureSegment]):
+        """Guardar los segmentos nuevos y reemplazar el manifest de forma atómica"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        previous_files = list(self.segment_files)
+        files = list(self.segment_files)
+        if len(self.segments) + len(new_segments) > MAX_SEGMENTS:
+            # Compactar en un solo segmento
+            new_segments = [_stack(self.segments + new_segments, self.n_text_columns)]
+            self.segments, files = [], []
+        self.segments = self.segments + new_segments
+
+        for segment in new_segments:
+            name = f"segment-{uuid.uuid4().hex[:12]}.npz"
+            segment.save(os.path.join(self.cache_dir, name))
+            files.append(name)
+
+        manifest = {"fingerprint": self.fingerprint, "featurizer": self.pipeline.text_featurizer,
+                    "segments": files, "last_id": self.last_id, "rows": self.n_rows, "id_sum": self.id_sum,
+                    "terms": self.terms, "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        tmp_path = os.path.join(self.cache_dir, f"{MANIFEST_FILE}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(self.cache_dir, MANIFEST_FILE))
+        self.segment_files = files
+
+        # Segmentos reemplazados por la compactación
+        for name in set(previous_files) - set(files):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+
+    def _reset(self):
+        for name in self.segment_files + [MANIFEST_FILE]:
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
+        self.terms, self.term_index = [], {}
+        self.segments, self.segment_files = [], []
+        self.last_id = 0
+
+    @property
+    def n_rows(self) -> int:
+        return sum(segment.n_rows for segment in self.segments)
+
+    @property
+    def id_sum(self) -> int:
+        return sum(int(segment.ids.sum()) for segment in self.segments)
+
+    @property
+    def n_text_columns(self) -> int:
+        return len(self.terms) if self.counts else self.pipeline.n_text_features
+
+    def _consistent(self, db_path: str) -> bool:
+        """Los casos guardados siguen en historical_cases (la tabla solo crece; un borrado invalida)"""
+        conn = sqlite3.connect(db_path)
+        rows, id_sum = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(id), 0) FROM historical_cases WHERE id <= ?', (self.last_id,)
+        ).fetchone()
+        conn.close()
+        return rows == self.n_rows and id_sum == self.id_sum
+
+    # === CARACTERÍSTICAS ===
+
+    def _featurize(self, frame: pd.DataFrame) -> FeatureSegment:
+        """Características de un bloque; los términos nuevos se agregan al final de self.terms"""
+        if self.counts:
+            counts, chunk_terms = self.pipeline.count_text(frame)
+            for term in chunk_terms:
+                if term not in self.term_index:
+                    self.term_index[term] = len(self.terms)
+                    self.terms.append(term)
+            columns = np.fromiter((self.term_index[term] for term in chunk_terms), dtype=np.int32,
+                                  count=len(chunk_terms))
+            text = sp.csr_matrix((counts.data, columns[counts.indices], counts.indptr),
+                                 shape=(counts.shape[0], len(self.terms)))
+            text.sort_indices()
+        else:
+            text = self.pipeline.transform_text(frame).tocsr()
+        return FeatureSegment(text, self.pipeline.structured_features(frame).toarray(),
+                              frame["id"].to_numpy(dtype=np.int64), frame["resultado"].to_numpy(dtype=object))
+
+    def _iter_chunks(self, db_path: str, query: str, min_id: int, max_id: int,
+                     chunk_rows: int) -> Iterator[pd.DataFrame]:
+        conn = sqlite3.connect(db_path)
+        try:
+            last_id = min_id
+            while True:
+                chunk = pd.read_sql_query(query, conn, params=(last_id, max_id, chunk_rows))
+                if chunk.empty:
+                    return
+                last_id = int(chunk["id"].iloc[-1])
+                yield chunk
+        finally:
+            conn.close()
+
+    def training_matrix(self, db_path: str, bounds: Tuple[int, int],
+                        chunk_rows: int) -> Optional[Tuple[sp.csr_matrix, np.ndarray, Dict]]:
+        """Matriz y etiquetas de entrenamiento con los casos hasta bounds (ver training_bounds)
+
+        Se ajusta el pipeline (vocabulario e idf con TF-IDF) y se devuelven las
+        filas en el mismo orden que la lectura completa: casos históricos y
+        después predicciones resueltas, cada uno por id. None si no hay casos.
+        """
+        started = time.perf_counter()
+        max_historical_id, watermark = bounds
+        rebuilt = not self.load()
+        if not rebuilt and not self._consistent(db_path):
+            logger.warning("La caché de características no coincide con historical_cases; se reconstruye")
+            self._reset()
+            rebuilt = True
+        cached_rows = self.n_rows
+
+        new_segments = [self._featurize(chunk) for chunk in self._iter_chunks(
+            db_path, f'SELECT {CASE_COLUMNS} FROM historical_cases WHERE id > ? AND id <= ? ORDER BY id LIMIT ?',
+            self.last_id, max_historical_id, chunk_rows
+        )]
+        if new_segments:
+            self.last_id = int(new_segments[-1].ids[-1])
+            self._save([_stack(new_segments, self.n_text_columns)])
+        cache_seconds = time.perf_counter() - started
+
+        # Predicciones resueltas: se leen siempre (sus términos nuevos no se guardan)
+        feedback = [self._featurize(chunk) for chunk in self._iter_chunks(
+            db_path,
+            '''SELECT id, tipo_caso, descripcion, monto_disputa, complejidad, evidencias,
+                      resultado_real AS resultado
+               FROM case_predictions
+               WHERE id > ? AND resultado_seq <= ?
+               ORDER BY id LIMIT ?''',
+            0, watermark, chunk_rows
+        )]
+
+        segments = self.segments + feedback
+        if not segments:
+            return None
+        data = _stack(segments, self.n_text_columns)
+        if self.last_id > max_historical_id:
+            # Casos importados después de fijar bounds (otro entrenamiento amplió la caché)
+            keep = np.concatenate([self._historical_mask(max_historical_id),
+                                   np.ones(sum(s.n_rows for s in feedback), dtype=bool)])
+            data = FeatureSegment(data.text[keep], data.structured[keep], data.ids[keep], data.labels[keep])
+
+        if self.counts:
+            self.pipeline.fit_counts(data.text, self.terms)
+            X_text = self.pipeline.transform_counts(data.text, self.terms)
+        else:
+            X_text = data.text
+        X = sp.hstack([X_text, sp.csr_matrix(data.structured)], format="csr", dtype=np.float32)
+
+        stats = {
+            "fingerprint": self.fingerprint,
+            "rebuilt": rebuilt,
+            "cached_rows": int(cached_rows),
+            "new_rows": int(sum(s.n_rows for s in new_segments)),
+            "feedback_rows": int(sum(s.n_rows for s in feedback)),
+            "terms": len(self.terms) if self.counts else None,
+            "segments": len(self.segments),
+            "cache_seconds": round(cache_seconds, 3),
+            "total_seconds": round(time.perf_counter() - started, 3)
+        }
+        return X, data.labels, stats
+
+    def _historical_mask(self, max_id: int) -> np.ndarray:
+        return np.concatenate([segment.ids <= max_id for segment in self.segments])
@@ -0,0 +1,303 @@
+"""
+Generador de Casos Sintéticos a Escala
+======================================
+Crea millones de casos históricos y predicciones realistas para medir el
+entrenamiento, /predictions/stats y /predictions/history con volumen.
+
+- Vectorizado con NumPy y reproducible (--seed)
+- Todos los tipos de caso de predict_api, con sus resultados posibles
+- Resultados con señal aprendible: dependen de complejidad, evidencias,
+  monto y del tipo de descripción
+- Inserción masiva por bloques (executemany) con la base en modo WAL
+
+Uso:
+    py generate_synthetic_cases.py --historical 1000000 --predictions 500000
+    py generate_synthetic_cases.py --historical 50000 --seed 7 --db bench.db
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from prediction_db import CASE_TYPES, OUTCOME_SUCCESS_WEIGHTS, init_predictions_db
+
+# Descripciones típicas por tipo de caso
+DESCRIPTION_TEMPLATES = {
+    "civil": [
+        "Demanda por incumplimiento de contrato de arrendamiento",
+        "Daños y perjuicios por accidente de tránsito",
+        "Cobro de deuda comercial",
+        "Responsabilidad civil por mala praxis",
+        "Reivindicación de inmueble"
+    ],
+    "penal": [
+        "Hurto simple",
+        "Lesiones leves",
+        "Estafa",
+        "Apropiación indebida",
+        "Amenazas y coacciones"
+    ],
+    "laboral": [
+        "Despido injustificado",
+        "Pago de horas extras",
+        "Acoso laboral",
+        "Accidente de trabajo",
+        "Cobro de prestaciones sociales"
+    ],
+    "familia": [
+        "Divorcio contencioso",
+        "Custodia de menores",
+        "Pensión alimenticia",
+        "Régimen de visitas",
+        "Liquidación de sociedad conyugal"
+    ],
+    "comercial": [
+        "Incumplimiento de contrato comercial",
+        "Competencia desleal",
+        "Resolución de sociedad",
+        "Cobro de títulos valores",
+        "Infracción de marca"
+    ]
+}
+
+# Evidencias habituales por tipo de caso (cada caso toma un subconjunto)
+EVIDENCE_POOLS = {
+    "civil": ["contrato", "correspondencia", "testigos", "peritaje", "fotos", "facturas"],
+    "penal": ["testigos", "camaras", "certificado_medico", "documentos", "peritaje", "coartada"],
+    "laboral": ["contrato", "planillas", "horarios", "testigos", "correspondencia", "registros"],
+    "familia": ["documentos", "testigos", "informes_psicologicos", "documentos_ingresos", "gastos"],
+    "comercial": ["contratos", "correspondencia", "facturas", "estatutos", "libros_contables", "peritaje"]
+}
+
+# Términos que varían las descripciones
+DETAIL_TERMS = [
+    "con antecedentes", "sin antecedentes", "en primera instancia", "en apelación",
+    "con conciliación fallida", "con medidas cautelares", "con pruebas documentales",
+    "con testigos presenciales", "de cuantía menor", "de cuantía mayor", "con peritaje",
+    "con reincidencia", "con acuerdo parcial", "con embargo", "con recurso de nulidad"
+]
+
+# Monto en disputa: probabilidad de tener monto y media del logaritmo, por tipo
+AMOUNT_PROFILES = {
+    "civil": (0.9, 10.5), "penal": (0.3, 10.0), "laboral": (0.6, 9.5),
+    "familia": (0.4, 9.0), "comercial": (0.95, 11.5)
+}
+
+COMPLEJIDADES = np.array(["baja", "media", "alta"])
+INSERT_CHUNK_ROWS = 100_000
+
+def load_case_profiles() -> Dict:
+    """Tipos de caso y pesos de éxito tal como los usa predict_api"""
+    profiles = {}
+    for tipo, info in CASE_TYPES.items():
+        base = info["probabilidades_base"]
+        # Resultados ordenados de más a menos favorable para el cliente
+        outcomes = sorted(base, key=lambda label: -OUTCOME_SUCCESS_WEIGHTS.get(label, 0.0))
+        profiles[tipo] = {
+            "outcomes": outcomes,
+            "probabilities": [base[label] for label in outcomes],
+            "tiempo_promedio": info["tiempo_promedio"]
+        }
+    return profiles
+
+def evidence_strings(pool: List[str]) -> np.ndarray:
+    """Texto de evidencias para cada subconjunto del pool, indexado por máscara de bits"""
+    strings = np.empty(2 ** len(pool), dtype=object)
+    for mask in range(len(strings)):
+        strings[mask] = ",".join(item for bit, item in enumerate(pool) if mask >> bit & 1)
+    return strings
+
+def random_datetimes(rng: np.random.Generator, n: int, days: int) -> np.ndarray:
+    """Fechas aleatorias de los últimos `days` días con el formato de SQLite (YYYY-MM-DD HH:MM:SS)"""
+    now = np.datetime64(time.strftime("%Y-%m-%dT%H:%M:%S"), "s")
+    offsets = rng.integers(0, days * 86400, n).astype("timedelta64[s]")
+    return now - offsets
+
+def format_datetimes(values: np.ndarray) -> List[str]:
+    return np.char.replace(np.datetime_as_string(values, unit="s"), "T", " ").tolist()
+
+def generate_cases(n: int, rng: np.random.Generator, profiles: Dict) -> Dict[str, np.ndarray]:
+    """Casos sintéticos como columnas, incluido el resultado real"""
+    tipos = np.array(list(profiles))
+    tipo_idx = rng.integers(0, len(tipos), n)
+
+    complejidad_idx = rng.choice(3, n, p=[0.3, 0.45, 0.25])
+    detail_idx = rng.integers(0, len(DETAIL_TERMS), n)
+    template_idx = rng.integers(0, 5, n)
+
+    descripcion = np.empty(n, dtype=object)
+    evidencias = np.empty(n, dtype=object)
+    monto = np.zeros(n)
+    num_evidencias = np.zeros(n, dtype=np.int64)
+    base_success = np.zeros(n)
+    base_partial = np.zeros(n)
+    tiempo_base = np.zeros(n)
+    outcome_labels = np.empty((n, 3), dtype=object)
+
+    # Efecto fijo (según la semilla) de cada descripción sobre la probabilidad de éxito
+    template_effect = rng.normal(0, 0.08, (len(tipos), 5))
+    detail_effect = rng.normal(0, 0.04, len(DETAIL_TERMS))
+
+    for t, tipo in enumerate(tipos):
+        rows = np.flatnonzero(tipo_idx == t)
+        if rows.size == 0:
+            continue
+        templates = np.array(DESCRIPTION_TEMPLATES[tipo], dtype=object)
+        details = np.array(DETAIL_TERMS, dtype=object)
+        descripcion[rows] = templates[template_idx[rows]] + " " + details[detail_idx[rows]]
+
+        # Cada evidencia del pool aparece con probabilidad 0.4: máscara de bits -> texto
+        pool = EVIDENCE_POOLS[tipo]
+        present = rng.random((rows.size, len(pool))) < 0.4
+        masks = present @ (1 << np.arange(len(pool)))
+        evidencias[rows] = evidence_strings(pool)[masks]
+        num_evidencias[rows] = present.sum(axis=1)
+
+        has_amount, log_mean = AMOUNT_PROFILES[tipo]
+        amounts = np.round(rng.lognormal(log_mean, 1.2, rows.size), -2)
+        monto[rows] = np.where(rng.random(rows.size) < has_amount, amounts, 0.0)
+
+        profile = profiles[tipo]
+        base_success[rows] = profile["probabilities"][0] + template_effect[t, template_idx[rows]]
+        base_partial[rows] = profile["probabilities"][1]
+        tiempo_base[rows] = profile["tiempo_promedio"]
+        outcome_labels[rows] = profile["outcomes"]
+
+    # Probabilidad de éxito con la misma dirección que las reglas de predict_api
+    p_success = (
+        base_success
+        + detail_effect[detail_idx]
+        + np.minimum(num_evidencias * 0.05, 0.2)
+        + np.select([complejidad_idx == 0, complejidad_idx == 2], [0.1, -0.15], default=0.0)
+        - 0.05 * (monto > 100000)
+    )
+    p_success = np.clip(p_success, 0.02, 0.95)
+    p_partial = np.minimum(base_partial, 1 - p_success)
+
+    u = rng.random(n)
+    outcome_idx = np.where(u < p_success, 0, np.where(u < p_success + p_partial, 1, 2))
+    resultado = outcome_labels[np.arange(n), outcome_idx]
+
+    tiempo = np.maximum(
+        1, np.round(tiempo_base + 2 * (complejidad_idx == 2) + (monto > 100000) + rng.normal(0, 2, n))
+    ).astype(np.int64)
+
+    return {
+        "tipo_caso": tipos[tipo_idx],
+        "descripcion": descripcion,
+        "monto_disputa": monto,
+        "complejidad": COMPLEJIDADES[complejidad_idx],
+        "evidencias": evidencias,
+        "num_evidencias": num_evidencias,
+        "resultado": resultado,
+        "tiempo_resolucion": tiempo,
+        "p_success": p_success
+    }
+
+def insert_chunks(conn: sqlite3.Connection, sql: str, columns: List, total: int) -> None:
+    """executemany por bloques, una transacción por bloque"""
+    for start in range(0, total, INSERT_CHUNK_ROWS):
+        stop = min(start + INSERT_CHUNK_ROWS, total)
+        with conn:
+            conn.executemany(sql, zip(*(column[start:stop] for column in columns)))
+
+def generate_historical(conn: sqlite3.Connection, n: int, rng: np.random.Generator,
+                        profiles: Dict, days: int) -> None:
+    cases = generate_cases(n, rng, profiles)
+    insert_chunks(conn, '''
+        INSERT INTO historical_cases
+        (tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado, tiempo_resolucion, fecha_caso)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        cases["tipo_caso"].tolist(), cases["descripcion"].tolist(), cases["monto_disputa"].tolist(),
+        cases["complejidad"].tolist(), cases["evidencias"].tolist(), cases["resultado"].tolist(),
+        cases["tiempo_resolucion"].tolist(), format_datetimes(random_datetimes(rng, n, days))
+    ], n)
+
+def generate_predictions(conn: sqlite3.Connection, n: int, rng: np.random.Generator, profiles: Dict,
+                         days: int, resolved_fraction: float) -> None:
+    cases = generate_cases(n, rng, profiles)
+
+    # Predicción con ruido alrededor de la probabilidad real, como un modelo imperfecto
+    probabilidad = np.round(np.clip(cases["p_success"] + rng.normal(0, 0.1, n), 0.1, 0.95), 2)
+    tipo_sentencia = np.select([probabilidad > 0.7, probabilidad > 0.4],
+                               ["Favorable", "Parcialmente favorable"], default="Desfavorable")
+    tiempo_estimado = np.maximum(1, cases["tiempo_resolucion"] + rng.integers(-2, 3, n))
+
+    fecha_prediccion = random_datetimes(rng, n, days)
+    fecha_resolucion = fecha_prediccion + (cases["tiempo_resolucion"] * 30 * 86400).astype("timedelta64[s]")
+    # Solo pueden estar resueltos los casos cuya fecha de resolución ya pasó
+    resolved = (rng.random(n) < resolved_fraction) & (fecha_resolucion <= fecha_prediccion.max())
+    resolucion_str = np.array(format_datetimes(fecha_resolucion), dtype=object)
+
+    # Evidencias en JSON, como las guarda save_predictions
+    evidencias_json = [json.dumps(e.split(",") if e else []) for e in cases["evidencias"]]
+
+    insert_chunks(conn, '''
+        INSERT INTO case_predictions
+        (tipo_caso, descripcion, monto_disputa, complejidad, evidencias, probabilidad_exito,
+         tipo_sentencia_probable, tiempo_estimado, fecha_prediccion, resultado_real, fecha_resolucion,
+         modelo_version)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        cases["tipo_caso"].tolist(), cases["descripcion"].tolist(), cases["monto_disputa"].tolist(),
+        cases["complejidad"].tolist(), evidencias_json, probabilidad.tolist(), tipo_sentencia.tolist(),
+        tiempo_estimado.tolist(), format_datetimes(fecha_prediccion),
+        np.where(resolved, cases["resultado"], None).tolist(),
+        np.where(resolved, resolucion_str, None).tolist(),
+        [None] * n
+    ], n)
+
+    # Secuencia de resultado para las filas resueltas, por encima de la ya registrada
+    last_seq = conn.execute('SELECT COALESCE(MAX(resultado_seq), 0) FROM case_predictions').fetchone()[0]
+    conn.execute('''
+        UPDATE case_predictions SET resultado_seq = ? + id
+        WHERE resultado_real IS NOT NULL AND resultado_seq IS NULL
+    ''', (last_seq,))
+    conn.commit()
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Generar casos sintéticos a escala para benchmarks")
+    parser.add_argument("--historical", type=int, default=100_000, help="Casos históricos a generar")
+    parser.add_argument("--predictions", type=int, default=0, help="Predicciones a generar")
+    parser.add_argument("--resolved-fraction", type=float, default=0.3,
+                        help="Fracción de predicciones con resultado real")
+    parser.add_argument("--days", type=int, default=730, help="Rango de fechas hacia atrás")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", default="predictions.db")
+    args = parser.parse_args()
+
+    # Crea o migra las tablas sin los casos de ejemplo de predict_api: --seed determina el contenido
+    init_predictions_db(args.db)
+    profiles = load_case_profiles()
+
+    rng = np.random.default_rng(args.seed)
+    conn = sqlite3.connect(args.db)
+    # WAL y sin fsync por transacción: la generación se puede repetir si se interrumpe
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+
+    report = {"db": args.db, "seed": args.seed}
+    for name, count, generate in (
+        ("historical_cases", args.historical,
+         lambda n: generate_historical(conn, n, rng, profiles, args.days)),
+        ("case_predictions", args.predictions,
+         lambda n: generate_predictions(conn, n, rng, profiles, args.days, args.resolved_fraction)),
+    ):
+        if count <= 0:
+            continue
+        started = time.perf_counter()
+        generate(count)
+        elapsed = time.perf_counter() - started
+        report[name] = {"rows": count, "seconds": round(elapsed, 2), "rows_per_second": round(count / elapsed)}
+
+    conn.close()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Stub local de la Graph API de Meta (mensajes)
+=============================================
+Servidor que imita los endpoints de envío de mensajes de WhatsApp Business
+Cloud API y Facebook Messenger para probar webhook_integrations sin salir
+de la máquina.
+
+Funcionalidades:
+- POST /{version}/{phone_number_id}/messages (WhatsApp)
+- POST /{version}/me/messages (Messenger)
+- Latencia configurable (base + jitter)
+- Tasa de errores 500 configurable
+- Respuestas 429 por tasa aleatoria o por límite de RPS
+- Contadores en /stub/stats
+
+Uso:
+    py graph_api_stub.py --port 8010 --latency-ms 80 --jitter-ms 40 --error-rate 0.01 --max-rps 200
+    set GRAPH_API_URL=http://localhost:8010/v17.0  (antes de iniciar webhook_integrations.py)
+"""
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from collections import Counter
+
+app = FastAPI(
+    title="Graph API Stub",
+    description="Imitación local de la Graph API de mensajes para pruebas de carga",
+    version="1.0.0"
+)
+
+# Configuración (variables de entorno o argumentos de línea de comandos)
+STUB_CONFIG = {
+    "latency_ms": float(os.getenv("STUB_LATENCY_MS", "50")),
+    "jitter_ms": float(os.getenv("STUB_JITTER_MS", "20")),
+    "error_rate": float(os.getenv("STUB_ERROR_RATE", "0")),
+    "rate_limit_rate": float(os.getenv("STUB_RATE_LIMIT_RATE", "0")),
+    "max_rps": float(os.getenv("STUB_MAX_RPS", "0")),
+    "retry_after": int(os.getenv("STUB_RETRY_AFTER", "1"))
+}
+
+stats = Counter()
+started_at = time.time()
+
+class TokenBucket:
+    """Limitador de tasa simple para simular el throttling de la Graph API"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated_at = time.monotonic()
+
+    def take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+bucket = TokenBucket(STUB_CONFIG["max_rps"])
+
+def graph_error(status_code: int, code: int, message: str, headers: dict = None) -> JSONResponse:
+    """Respuesta de error con el formato de la Graph API"""
+    return JSONResponse(
+        status_code=status_code,
+        headers=headers,
+        content={
+            "error": {
+                "message": message,
+                "type": "OAuthException",
+                "code": code,
+                "fbtrace_id": uuid.uuid4().hex[:16]
+            }
+        }
+    )
+
+@app.post("/{version}/{phone_number_id}/messages")
+async def send_message(version: str, phone_number_id: str, request: Request):
+    """Imitar el envío de un mensaje de WhatsApp o Messenger"""
+    stats["requests"] += 1
+    body = await request.json()
+
+    # Límite de tasa (antes de la latencia, como hace la Graph API)
+    if not bucket.take() or random.random() < STUB_CONFIG["rate_limit_rate"]:
+        stats["429"] += 1
+        return graph_error(429, 130429, "Rate limit hit",
+                           headers={"Retry-After": str(STUB_CONFIG["retry_after"])})
+
+    delay = STUB_CONFIG["latency_ms"] + random.uniform(-1, 1) * STUB_CONFIG["jitter_ms"]
+    await asyncio.sleep(max(0.0, delay) / 1000)
+
+    if random.random() < STUB_CONFIG["error_rate"]:
+        stats["500"] += 1
+        return graph_error(500, 1, "An unknown error has occurred.")
+
+    stats["200"] += 1
+
+    # Messenger: recipient/message; WhatsApp: messaging_product/to
+    if phone_number_id == "me":
+        recipient_id = body.get("recipient", {}).get("id", "")
+        return {"recipient_id": recipient_id, "message_id": f"m_{uuid.uuid4().hex}"}
+
+    to = body.get("to", "")
+    return {
+        "messaging_product": "whatsapp",
+        "contacts": [{"input": to, "wa_id": to}],
+        "messages": [{"id": f"wamid.{uuid.uuid4().hex.upper()}"}]
+    }
+
+@app.get("/stub/stats")
+async def get_stub_stats():
+    """Contadores de solicitudes atendidas por el stub"""
+    elapsed = time.time() - started_at
+    return {
+        "config": STUB_CONFIG,
+        "uptime_seconds": round(elapsed, 1),
+        "counts": dict(stats),
+        "avg_rps": round(stats["requests"] / elapsed, 2) if elapsed > 0 else 0
+    }
+
+@app.post("/stub/reset")
+async def reset_stub_stats():
+    """Reiniciar contadores"""
+    global started_at
+    stats.clear()
+    started_at = time.time()
+    return {"status": "ok"}
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub local de la Graph API de mensajes")
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--latency-ms", type=float, default=STUB_CONFIG["latency_ms"])
+    parser.add_argument("--jitter-ms", type=float, default=STUB_CONFIG["jitter_ms"])
+    parser.add_argument("--error-rate", type=float, default=STUB_CONFIG["error_rate"],
+                        help="Fracción de respuestas 500 (0-1)")
+    parser.add_argument("--rate-limit-rate", type=float, default=STUB_CONFIG["rate_limit_rate"],
+                        help="Fracción de respuestas 429 aleatorias (0-1)")
+    parser.add_argument("--max-rps", type=float, default=STUB_CONFIG["max_rps"],
+                        help="Solicitudes por segundo antes de responder 429 (0 = sin límite)")
+    parser.add_argument("--retry-after", type=int, default=STUB_CONFIG["retry_after"])
+    args = parser.parse_args()
+
+    STUB_CONFIG.update(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        max_rps=args.max_rps,
+        retry_after=args.retry_after
+    )
+    bucket = TokenBucket(args.max_rps)
+
+    uvicorn.run(app, host="0.0.0.0", port=args.port)
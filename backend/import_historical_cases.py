@@ -0,0 +1,164 @@
+"""
+Importador de Casos Históricos
+==============================
+Carga sentencias reales en historical_cases desde archivos CSV, JSONL o
+Parquet, leyendo y escribiendo por bloques para no cargar el archivo en
+memoria.
+
+Columnas: tipo_caso, descripcion, resultado (obligatorias), monto_disputa,
+complejidad, evidencias (lista, JSON o texto separado por comas),
+tiempo_resolucion, fecha_caso.
+
+Parquet requiere pyarrow (opcional).
+
+Uso:
+    py import_historical_cases.py sentencias.csv --db predictions.db
+    py import_historical_cases.py sentencias.parquet --chunk-size 20000
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from prediction_db import init_predictions_db
+from prediction_features import COMPLEJIDADES, split_evidencias
+
+IMPORT_FORMATS = ("csv", "jsonl", "parquet")
+FORMAT_EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".parquet": "parquet"}
+DEFAULT_CHUNK_SIZE = 5000
+
+# Errores de validación que se informan (el resto solo se cuenta)
+MAX_REPORTED_ERRORS = 20
+
+INSERT_SQL = '''
+    INSERT INTO historical_cases
+    (tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado, tiempo_resolucion, fecha_caso)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def detect_format(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMAT_EXTENSIONS:
+        raise ValueError(f"No se reconoce el formato de {path}. Use: {', '.join(IMPORT_FORMATS)}")
+    return FORMAT_EXTENSIONS[extension]
+
+def iter_records(path: str, fmt: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict]:
+    """Registros del archivo uno a uno, sin leerlo completo"""
+    if fmt == "csv":
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            yield from csv.DictReader(f)
+    elif fmt == "jsonl":
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == "parquet":
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError("Importar Parquet requiere pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Formato inválido: {fmt}. Use: {', '.join(IMPORT_FORMATS)}")
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+def normalize_record(record: Dict) -> Tuple:
+    """Fila lista para historical_cases; ValueError si faltan datos obligatorios"""
+    tipo_caso = _text(record.get("tipo_caso")).lower()
+    descripcion = _text(record.get("descripcion"))
+    resultado = _text(record.get("resultado")).lower()
+    missing = [name for name, value in
+               (("tipo_caso", tipo_caso), ("descripcion", descripcion), ("resultado", resultado)) if not value]
+    if missing:
+        raise ValueError(f"faltan columnas obligatorias: {', '.join(missing)}")
+
+    monto = _text(record.get("monto_disputa"))
+    complejidad = _text(record.get("complejidad")).lower() or "media"
+    if complejidad not in COMPLEJIDADES:
+        raise ValueError(f"complejidad inválida: {complejidad}")
+    evidencias = record.get("evidencias")
+    tiempo = _text(record.get("tiempo_resolucion"))
+
+    return (
+        tipo_caso,
+        descripcion,
+        float(monto) if monto else 0.0,
+        complejidad,
+        ",".join(e.strip() for e in split_evidencias(evidencias) if e and e.strip()),
+        resultado,
+        int(float(tiempo)) if tiempo else None,
+        _text(record.get("fecha_caso")) or None
+    )
+
+def chunked(records: Iterable, size: int) -> Iterator[List]:
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def import_cases(db_path: str, path: str, fmt: Optional[str] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Importar un archivo a historical_cases con executemany por bloque (una transacción por bloque)"""
+    fmt = fmt or detect_format(path)
+    started = time.perf_counter()
+    stats = {"format": fmt, "read": 0, "inserted": 0, "rejected": 0, "errors": [],
+             "first_id": None, "last_id": None}
+
+    conn = sqlite3.connect(db_path)
+    try:
+        for chunk in chunked(iter_records(path, fmt, chunk_size), chunk_size):
+            rows = []
+            for record in chunk:
+                stats["read"] += 1
+                try:
+                    rows.append(normalize_record(record))
+                except (ValueError, TypeError, AttributeError) as e:
+                    stats["rejected"] += 1
+                    if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                        stats["errors"].append({"registro": stats["read"], "error": str(e)})
+            if not rows:
+                continue
+
+            with conn:
+                conn.executemany(INSERT_SQL, rows)
+            last_id = conn.execute('SELECT last_insert_rowid()').fetchone()[0]
+            if stats["first_id"] is None:
+                stats["first_id"] = last_id - len(rows) + 1
+            stats["last_id"] = last_id
+            stats["inserted"] += len(rows)
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 3)
+    stats["rows_per_second"] = round(stats["inserted"] / elapsed, 1) if elapsed > 0 else None
+    return stats
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Importar casos históricos a predictions.db")
+    parser.add_argument("path", help="Archivo CSV, JSONL o Parquet")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="Por defecto según la extensión")
+    parser.add_argument("--db", default="predictions.db")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    # Crea o migra las tablas sin agregar casos de ejemplo
+    init_predictions_db(args.db)
+
+    stats = import_cases(args.db, args.path, args.format, args.chunk_size)
+    print(json.dumps(stats, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
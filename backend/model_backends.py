@@ -0,0 +1,130 @@
+"""
+Modelos Disponibles para la Predicción de Sentencias
+====================================================
+Estimadores de sklearn que se pueden entrenar sobre la matriz dispersa de
+CaseFeaturePipeline, elegidos con MODEL_BACKEND:
+
+- forest: RandomForestClassifier de 100 árboles (el modelo original)
+- linear: regresión logística entrenada con SGD; admite partial_fit
+- gbt: GradientBoostingClassifier pequeño (50 etapas de profundidad 3)
+- auto: entrena los tres sobre una muestra y elige el más exacto cuya
+  latencia p99 por predicción cumple el presupuesto (MODEL_LATENCY_BUDGET_MS)
+
+sklearn se importa al construir un modelo, no al importar el módulo, para
+que predict_api pueda leer las constantes sin demorar el arranque.
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from packed_forest import PackedForest
+
+MODEL_BACKENDS = ("forest", "linear", "gbt")
+BACKEND_CHOICES = MODEL_BACKENDS + ("auto",)
+
+# Modelos que se pueden actualizar con los resultados reales sin reentrenar desde cero
+INCREMENTAL_BACKENDS = ("forest", "linear")
+
+BACKEND_PARAMS: Dict[str, Dict] = {
+    "forest": {"n_estimators": 100, "random_state": 42},
+    "linear": {"loss": "log_loss", "alpha": 1e-4, "max_iter": 50, "tol": 1e-4, "random_state": 42},
+    "gbt": {"n_estimators": 50, "max_depth": 3, "learning_rate": 0.1, "subsample": 0.5, "random_state": 42}
+}
+
+DEFAULT_LATENCY_BUDGET_MS = 20.0
+
+# Selección automática: casos de la muestra, fracción de validación y predicciones medidas
+SELECTION_ROWS = 50000
+SELECTION_VALIDATION = 0.2
+LATENCY_SAMPLES = 200
+
+def build_model(backend: str):
+    """Estimador sin entrenar para el backend indicado"""
+    if backend == "forest":
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(**BACKEND_PARAMS["forest"])
+    if backend == "linear":
+        from sklearn.linear_model import SGDClassifier
+        return SGDClassifier(**BACKEND_PARAMS["linear"])
+    if backend == "gbt":
+        from sklearn.ensemble import GradientBoostingClassifier
+        return GradientBoostingClassifier(**BACKEND_PARAMS["gbt"])
+    raise ValueError(f"MODEL_BACKEND inválido: {backend}. Use: {', '.join(BACKEND_CHOICES)}")
+
+def serving_model(model):
+    """El modelo tal como predice la API: los bosques se usan empaquetados (ver packed_forest)"""
+    return PackedForest.from_model(model) or model
+
+def prediction_latency_ms(model, X, n_samples: int = LATENCY_SAMPLES) -> Dict[str, float]:
+    """Latencia de predict_proba caso por caso sobre las primeras filas de X"""
+    model = serving_model(model)
+    rows = [X[i:i + 1] for i in range(min(n_samples, X.shape[0]))]
+    for row in rows[:10]:
+        model.predict_proba(row)
+    samples = []
+    for row in rows:
+        started = time.perf_counter()
+        model.predict_proba(row)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"p50": round(float(np.percentile(samples, 50)), 3),
+            "p99": round(float(np.percentile(samples, 99)), 3)}
+
+def evaluation_split(n_rows: int, seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """Índices de entrenamiento y de validación de una muestra de hasta SELECTION_ROWS casos
+
+    La misma partición sirve para elegir el backend y para medir la exactitud
+    en casos reservados de la versión, sin entrenar otra vez con todo X.
+    """
+    rng = np.random.default_rng(seed)
+    sample = rng.permutation(n_rows)[:SELECTION_ROWS]
+    n_validation = max(1, int(sample.size * SELECTION_VALIDATION))
+    return sample[n_validation:], sample[:n_validation]
+
+def select_backend(X, y, latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS,
+                   backends: List[str] = MODEL_BACKENDS, seed: int = 42) -> Tuple[str, Dict]:
+    """Elegir el backend más exacto que cumple el presupuesto de latencia p99
+
+    Cada candidato se entrena con una muestra de X y se valida con casos
+    reservados (evaluation_split); si ninguno cumple el presupuesto se elige
+    el más rápido. Devuelve el backend y el detalle de la comparación.
+    """
+    train, validation = evaluation_split(X.shape[0], seed)
+    X_train, y_train = X[train], y[train]
+    X_validation, y_validation = X[validation], y[validation]
+
+    candidates = {}
+    for backend in backends:
+        started = time.perf_counter()
+        model = build_model(backend).fit(X_train, y_train)
+        fit_seconds = time.perf_counter() - started
+        latency = prediction_latency_ms(model, X_validation)
+        candidates[backend] = {
+            "accuracy": round(float(np.mean(model.predict(X_validation) == y_validation)), 4),
+            "latency_ms": latency,
+            "fit_seconds": round(fit_seconds, 2),
+            "within_budget": latency["p99"] <= latency_budget_ms
+        }
+
+    eligible = [b for b in backends if candidates[b]["within_budget"]]
+    if eligible:
+        chosen = max(eligible, key=lambda b: candidates[b]["accuracy"])
+    else:
+        chosen = min(backends, key=lambda b: candidates[b]["latency_ms"]["p99"])
+    return chosen, {
+        "latency_budget_ms": latency_budget_ms,
+        "rows": {"train": int(train.size), "validation": int(validation.size)},
+        "candidates": candidates,
+        "chosen": chosen
+    }
+
+def resolve_backend(backend: Optional[str], X, y,
+                    latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS) -> Tuple[str, Optional[Dict]]:
+    """Backend a entrenar y, en modo auto, la comparación que lo eligió"""
+    backend = backend or "forest"
+    if backend == "auto":
+        return select_backend(X, y, latency_budget_ms)
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"MODEL_BACKEND inválido: {backend}. Use: {', '.join(BACKEND_CHOICES)}")
+    return backend, None
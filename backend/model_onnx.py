@@ -0,0 +1,187 @@
+"""
+Exportación del Modelo a ONNX
+=============================
+Convierte el clasificador de una versión del registro a ONNX (skl2onnx) y lo
+ejecuta con ONNX Runtime en CPU, con el modelo de sklearn como respaldo.
+
+Las características se siguen calculando con CaseFeaturePipeline: el
+analizador en español, el hashing y las columnas estructuradas no tienen
+equivalente en los operadores de texto de ONNX, y son la parte barata de la
+predicción. Lo que se acelera es el clasificador (recorrido de árboles).
+
+Al exportar se verifica la paridad con predict_proba de sklearn sobre casos
+reales; si la diferencia supera PARITY_TOLERANCE el archivo no se guarda.
+
+Dependencias opcionales: skl2onnx (exportar) y onnxruntime (predecir). Sin
+ellas, o si la versión no tiene model.onnx, se usa el modelo de sklearn.
+
+Uso:
+    py model_onnx.py --models-dir ./models/ --db predictions.db
+    py model_onnx.py --version <versión>
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ONNX_FILE = "model.onnx"
+# Operadores estándar y de ML (ai.onnx.ml 3 admite umbrales en double)
+TARGET_OPSET = {"": 17, "ai.onnx.ml": 3}
+
+PARITY_ROWS = 2000
+PARITY_TOLERANCE = 1e-4
+
+# Un hilo por sesión: la concurrencia la pone el pool de predicciones
+ONNX_INTRA_OP_THREADS = 1
+
+# Filas por bloque al densificar la entrada (misma cota de celdas que packed_forest)
+PREDICT_CHUNK_ROWS = 1024
+PREDICT_CHUNK_CELLS = 2 ** 24
+
+def onnx_runtime_available() -> bool:
+    try:
+        import onnxruntime  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def dense_blocks(X):
+    """Bloques densos float32 de X (la entrada del grafo ONNX es densa)"""
+    rows = max(1, min(PREDICT_CHUNK_ROWS, PREDICT_CHUNK_CELLS // max(X.shape[1], 1)))
+    for start in range(0, X.shape[0], rows):
+        block = X[start:start + rows]
+        block = block.toarray() if hasattr(block, "toarray") else np.asarray(block)
+        yield np.ascontiguousarray(block, dtype=np.float32)
+
+class OnnxModel:
+    """predict_proba y predict de un clasificador exportado; fallback es el modelo de sklearn"""
+
+    def __init__(self, session, classes, fallback=None):
+        self.session = session
+        self.classes_ = np.asarray(classes, dtype=object)
+        self.fallback = fallback
+        self.input_name = session.get_inputs()[0].name
+        self.fallback_used = 0
+
+    @classmethod
+    def load(cls, path: str, classes, fallback=None) -> "OnnxModel":
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+        return cls(session, classes, fallback)
+
+    def predict_proba(self, X) -> np.ndarray:
+        try:
+            blocks = [self.session.run(["probabilities"], {self.input_name: block})[0]
+                      for block in dense_blocks(X)]
+        except Exception as e:
+            if self.fallback is None:
+                raise
+            self.fallback_used += 1
+            logger.warning(f"Error en ONNX Runtime, se usa sklearn: {e}")
+            return self.fallback.predict_proba(X)
+        return np.vstack(blocks).astype(np.float64) if blocks else np.empty((0, len(self.classes_)))
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+def export_onnx(model, X_sample, path: str) -> Dict:
+    """Convertir model a ONNX en path y verificar la paridad con sklearn sobre X_sample"""
+    from skl2onnx import to_onnx
+
+    started = time.perf_counter()
+    sample = next(dense_blocks(X_sample[:1]))
+    onx = to_onnx(model, sample, options={id(model): {"zipmap": False}}, target_opset=TARGET_OPSET)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(onx.SerializeToString())
+
+    try:
+        X_parity = X_sample[:PARITY_ROWS]
+        expected = model.predict_proba(X_parity)
+        actual = OnnxModel.load(tmp_path, model.classes_).predict_proba(X_parity)
+        max_abs_diff = float(np.abs(actual - expected).max())
+        if max_abs_diff > PARITY_TOLERANCE:
+            raise ValueError(f"El modelo ONNX difiere de sklearn en {max_abs_diff:.2e} "
+                             f"(tolerancia {PARITY_TOLERANCE:.0e})")
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return {
+        "file": ONNX_FILE,
+        "opset": TARGET_OPSET,
+        "parity_rows": int(X_parity.shape[0]),
+        "max_abs_diff": max_abs_diff,
+        "argmax_agreement": round(float(np.mean(actual.argmax(axis=1) == expected.argmax(axis=1))), 6),
+        "size_bytes": os.path.getsize(path),
+        "export_seconds": round(time.perf_counter() - started, 3)
+    }
+
+def export_version(registry, version: str, X_sample, model=None) -> Dict:
+    """Exportar el modelo de una versión (o model, si ya está en memoria) y anotarlo en sus metadatos"""
+    model = model if model is not None else registry.load(version).model
+    report = export_onnx(model, X_sample, os.path.join(registry.version_dir(version), ONNX_FILE))
+    registry.update_metadata(version, {"onnx": report})
+    return report
+
+def try_export_version(registry, version: str, X_sample, model=None) -> Optional[Dict]:
+    """Como export_version, pero un fallo (p. ej. sin skl2onnx) solo se registra en los metadatos"""
+    try:
+        return export_version(registry, version, X_sample, model)
+    except Exception as e:
+        logger.warning(f"No se pudo exportar {version} a ONNX: {e}")
+        registry.update_metadata(version, {"onnx": {"error": str(e)}})
+        return None
+
+def load_parity_frame(db_path: str, rows: int = PARITY_ROWS):
+    """Casos históricos más recientes para verificar la paridad"""
+    import pandas as pd
+
+    conn = sqlite3.connect(db_path)
+    try:
+        return pd.read_sql_query('''
+            SELECT tipo_caso, descripcion, monto_disputa, complejidad, evidencias
+            FROM historical_cases ORDER BY id DESC LIMIT ?
+        ''', conn, params=(rows,))
+    finally:
+        conn.close()
+
+def main():
+    """Función principal"""
+    from model_registry import ModelRegistry
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Exportar una versión del modelo a ONNX")
+    parser.add_argument("--models-dir", default="./models/")
+    parser.add_argument("--version", help="Versión a exportar (por defecto la activa)")
+    parser.add_argument("--db", default="predictions.db", help="Casos para verificar la paridad")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.models_dir)
+    version = args.version or registry.active_version()
+    if not version:
+        parser.error("No hay una versión activa; indique --version")
+
+    frame = load_parity_frame(args.db)
+    if frame.empty:
+        parser.error(f"No hay casos en historical_cases de {args.db}")
+    X_sample = registry.load(version).feature_pipeline.transform(frame)
+    report = export_version(registry, version, X_sample)
+    print(json.dumps({"version": version, **report}, indent=2))
+
+if __name__ == "__main__":
+    main()
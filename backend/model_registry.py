@@ -0,0 +1,274 @@
+"""
+Registro de Versiones del Modelo de Predicción
+==============================================
+Guarda cada modelo entrenado como una versión inmutable con sus metadatos
+y mantiene un puntero a la versión activa.
+
+Estructura en disco (MODEL_PATH, por defecto ./models/):
+    models/
+        active.json                  versión activa + historial para rollback
+        .training.lock               bloqueo entre procesos mientras se entrena (ver training_lock)
+        <version>/model.joblib
+        <version>/feature_pipeline.joblib
+        <version>/metadata.json      filas de entrenamiento, métricas, hash, parámetros
+        <version>/forest/*.npy       nodos del bosque para cargar con mmap (ver packed_forest)
+        <version>/model.onnx         clasificador exportado a ONNX, opcional (ver model_onnx)
+
+Las escrituras son atómicas: las versiones se escriben en un directorio
+temporal que luego se renombra, y active.json se reemplaza con os.replace.
+
+joblib se importa al guardar o cargar, para no demorar el arranque de la API.
+Los archivos joblib se guardan sin comprimir para poder cargarlos con mmap_mode.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from model_onnx import ONNX_FILE, OnnxModel, onnx_runtime_available
+from packed_forest import PackedForest, is_packable
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = "model.joblib"
+PIPELINE_FILE = "feature_pipeline.joblib"
+METADATA_FILE = "metadata.json"
+ACTIVE_FILE = "active.json"
+TRAINING_LOCK_FILE = ".training.lock"
+FOREST_DIR = "forest"
+MODEL_RUNTIMES = ("sklearn", "onnx")
+
+def _lock_file(f):
+    """Bloqueo exclusivo del archivo; espera a que lo libere el proceso que lo tenga"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            time.sleep(1)
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+class ModelBundle:
+    """Modelo, pipeline de características y metadatos de una versión (no se modifica)"""
+
+    def __init__(self, version: str, model, feature_pipeline, metadata: Dict, runtime: str = "sklearn"):
+        self.version = version
+        self.model = model
+        self.feature_pipeline = feature_pipeline
+        self.metadata = metadata
+        # Cómo se ejecuta el modelo: sklearn, packed_forest u onnx
+        self.runtime = runtime
+        # Derivados que se calculan al primer uso (explicaciones)
+        self._packed_forest = None
+        self._feature_names = None
+
+    @property
+    def packed_forest(self) -> Optional[PackedForest]:
+        """El bosque como arreglos planos; si se cargó con joblib se empaqueta una sola vez"""
+        if self._packed_forest is None:
+            # Con ONNX los árboles se leen del modelo de respaldo
+            model = self.model.fallback if isinstance(self.model, OnnxModel) else self.model
+            self._packed_forest = PackedForest.from_model(model) or False
+        return self._packed_forest or None
+
+    @property
+    def feature_names(self) -> List[str]:
+        if self._feature_names is None:
+            self._feature_names = self.feature_pipeline.feature_names()
+        return self._feature_names
+
+class ModelRegistry:
+    """Versiones de modelos en disco con activación atómica"""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        os.makedirs(base_dir, exist_ok=True)
+
+    def version_dir(self, version: str) -> str:
+        return os.path.join(self.base_dir, version)
+
+    def save_version(self, model, feature_pipeline, metadata: Dict) -> str:
+        """Guardar una nueva versión y devolver su identificador"""
+        import joblib
+
+        tmp_dir = os.path.join(self.base_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            joblib.dump(model, os.path.join(tmp_dir, MODEL_FILE), compress=0)
+            joblib.dump(feature_pipeline, os.path.join(tmp_dir, PIPELINE_FILE), compress=0)
+            if is_packable(model):
+                PackedForest.from_forest(model).save(os.path.join(tmp_dir, FOREST_DIR))
+
+            digest = hashlib.sha256()
+            for name in (MODEL_FILE, PIPELINE_FILE):
+                with open(os.path.join(tmp_dir, name), "rb") as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+
+            sha256 = digest.hexdigest()
+            version = f"v{time.strftime('%Y%m%d-%H%M%S')}-{sha256[:8]}"
+            metadata = {**metadata, "version": version, "sha256": sha256,
+                        "packed_forest": is_packable(model),
+                        "size_bytes": sum(os.path.getsize(os.path.join(tmp_dir, n))
+                                          for n in (MODEL_FILE, PIPELINE_FILE))}
+
+            with open(os.path.join(tmp_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+                json.dump(metadata, f, indent=2, ensure_ascii=False)
+
+            os.replace(tmp_dir, self.version_dir(version))
+            return version
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def load(self, version: str, mmap_mode: Optional[str] = None, runtime: str = "sklearn") -> ModelBundle:
+        """Cargar una versión desde disco
+
+        Con mmap_mode los bosques empaquetados se mapean en memoria (compartida
+        entre procesos) en lugar de deserializar el modelo de sklearn; sirve
+        para predecir, no para reentrenar.
+
+        Con runtime='onnx' se predice con ONNX Runtime si la versión tiene
+        model.onnx y onnxruntime está instalado; si no, con sklearn.
+        """
+        import joblib
+
+        path = self.version_dir(version)
+        if not os.path.isdir(path):
+            raise KeyError(f"Versión de modelo no encontrada: {version}")
+
+        forest_dir = os.path.join(path, FOREST_DIR)
+        if mmap_mode and os.path.isdir(forest_dir):
+            model = PackedForest.load(forest_dir, mmap_mode=mmap_mode)
+            loaded_runtime = "packed_forest"
+        else:
+            model = joblib.load(os.path.join(path, MODEL_FILE), mmap_mode=mmap_mode)
+            loaded_runtime = "sklearn"
+
+        if runtime == "onnx":
+            onnx_path = os.path.join(path, ONNX_FILE)
+            if not os.path.isfile(onnx_path):
+                logger.warning(f"La versión {version} no tiene {ONNX_FILE}; se usa {loaded_runtime}")
+            elif not onnx_runtime_available():
+                logger.warning(f"onnxruntime no está instalado; se usa {loaded_runtime}")
+            else:
+                model = OnnxModel.load(onnx_path, model.classes_, fallback=model)
+                loaded_runtime = "onnx"
+
+        return ModelBundle(
+            version=version,
+            model=model,
+            feature_pipeline=joblib.load(os.path.join(path, PIPELINE_FILE), mmap_mode=mmap_mode),
+            metadata=self.metadata(version),
+            runtime=loaded_runtime
+        )
+
+    def metadata(self, version: str) -> Dict:
+        with open(os.path.join(self.version_dir(version), METADATA_FILE), encoding="utf-8") as f:
+            return json.load(f)
+
+    def update_metadata(self, version: str, updates: Dict) -> Dict:
+        """Agregar datos derivados (p. ej. la exportación a ONNX) a los metadatos de una versión"""
+        path = os.path.join(self.version_dir(version), METADATA_FILE)
+        metadata = {**self.metadata(version), **updates}
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return metadata
+
+    def list_versions(self) -> List[Dict]:
+        """Metadatos de todas las versiones, de la más reciente a la más antigua"""
+        active = self.active_version()
+        versions = []
+        for name in sorted(os.listdir(self.base_dir), reverse=True):
+            if name.startswith(".") or not os.path.isfile(os.path.join(self.base_dir, name, METADATA_FILE)):
+                continue
+            versions.append({**self.metadata(name), "active": name == active})
+        return versions
+
+    @contextlib.contextmanager
+    def training_lock(self):
+        """Bloqueo exclusivo entre procesos para entrenar y activar una versión
+
+        Los workers de uvicorn comparten el registro y la caché de características;
+        el que no obtiene el bloqueo espera a que el otro termine.
+        """
+        with open(os.path.join(self.base_dir, TRAINING_LOCK_FILE), "a+b") as f:
+            _lock_file(f)
+            try:
+                yield
+            finally:
+                _unlock_file(f)
+
+    def _read_active(self) -> Dict:
+        try:
+            with open(os.path.join(self.base_dir, ACTIVE_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"active": None, "history": []}
+
+    def active_version(self) -> Optional[str]:
+        return self._read_active().get("active")
+
+    def active_mtime(self) -> float:
+        """Marca de tiempo de active.json, para detectar cambios hechos por otros procesos"""
+        try:
+            return os.path.getmtime(os.path.join(self.base_dir, ACTIVE_FILE))
+        except FileNotFoundError:
+            return 0.0
+
+    def _write_active(self, state: Dict):
+        path = os.path.join(self.base_dir, ACTIVE_FILE)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def activate(self, version: str) -> Dict:
+        """Marcar una versión como activa, guardando la anterior en el historial"""
+        if not os.path.isdir(self.version_dir(version)):
+            raise KeyError(f"Versión de modelo no encontrada: {version}")
+
+        state = self._read_active()
+        if state.get("active") and state["active"] != version:
+            state["history"] = (state.get("history", []) + [state["active"]])[-20:]
+        state["active"] = version
+        state["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._write_active(state)
+        return state
+
+    def rollback(self) -> Dict:
+        """Volver a la versión activa anterior"""
+        state = self._read_active()
+        history = state.get("history", [])
+        if not history:
+            raise KeyError("No hay una versión anterior para hacer rollback")
+
+        state["active"] = history.pop()
+        state["history"] = history
+        state["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        self._write_active(state)
+        return state
@@ -0,0 +1,369 @@
+"""
+Entrenamiento del Modelo de Predicción de Sentencias
+====================================================
+Entrena el modelo a partir de historical_cases y lo registra como una nueva
+versión en el registro de modelos. Se usa desde predict_api y también como
+proceso independiente para reentrenar en segundo plano sin bloquear la API.
+
+Uso:
+    py model_training.py --db predictions.db --models-dir ./models/ [--activate]
+    py model_training.py --incremental --base-version <versión> [--activate]
+    py model_training.py --backend auto --latency-budget-ms 10
+    py model_training.py --text-featurizer hashing --feature-jobs 4
+    py model_training.py --feature-cache ./feature_cache/
+
+El modo incremental incorpora los resultados reales registrados en
+case_predictions sobre una versión existente, sin reentrenar desde cero.
+
+El entrenamiento completo lee los casos por bloques (--chunk-rows): en memoria
+solo queda la matriz dispersa de características, no los textos.
+
+El texto se vectoriza con TF-IDF o, con --text-featurizer hashing, sin
+vocabulario (ver prediction_features); --feature-jobs transforma los bloques
+en paralelo.
+
+Con --feature-cache las características de historical_cases quedan en disco
+(ver feature_cache) y el siguiente entrenamiento completo solo lee y tokeniza
+los casos agregados desde entonces; con TF-IDF el vocabulario se ajusta con
+los conteos guardados.
+
+Con --onnx la versión nueva se exporta además a ONNX (ver model_onnx); si
+falla la exportación o la paridad, la versión queda igual, solo con sklearn.
+
+El estimador se elige con --backend (forest, linear, gbt o auto; ver
+model_backends). En modo auto se entrena el más exacto que cumple
+--latency-budget-ms y la comparación queda en los metadatos de la versión.
+
+Al terminar imprime en la última línea un JSON con la versión creada.
+"""
+
+import argparse
+import copy
+import json
+import logging
+import sqlite3
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import sklearn
+from sklearn.metrics import accuracy_score
+
+from model_backends import (BACKEND_CHOICES, BACKEND_PARAMS, DEFAULT_LATENCY_BUDGET_MS,
+                            build_model, evaluation_split, resolve_backend)
+from feature_cache import FeatureCache
+from model_onnx import try_export_version
+from model_registry import ModelRegistry
+from packed_forest import is_packable
+from prediction_db import init_predictions_db
+from prediction_features import TEXT_FEATURIZERS, CaseFeaturePipeline
+
+logger = logging.getLogger(__name__)
+
+TEXT_MAX_FEATURES = 1000
+
+# Casos leídos de la base por bloque durante el entrenamiento completo
+TRAINING_CHUNK_ROWS = 50000
+
+# Actualización incremental: árboles nuevos por ejecución y tope del bosque
+INCREMENTAL_TREES = 10
+MAX_FOREST_TREES = 300
+# Casos históricos que acompañan a los nuevos resultados (por cada resultado nuevo)
+REPLAY_RATIO = 4
+
+def training_bounds(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """Último id histórico y última secuencia de resultado a incluir, fijos durante el entrenamiento"""
+    max_historical_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM historical_cases').fetchone()[0]
+    watermark = conn.execute(
+        'SELECT COALESCE(MAX(resultado_seq), 0) FROM case_predictions'
+    ).fetchone()[0]
+    return max_historical_id, watermark
+
+def iter_training_chunks(db_path: str, bounds: Tuple[int, int],
+                         chunk_rows: int = TRAINING_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Casos históricos y predicciones con resultado real, por bloques de id (keyset)"""
+    queries = (
+        ('''SELECT id, tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado
+            FROM historical_cases
+            WHERE id > ? AND id <= ?
+            ORDER BY id LIMIT ?''', bounds[0]),
+        ('''SELECT id, tipo_caso, descripcion, monto_disputa, complejidad, evidencias,
+                   resultado_real AS resultado
+            FROM case_predictions
+            WHERE id > ? AND resultado_seq <= ?
+            ORDER BY id LIMIT ?''', bounds[1]),
+    )
+    conn = sqlite3.connect(db_path)
+    try:
+        for query, max_id in queries:
+            last_id = 0
+            while True:
+                chunk = pd.read_sql_query(query, conn, params=(last_id, max_id, chunk_rows))
+                if chunk.empty:
+                    break
+                last_id = int(chunk["id"].iloc[-1])
+                yield chunk.drop(columns=["id"])
+    finally:
+        conn.close()
+
+def load_feedback_frame(conn: sqlite3.Connection, watermark: int) -> pd.DataFrame:
+    """Predicciones con resultado real registrado después de la marca de agua (resultado_seq)"""
+    return pd.read_sql_query('''
+        SELECT resultado_seq, tipo_caso, descripcion, monto_disputa, complejidad, evidencias,
+               resultado_real AS resultado
+        FROM case_predictions
+        WHERE resultado_seq > ?
+        ORDER BY resultado_seq
+    ''', conn, params=(watermark,))
+
+def load_replay_frame(conn: sqlite3.Connection, size: int, classes: List[str], seed: int) -> pd.DataFrame:
+    """Muestra de casos históricos (por ids aleatorios) que cubre todas las clases del modelo"""
+    columns = "tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado"
+    min_id, max_id = conn.execute('SELECT MIN(id), MAX(id) FROM historical_cases').fetchone()
+    if min_id is None:
+        return pd.DataFrame(columns=columns.split(", "))
+    
+    ids = np.random.default_rng(seed).integers(min_id, max_id + 1, size).tolist()
+    frames = [pd.read_sql_query(
+        f'SELECT {columns} FROM historical_cases WHERE id IN (SELECT value FROM json_each(?))',
+        conn, params=(json.dumps(ids),)
+    )]
+    
+    # Warm start exige que las clases no cambien: asegurar al menos un ejemplo de cada una
+    present = set(frames[0]["resultado"])
+    for label in classes:
+        if label not in present:
+            frames.append(pd.read_sql_query(
+                f'SELECT {columns} FROM historical_cases WHERE resultado = ? LIMIT 5', conn, params=(label,)
+            ))
+    return pd.concat(frames, ignore_index=True)
+
+def holdout_accuracy(X, y, backend: str = "forest", selection: Optional[Dict] = None) -> Optional[float]:
+    """Exactitud en casos reservados (None si hay muy pocos casos)
+
+    Con selección automática es la que obtuvo el backend elegido; si no, se
+    entrena una vez con la muestra de evaluation_split en lugar de con todo X.
+    """
+    if len(y) < 10:
+        return None
+    if selection:
+        return selection["candidates"][backend]["accuracy"]
+    train, validation = evaluation_split(len(y))
+    model = build_model(backend).fit(X[train], y[train])
+    return round(float(accuracy_score(y[validation], model.predict(X[validation]))), 4)
+
+def train_model_version(db_path: str, models_dir: str, chunk_rows: int = TRAINING_CHUNK_ROWS,
+                        backend: str = "forest",
+                        latency_budget_ms: float = DEFAULT_LATENCY_BUDGET_MS,
+                        text_featurizer: str = "tfidf", feature_jobs: int = 1,
+                        export_onnx: bool = False, feature_cache_dir: Optional[str] = None) -> Optional[str]:
+    """Entrenar con todos los casos históricos y registrar la versión (no la activa)"""
+    started = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    bounds = training_bounds(conn)
+    conn.close()
+    watermark = bounds[1]
+
+    # Características dispersas: texto, monto, complejidad, evidencias y tipo de caso
+    feature_pipeline = CaseFeaturePipeline(max_features=TEXT_MAX_FEATURES, text_featurizer=text_featurizer)
+    cache_stats = None
+    if feature_cache_dir:
+        # Solo se featurizan los casos nuevos; el pipeline se ajusta con la matriz guardada
+        try:
+            prepared = FeatureCache(feature_cache_dir, feature_pipeline).training_matrix(db_path, bounds, chunk_rows)
+        except ValueError:
+            prepared = None
+        if prepared is None:
+            logger.warning("No hay datos para entrenar el modelo")
+            return None
+        X, y, cache_stats = prepared
+    else:
+        # Dos pasadas por bloques: vocabulario (no hace falta con hashing) y luego la matriz
+        try:
+            feature_pipeline.fit_chunks(iter_training_chunks(db_path, bounds, chunk_rows))
+        except ValueError:
+            logger.warning("No hay datos para entrenar el modelo")
+            return None
+
+        labels = []
+
+        def labeled_chunks():
+            # Las etiquetas se toman en el orden de lectura, que transform_chunks respeta
+            for chunk in iter_training_chunks(db_path, bounds, chunk_rows):
+                labels.append(chunk["resultado"].to_numpy())
+                yield chunk
+
+        blocks = feature_pipeline.transform_chunks(labeled_chunks(), feature_jobs)
+        if not blocks:
+            logger.warning("No hay datos para entrenar el modelo")
+            return None
+        X = sp.vstack(blocks, format="csr")
+        y = np.concatenate(labels)
+
+    backend, selection = resolve_backend(backend, X, y, latency_budget_ms)
+    model = build_model(backend)
+    model.fit(X, y)
+
+    metadata: Dict = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "training_rows": int(len(y)),
+        "classes": [str(c) for c in model.classes_],
+        "n_features": int(X.shape[1]),
+        "text_featurizer": text_featurizer,
+        "backend": backend,
+        "estimator": type(model).__name__,
+        "params": BACKEND_PARAMS[backend],
+        "metrics": {
+            "accuracy_train": round(float(accuracy_score(y, model.predict(X))), 4),
+            "accuracy_holdout": holdout_accuracy(X, y, backend, selection)
+        },
+        "class_distribution": {str(k): int(v) for k, v in zip(*np.unique(y, return_counts=True))},
+        "sklearn_version": sklearn.__version__,
+        "training_mode": "full",
+        "feedback_watermark": int(watermark)
+    }
+    if selection:
+        metadata["backend_selection"] = selection
+    if cache_stats:
+        metadata["feature_cache"] = cache_stats
+    metadata["training_seconds"] = round(time.perf_counter() - started, 3)
+
+    registry = ModelRegistry(models_dir)
+    version = registry.save_version(model, feature_pipeline, metadata)
+    logger.info(f"Modelo entrenado y registrado como {version}")
+    if export_onnx:
+        try_export_version(registry, version, X, model)
+    return version
+
+def update_model(model, X, y, classes: List[str]):
+    """Incorporar nuevos ejemplos a una copia del modelo sin reentrenar desde cero"""
+    model = copy.deepcopy(model)
+    if hasattr(model, "partial_fit"):
+        model.partial_fit(X, y, classes=classes)
+        return model
+    
+    if is_packable(model) and "warm_start" in model.get_params():
+        if set(np.unique(y)) != set(classes):
+            raise ValueError("Los datos nuevos no cubren todas las clases; se requiere reentrenamiento completo")
+        
+        # Bosque: se agregan árboles entrenados con los datos nuevos y se descartan
+        # los más antiguos al superar el tope (ventana deslizante)
+        excess = len(model.estimators_) + INCREMENTAL_TREES - MAX_FOREST_TREES
+        if excess > 0:
+            model.estimators_ = model.estimators_[excess:]
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + INCREMENTAL_TREES)
+        model.fit(X, y)
+        model.set_params(warm_start=False)
+        return model
+    
+    raise ValueError(f"{type(model).__name__} no admite actualización incremental")
+
+def incremental_model_version(db_path: str, models_dir: str, base_version: str,
+                              export_onnx: bool = False) -> Optional[str]:
+    """Crear una versión a partir de base_version incorporando los resultados reales nuevos"""
+    started = time.perf_counter()
+    registry = ModelRegistry(models_dir)
+    base = registry.load(base_version)
+    watermark = base.metadata.get("feedback_watermark", 0)
+    classes = [str(c) for c in base.model.classes_]
+    
+    conn = sqlite3.connect(db_path)
+    feedback = load_feedback_frame(conn, watermark)
+    if len(feedback) == 0:
+        conn.close()
+        logger.info("No hay resultados reales nuevos para incorporar")
+        return None
+    
+    new_watermark = int(feedback["resultado_seq"].max())
+    unknown = ~feedback["resultado"].isin(classes)
+    if unknown.any():
+        logger.warning(f"{int(unknown.sum())} resultados con clases desconocidas; requieren reentrenamiento completo")
+        feedback = feedback[~unknown]
+    if len(feedback) == 0:
+        conn.close()
+        return None
+    
+    replay = load_replay_frame(conn, REPLAY_RATIO * len(feedback), classes, seed=new_watermark)
+    conn.close()
+    
+    # Exactitud del modelo base sobre los resultados nuevos, antes de actualizar (prequential)
+    X_feedback = base.feature_pipeline.transform(feedback)
+    y_feedback = feedback["resultado"].values
+    accuracy_before = float(accuracy_score(y_feedback, base.model.predict(X_feedback)))
+    
+    frame = pd.concat([feedback.drop(columns=["resultado_seq"]), replay], ignore_index=True)
+    X = base.feature_pipeline.transform(frame)
+    y = frame["resultado"].values
+    model = update_model(base.model, X, y, classes)
+    
+    metadata: Dict = {
+        **{k: v for k, v in base.metadata.items() if k not in ("version", "sha256", "size_bytes")},
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "training_mode": "incremental",
+        "parent_version": base_version,
+        "training_rows": int(base.metadata.get("training_rows", 0) + len(feedback)),
+        "incremental_rows": int(len(feedback)),
+        "replay_rows": int(len(replay)),
+        "skipped_unknown_classes": int(unknown.sum()),
+        "feedback_watermark": new_watermark,
+        "params": ({**base.metadata.get("params", {}), "n_estimators": len(model.estimators_)}
+                   if is_packable(model) else base.metadata.get("params", {})),
+        "metrics": {
+            **base.metadata.get("metrics", {}),
+            "accuracy_feedback_before": round(accuracy_before, 4),
+            "accuracy_feedback_after": round(float(accuracy_score(y_feedback, model.predict(X_feedback))), 4)
+        },
+        "training_seconds": round(time.perf_counter() - started, 3)
+    }
+    
+    version = registry.save_version(model, base.feature_pipeline, metadata)
+    logger.info(f"Modelo {base_version} actualizado incrementalmente como {version}")
+    if export_onnx:
+        try_export_version(registry, version, X, model)
+    return version
+
+def main():
+    """Función principal"""
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Entrenar y registrar una versión del modelo de predicción")
+    parser.add_argument("--db", default="predictions.db")
+    parser.add_argument("--models-dir", default="./models/")
+    parser.add_argument("--activate", action="store_true", help="Activar la versión al terminar")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Incorporar resultados reales nuevos sobre una versión existente")
+    parser.add_argument("--base-version", help="Versión base para --incremental (por defecto la activa)")
+    parser.add_argument("--chunk-rows", type=int, default=TRAINING_CHUNK_ROWS,
+                        help="Casos leídos por bloque en el entrenamiento completo")
+    parser.add_argument("--backend", choices=BACKEND_CHOICES, default="forest",
+                        help="Estimador del entrenamiento completo")
+    parser.add_argument("--latency-budget-ms", type=float, default=DEFAULT_LATENCY_BUDGET_MS,
+                        help="Latencia p99 máxima por predicción para --backend auto")
+    parser.add_argument("--text-featurizer", choices=TEXT_FEATURIZERS, default="tfidf")
+    parser.add_argument("--onnx", action="store_true", help="Exportar también la versión a ONNX")
+    parser.add_argument("--feature-cache", help="Carpeta de la caché de características (entrenamiento completo)")
+    parser.add_argument("--feature-jobs", type=int, default=1,
+                        help="Procesos para transformar los bloques (-1: todos los núcleos)")
+    args = parser.parse_args()
+
+    # Migra bases anteriores (p. ej. la secuencia resultado_seq) si la API no lo hizo antes
+    init_predictions_db(args.db)
+
+    if args.incremental:
+        base_version = args.base_version or ModelRegistry(args.models_dir).active_version()
+        if not base_version:
+            parser.error("No hay una versión activa; indique --base-version")
+        version = incremental_model_version(args.db, args.models_dir, base_version, args.onnx)
+    else:
+        version = train_model_version(args.db, args.models_dir, args.chunk_rows,
+                                      args.backend, args.latency_budget_ms,
+                                      args.text_featurizer, args.feature_jobs, args.onnx,
+                                      args.feature_cache)
+    if version and args.activate:
+        ModelRegistry(args.models_dir).activate(version)
+
+    print(json.dumps({"version": version}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Bosque Empaquetado para Memoria Compartida
+==========================================
+Representa un RandomForestClassifier (o ExtraTrees) entrenado como arreglos
+planos de nodos guardados en .npy, que se cargan con np.load(mmap_mode='r').
+
+Al deserializar un bosque con joblib, sklearn copia los nodos de cada árbol a
+memoria propia del proceso aunque se use mmap_mode, así que cada worker de
+uvicorn paga el modelo completo. Con los arreglos mapeados en memoria, las
+páginas las comparte el sistema operativo entre todos los procesos.
+
+La inferencia recorre todos los árboles a la vez (vectorizada con NumPy) y
+reproduce predict_proba de sklearn. En el mismo recorrido se pueden obtener
+los aportes de cada característica (descomposición por caminos de Saabas).
+"""
+
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+CLASSES_FILE = "classes.json"
+
+# Filas por bloque al densificar la matriz de características, con un tope de
+# celdas para que las matrices anchas (hashing) no ocupen cientos de MB
+PREDICT_CHUNK_ROWS = 1024
+PREDICT_CHUNK_CELLS = 2 ** 24
+
+def is_packable(model) -> bool:
+    """Bosques de clasificación de sklearn con una sola salida"""
+    estimators = getattr(model, "estimators_", None)
+    # GradientBoosting también tiene estimators_, pero es un arreglo 2D de regresores
+    return (
+        isinstance(estimators, list) and len(estimators) > 0
+        and hasattr(model, "classes_")
+        and hasattr(estimators[0], "tree_")
+        and getattr(model, "n_outputs_", 1) == 1
+    )
+
+class PackedForest:
+    """Nodos de todos los árboles concatenados; los hijos usan índices absolutos (-1 = hoja)"""
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes: List[str]):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = np.asarray(classes, dtype=object)
+        self._scores = {}
+
+    @property
+    def n_estimators(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @classmethod
+    def from_model(cls, model) -> Optional["PackedForest"]:
+        """El mismo objeto si ya está empaquetado, un bosque empaquetado o None si no es un bosque"""
+        if isinstance(model, cls):
+            return model
+        return cls.from_forest(model) if is_packable(model) else None
+
+    @classmethod
+    def from_forest(cls, model) -> "PackedForest":
+        if not is_packable(model):
+            raise ValueError(f"{type(model).__name__} no se puede empaquetar")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            left = tree.children_left.astype(np.int32)
+            right = tree.children_right.astype(np.int32)
+            is_leaf = left < 0
+            features.append(tree.feature.astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(np.where(is_leaf, -1, left + offset).astype(np.int32))
+            rights.append(np.where(is_leaf, -1, right + offset).astype(np.int32))
+            # Proporciones por clase en cada nodo (según la versión, sklearn guarda conteos)
+            value = tree.value[:, 0, :].astype(np.float64)
+            values.append(value / np.maximum(value.sum(axis=1, keepdims=True), 1e-12))
+            roots.append(offset)
+            offset += tree.node_count
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights),
+            np.concatenate(values), np.asarray(roots, dtype=np.int64),
+            [str(c) for c in model.classes_]
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(path, CLASSES_FILE), "w", encoding="utf-8") as f:
+            json.dump([str(c) for c in self.classes_], f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Optional[str] = "r") -> "PackedForest":
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+        with open(os.path.join(path, CLASSES_FILE), encoding="utf-8") as f:
+            classes = json.load(f)
+        return cls(classes=classes, **arrays)
+
+    def apply(self, X) -> np.ndarray:
+        """Hoja alcanzada en cada árbol: matriz (n_muestras, n_árboles) de índices de nodo"""
+        return np.vstack([self._apply_dense(block) for block in self._dense_blocks(X)])
+
+    def predict_proba(self, X) -> np.ndarray:
+        blocks = [self.value[self._apply_dense(block)].mean(axis=1) for block in self._dense_blocks(X)]
+        return np.vstack(blocks) if blocks else np.empty((0, len(self.classes_)))
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    def contributions(self, X, class_weights) -> Tuple[float, np.ndarray]:
+        """Aportes por característica al puntaje predict_proba(X) @ class_weights
+
+        Cada división del camino aporta a su característica la diferencia de
+        puntaje entre el hijo elegido y el nodo. Devuelve (base, aportes) con
+        aportes de forma (n_muestras, n_características) y
+        base + aportes.sum(axis=1) igual al puntaje promedio del bosque.
+        """
+        score = self._node_scores(class_weights)
+        base = float(score[np.asarray(self.roots)].mean())
+        blocks = [self._traverse(block, score)[1] for block in self._dense_blocks(X)]
+        return base, (np.vstack(blocks) if blocks else np.empty((0, X.shape[1])))
+
+    def _node_scores(self, class_weights) -> np.ndarray:
+        # Se calcula una vez por vector de pesos (value puede estar mapeado en disco)
+        key = tuple(float(w) for w in class_weights)
+        if key not in self._scores:
+            self._scores[key] = np.asarray(self.value) @ np.asarray(key, dtype=np.float64)
+        return self._scores[key]
+
+    def _dense_blocks(self, X):
+        # Igual que sklearn: las comparaciones se hacen con X en float32
+        rows = max(1, min(PREDICT_CHUNK_ROWS, PREDICT_CHUNK_CELLS // max(X.shape[1], 1)))
+        for start in range(0, X.shape[0], rows):
+            block = X[start:start + rows]
+            block = block.toarray() if hasattr(block, "toarray") else np.asarray(block)
+            yield block.astype(np.float32, copy=False)
+
+    def _apply_dense(self, X: np.ndarray) -> np.ndarray:
+        return self._traverse(X)[0]
+
+    def _traverse(self, X: np.ndarray, score: Optional[np.ndarray] = None):
+        """Descender todos los árboles a la vez, un nivel por iteración
+
+        Devuelve las hojas (n_muestras, n_árboles) y, si se pasa el puntaje de
+        cada nodo, los aportes por característica promediados entre árboles.
+        """
+        n_samples, n_trees = X.shape[0], len(self.roots)
+        nodes = np.tile(np.asarray(self.roots), n_samples)
+        # Índice plano del inicio de la fila de cada posición (más rápido que indexar en 2D)
+        row_offsets = np.repeat(np.arange(n_samples, dtype=np.int64) * X.shape[1], n_trees)
+        X_flat = np.ascontiguousarray(X).ravel()
+        # Solo se siguen las posiciones que todavía no llegaron a una hoja
+        active = np.arange(nodes.size)
+        # El índice plano (fila, característica) de X sirve también para acumular los aportes
+        steps, deltas = [], []
+        while active.size:
+            current = nodes[active]
+            left = self.left[current]
+            internal = left >= 0
+            active, current, left = active[internal], current[internal], left[internal]
+            flat = row_offsets[active] + self.feature[current]
+            go_left = X_flat[flat] <= self.threshold[current]
+            nodes[active] = np.where(go_left, left, self.right[current])
+            if score is not None:
+                steps.append(flat)
+                deltas.append(score[nodes[active]] - score[current])
+
+        leaves = nodes.reshape(n_samples, n_trees)
+        if score is None:
+            return leaves, None
+        contributions = np.bincount(np.concatenate(steps), weights=np.concatenate(deltas),
+                                    minlength=X_flat.size) if steps else np.zeros(X_flat.size)
+        return leaves, contributions.reshape(X.shape) / n_trees
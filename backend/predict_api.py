@@ -10,33 +10,70 @@ Funcionalidades:
 - Análisis de factores de riesgo
 - Recomendaciones estratégicas
 - Estimación de tiempo de resolución
+
+El arranque es liviano: la base de datos se prepara en el lifespan de la
+aplicación y el modelo se carga en segundo plano (ver /health/ready).
+pandas y sklearn se importan recién al entrenar o al cargar el modelo.
 """
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
 import sqlite3
 import json
+import os
 import re
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-import joblib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import asyncio
+import base64
 import logging
 
+from model_backends import BACKEND_CHOICES, DEFAULT_LATENCY_BUDGET_MS, INCREMENTAL_BACKENDS
+from model_registry import MODEL_RUNTIMES, ModelBundle, ModelRegistry
+from prediction_cache import PredictionCache
+from prediction_db import CASE_TYPES, OUTCOME_SUCCESS_WEIGHTS, init_predictions_db
+from prediction_jobs import FINISHED_STATES, JOB_STALE_SECONDS, JOB_STATES, JobManager, JobQueueFull
+from prediction_workers import PoolSaturated, PredictionPool, predict_in_process
+from similar_cases import SimilarCaseIndex
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque: base de datos y pool listos antes de atender; el modelo se carga en segundo plano"""
+    await asyncio.to_thread(prediction_system.init_database)
+    prediction_system.start_model_loading()
+    prediction_system.similar_index.start_build()
+    prediction_pool.start()
+    await asyncio.to_thread(job_manager.start)
+    
+    tasks = [asyncio.create_task(job_recovery_loop())]
+    if INCREMENTAL_TRAINING_HOURS > 0:
+        tasks.append(asyncio.create_task(incremental_training_loop()))
+    
+    yield
+    
+    for task in tasks:
+        task.cancel()
+    job_manager.shutdown()
+    prediction_pool.shutdown()
+
 app = FastAPI(
     title="Sistema de Predicción de Sentencias",
     description="Predicción de resultados judiciales con IA",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS
@@ -48,6 +85,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Rutas de datos y del registro de modelos
+PREDICTIONS_DB_PATH = os.getenv("PREDICTIONS_DB_PATH", "predictions.db")
+MODELS_DIR = os.getenv("MODEL_PATH", "./models/")
+
+# Índice de casos similares (segmentos .npz) y máximo de casos por consulta
+SIMILAR_INDEX_PATH = os.getenv("SIMILAR_INDEX_PATH", "./similar_index/")
+MAX_SIMILAR_CASES = 100
+
+# Cargar los artefactos del modelo mapeados en memoria, compartidos entre workers (0 = copia propia)
+MODEL_MMAP_MODE = "r" if os.getenv("MODEL_MMAP", "1") == "1" else None
+
+# Cada cuántos segundos se revisa si otro proceso cambió la versión activa
+MODEL_REFRESH_SECONDS = float(os.getenv("MODEL_REFRESH_SECONDS", "2"))
+
+# Cada cuántas horas se incorporan los resultados reales al modelo (0 = desactivado)
+INCREMENTAL_TRAINING_HOURS = float(os.getenv("INCREMENTAL_TRAINING_HOURS", "24"))
+
+# Estimador de los entrenamientos completos (forest, linear, gbt o auto) y presupuesto
+# de latencia p99 por predicción con el que auto elige (ver model_backends)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "forest")
+MODEL_LATENCY_BUDGET_MS = float(os.getenv("MODEL_LATENCY_BUDGET_MS", str(DEFAULT_LATENCY_BUDGET_MS)))
+if MODEL_BACKEND not in BACKEND_CHOICES:
+    raise ValueError(f"MODEL_BACKEND inválido: {MODEL_BACKEND}. Use: {', '.join(BACKEND_CHOICES)}")
+
+# Vectorización del texto en los entrenamientos completos: 'tfidf' o 'hashing' (sin
+# vocabulario) y procesos para transformar los bloques de casos
+TEXT_FEATURIZER = os.getenv("TEXT_FEATURIZER", "tfidf")
+FEATURE_JOBS = int(os.getenv("FEATURE_JOBS", "1"))
+
+# Características de historical_cases guardadas entre entrenamientos completos, para
+# featurizar solo los casos nuevos (vacío = sin caché; ver feature_cache)
+FEATURE_CACHE_PATH = os.getenv("FEATURE_CACHE_PATH", "./feature_cache/")
+
+# Ejecución del modelo: 'sklearn' u 'onnx' (ONNX Runtime; cada entrenamiento exporta
+# la versión y, si no hay model.onnx u onnxruntime, se usa sklearn)
+MODEL_RUNTIME = os.getenv("MODEL_RUNTIME", "sklearn")
+if MODEL_RUNTIME not in MODEL_RUNTIMES:
+    raise ValueError(f"MODEL_RUNTIME inválido: {MODEL_RUNTIME}. Use: {', '.join(MODEL_RUNTIMES)}")
+
+# Modos de predicción: solo reglas o modelo entrenado combinado con reglas
+PREDICTION_MODES = ("reglas", "modelo")
+DEFAULT_PREDICTION_MODE = os.getenv("PREDICTION_MODE", "modelo")
+
+# Peso de la probabilidad del modelo frente a la probabilidad base del tipo de caso
+MODEL_BLEND_WEIGHT = float(os.getenv("MODEL_BLEND_WEIGHT", "0.6"))
+
+# Características con mayor aporte que se devuelven en cada explicación
+EXPLANATION_TOP_FEATURES = 10
+
+# Formatos de los períodos de /predictions/drift y /predictions/stats
+PERIOD_FORMATS = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+# Máximo de predicciones por página en /predictions/history
+MAX_HISTORY_LIMIT = 500
+
+# Máximo de casos por solicitud en /predict/batch
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "1000"))
+
+# Caché de predicciones: entradas en memoria (0 = desactivado), nivel SQLite opcional y vigencia
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_SQLITE = os.getenv("PREDICTION_CACHE_SQLITE", "0") == "1"
+PREDICTION_CACHE_TTL_HOURS = float(os.getenv("PREDICTION_CACHE_TTL_HOURS", "168"))
+
+# Pool donde se ejecutan las predicciones fuera del event loop ('thread' o 'process')
+PREDICTION_EXECUTOR = os.getenv("PREDICTION_EXECUTOR", "thread")
+PREDICTION_WORKERS = int(os.getenv("PREDICTION_WORKERS", "4"))
+PREDICTION_QUEUE_SIZE = int(os.getenv("PREDICTION_QUEUE_SIZE", "64"))
+
+# Trabajos asíncronos (/jobs): hilos que los procesan, casos por trabajo, trabajos
+# pendientes admitidos y horas que se conservan los terminados
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+MAX_JOB_CASES = int(os.getenv("MAX_JOB_CASES", "100000"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "100"))
+JOB_RETENTION_HOURS = float(os.getenv("JOB_RETENTION_HOURS", "168"))
+# Hosts a los que se puede enviar callback_url, separados por coma (vacío: sin callbacks)
+PREDICTION_CALLBACK_ALLOWED_HOSTS = os.getenv("PREDICTION_CALLBACK_ALLOWED_HOSTS", "").split(",")
+
+# Procesos trabajadores del pool: solo predicen, el proceso principal entrena y programa tareas
+IS_WORKER_PROCESS = os.getenv("PREDICTION_WORKER_PROCESS") == "1"
+
 # Modelos de datos
 class CaseData(BaseModel):
     tipo_caso: str = Field(..., description="Tipo de caso legal")
@@ -58,6 +175,18 @@ class CaseData(BaseModel):
     antecedentes: Optional[str] = Field("", description="Antecedentes del caso")
     jurisdiccion: str = Field("civil", description="Jurisdicción del caso")
 
+class FeatureContribution(BaseModel):
+    caracteristica: str
+    valor: float = Field(..., description="Valor de la característica en el caso")
+    aporte: float = Field(..., description="Aporte a la probabilidad del modelo")
+
+class PredictionExplanation(BaseModel):
+    metodo: str = "caminos_arboles"
+    probabilidad_base: float = Field(..., description="Probabilidad promedio del modelo sin mirar el caso")
+    probabilidad_modelo: float = Field(..., description="probabilidad_base + suma de todos los aportes")
+    peso_modelo: float = Field(..., description="Peso del modelo en probabilidad_exito (el resto son las reglas)")
+    aportes: List[FeatureContribution]
+
 class PredictionResult(BaseModel):
     probabilidad_exito: float
     tipo_sentencia_probable: str
@@ -65,89 +194,88 @@ class PredictionResult(BaseModel):
     recomendaciones: List[str]
     tiempo_estimado_meses: int
     confianza_prediccion: float
+    modo_prediccion: str = "reglas"
+    modelo_version: Optional[str] = None
+    explicacion: Optional[PredictionExplanation] = None
+
+class OutcomeRecord(BaseModel):
+    id: int = Field(..., description="Id de la predicción en case_predictions")
+    resultado_real: str = Field(..., description="Resultado real del caso")
+    fecha_resolucion: Optional[str] = Field(None, description="Fecha de resolución (YYYY-MM-DD)")
+
+def encode_history_cursor(fecha_prediccion: str, prediction_id: int) -> str:
+    """Cursor opaco de /predictions/history: posición de la última fila de la página"""
+    raw = json.dumps([fecha_prediccion, prediction_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_history_cursor(cursor: str) -> Tuple[str, int]:
+    fecha_prediccion, prediction_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return str(fecha_prediccion), int(prediction_id)
 
 class SentencePredictionSystem:
     """Sistema de predicción de sentencias judiciales"""
     
     def __init__(self):
-        self.model = None
-        self.vectorizer = None
-        self.case_types = {
-            "civil": {
-                "probabilidades_base": {"favorable": 0.65, "parcial": 0.25, "desfavorable": 0.10},
-                "tiempo_promedio": 8,
-                "factores_exito": ["evidencia_documental", "testigos", "jurisprudencia_favorable"]
-            },
-            "penal": {
-                "probabilidades_base": {"absolutoria": 0.30, "condenatoria": 0.60, "atenuante": 0.10},
-                "tiempo_promedio": 12,
-                "factores_exito": ["coartada", "evidencia_exculpatoria", "testigos_favorables"]
-            },
-            "laboral": {
-                "probabilidades_base": {"favorable": 0.70, "parcial": 0.20, "desfavorable": 0.10},
-                "tiempo_promedio": 6,
-                "factores_exito": ["documentacion_laboral", "testigos", "historial_empresa"]
-            },
-            "familia": {
-                "probabilidades_base": {"favorable": 0.55, "acuerdo": 0.35, "desfavorable": 0.10},
-                "tiempo_promedio": 10,
-                "factores_exito": ["bienestar_menor", "estabilidad_economica", "entorno_familiar"]
-            },
-            "comercial": {
-                "probabilidades_base": {"favorable": 0.60, "transaccion": 0.30, "desfavorable": 0.10},
-                "tiempo_promedio": 14,
-                "factores_exito": ["contratos", "correspondencia", "historial_comercial"]
-            }
-        }
+        self.registry = ModelRegistry(MODELS_DIR)
+        self.active_model: Optional[ModelBundle] = None
+        self.active_mtime = 0.0
+        self.last_refresh_check = 0.0
+        self.model_lock = threading.Lock()
+        self.retrain_status = {"state": "idle"}
+        self.created_at = time.perf_counter()
+        self.database_ready = False
+        self.model_load_finished = threading.Event()
+        self.startup_timings: Dict[str, float] = {}
+        self.init_lock = threading.Lock()
+        self.case_types = CASE_TYPES
+        self.cache = PredictionCache(max_entries=PREDICTION_CACHE_SIZE,
+                                     ttl_seconds=PREDICTION_CACHE_TTL_HOURS * 3600)
+        self.similar_index = SimilarCaseIndex(SIMILAR_INDEX_PATH, PREDICTIONS_DB_PATH)
+    
+    def initialize(self):
+        """Preparar base de datos y modelo de forma bloqueante (procesos trabajadores, scripts)"""
         self.init_database()
-        self.load_or_create_model()
+        self._load_model()
+    
+    def start_model_loading(self):
+        """Cargar el modelo en un hilo aparte; mientras tanto se predice solo con reglas"""
+        threading.Thread(target=self._load_model, daemon=True, name="model-loader").start()
+    
+    def _load_model(self):
+        with self.init_lock:
+            if self.model_load_finished.is_set():
+                return
+            started = time.perf_counter()
+            try:
+                self.load_or_create_model()
+            except Exception as e:
+                logger.error(f"Error cargando el modelo: {e}")
+            self.startup_timings["model_load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            self.startup_timings["ready_after_ms"] = round((time.perf_counter() - self.created_at) * 1000, 1)
+            self.model_load_finished.set()
+    
+    @property
+    def ready(self) -> bool:
+        return self.database_ready and self.model_load_finished.is_set()
     
     def init_database(self):
-        """Inicializar base de datos para predicciones"""
-        conn = sqlite3.connect('predictions.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS case_predictions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tipo_caso TEXT NOT NULL,
-                descripcion TEXT NOT NULL,
-                monto_disputa REAL,
-                complejidad TEXT,
-                evidencias TEXT,
-                probabilidad_exito REAL,
-                tipo_sentencia_probable TEXT,
-                tiempo_estimado INTEGER,
-                fecha_prediccion DATETIME DEFAULT CURRENT_TIMESTAMP,
-                resultado_real TEXT DEFAULT NULL,
-                fecha_resolucion DATETIME DEFAULT NULL
-            )
-        ''')
-        
-        # Tabla para casos históricos (datos sintéticos para entrenamiento)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS historical_cases (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                tipo_caso TEXT NOT NULL,
-                descripcion TEXT NOT NULL,
-                monto_disputa REAL,
-                complejidad TEXT,
-                evidencias TEXT,
-                resultado TEXT NOT NULL,
-                tiempo_resolucion INTEGER,
-                fecha_caso DATETIME
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        
+        """Inicializar base de datos para predicciones (idempotente)"""
+        if self.database_ready:
+            return
+        started = time.perf_counter()
+        init_predictions_db(PREDICTIONS_DB_PATH)
+
         # Generar datos sintéticos si no existen
         self.generate_synthetic_data()
-    
+        
+        if PREDICTION_CACHE_SQLITE:
+            self.cache.enable_sqlite(PREDICTIONS_DB_PATH)
+        self.database_ready = True
+        self.startup_timings["database_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
     def generate_synthetic_data(self):
-        """Generar datos sintéticos para entrenamiento del modelo"""
-        conn = sqlite3.connect('predictions.db')
+        """Generar datos sintéticos mínimos para entrenamiento (para volumen: generate_synthetic_cases.py)"""
+        conn = sqlite3.connect(PREDICTIONS_DB_PATH)
         cursor = conn.cursor()
         
         # Verificar si ya hay datos
@@ -200,162 +328,451 @@ class SentencePredictionSystem:
              "estatutos,libros_contables,peritaje", "favorable", 20)
         ]
         
-        for case in synthetic_cases:
-            cursor.execute('''
-                INSERT INTO historical_cases 
-                (tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado, tiempo_resolucion, fecha_caso)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (*case, datetime.now() - timedelta(days=np.random.randint(30, 365))))
+        # Fechas de los casos en una sola llamada; inserción en bloque
+        days_ago = np.random.randint(30, 365, len(synthetic_cases))
+        now = datetime.now()
+        cursor.executemany('''
+            INSERT INTO historical_cases 
+            (tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado, tiempo_resolucion, fecha_caso)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(*case, now - timedelta(days=int(days))) for case, days in zip(synthetic_cases, days_ago)])
         
         conn.commit()
         conn.close()
         logger.info("Datos sintéticos generados exitosamente")
     
+    @property
+    def model(self):
+        bundle = self.active_model
+        return bundle.model if bundle else None
+    
+    @property
+    def feature_pipeline(self):
+        bundle = self.active_model
+        return bundle.feature_pipeline if bundle else None
+    
     def load_or_create_model(self):
-        """Cargar modelo existente o crear uno nuevo"""
-        try:
-            self.model = joblib.load('sentence_prediction_model.pkl')
-            self.vectorizer = joblib.load('text_vectorizer.pkl')
-            logger.info("Modelo de predicción cargado exitosamente")
-        except:
-            logger.info("Creando y entrenando nuevo modelo...")
-            self.train_model()
-    
-    def train_model(self):
-        """Entrenar modelo de predicción"""
-        # Cargar datos históricos
-        conn = sqlite3.connect('predictions.db')
-        df = pd.read_sql_query('''
-            SELECT tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado
-            FROM historical_cases
-        ''', conn)
-        conn.close()
+        """Cargar la versión activa del registro o entrenar una nueva en segundo plano"""
+        version = self.registry.active_version()
+        if version:
+            try:
+                self.swap_model(self.registry.load(version, mmap_mode=MODEL_MMAP_MODE, runtime=MODEL_RUNTIME))
+                logger.info(f"Modelo de predicción {version} cargado exitosamente")
+                return
+            except Exception as e:
+                logger.error(f"Error cargando el modelo {version}: {e}")
+        
+        if IS_WORKER_PROCESS:
+            # El proceso principal entrena; este recoge la versión con refresh_active_model
+            return
+        
+        # Mientras tanto las predicciones usan solo las reglas
+        logger.info("No hay un modelo activo; entrenando uno nuevo en segundo plano...")
+        self.start_background_retrain()
+    
+    def swap_model(self, bundle: ModelBundle):
+        """Reemplazar el modelo en uso; las predicciones en curso conservan el anterior"""
+        with self.model_lock:
+            self.active_model = bundle
+            self.active_mtime = self.registry.active_mtime()
+        # Las claves incluyen la versión; esto solo libera las entradas que ya no se usarán
+        self.cache.invalidate(keep_version=bundle.version)
+    
+    def activate_version(self, version: str) -> ModelBundle:
+        """Cargar una versión, marcarla como activa en el registro y ponerla en uso"""
+        bundle = self.registry.load(version, mmap_mode=MODEL_MMAP_MODE, runtime=MODEL_RUNTIME)
+        self.registry.activate(version)
+        self.swap_model(bundle)
+        logger.info(f"Modelo {version} activado")
+        return bundle
+    
+    def rollback_model(self) -> ModelBundle:
+        """Volver a la versión activa anterior"""
+        state = self.registry.rollback()
+        bundle = self.registry.load(state["active"], mmap_mode=MODEL_MMAP_MODE, runtime=MODEL_RUNTIME)
+        self.swap_model(bundle)
+        logger.info(f"Rollback al modelo {bundle.version}")
+        return bundle
+    
+    def refresh_active_model(self):
+        """Recoger cambios de versión hechos por otros workers (revisión limitada en frecuencia)"""
+        now = time.monotonic()
+        if now - self.last_refresh_check < MODEL_REFRESH_SECONDS:
+            return
+        self.last_refresh_check = now
         
-        if len(df) == 0:
-            logger.warning("No hay datos para entrenar el modelo")
+        if self.registry.active_mtime() == self.active_mtime:
             return
+        version = self.registry.active_version()
+        if version and (self.active_model is None or self.active_model.version != version):
+            try:
+                self.swap_model(self.registry.load(version, mmap_mode=MODEL_MMAP_MODE, runtime=MODEL_RUNTIME))
+                logger.info(f"Modelo {version} recargado desde el registro")
+            except Exception as e:
+                logger.error(f"Error recargando el modelo {version}: {e}")
+        else:
+            self.active_mtime = self.registry.active_mtime()
+    
+    def train_model(self) -> Optional[str]:
+        """Entrenar y activar una nueva versión del modelo (bloqueante)"""
+        from model_training import train_model_version
         
-        # Preparar características
-        X_text = df['descripcion'] + ' ' + df['evidencias']
-        X_numerical = df[['monto_disputa']].fillna(0)
+        with self.registry.training_lock():
+            version = train_model_version(PREDICTIONS_DB_PATH, MODELS_DIR, backend=MODEL_BACKEND,
+                                          latency_budget_ms=MODEL_LATENCY_BUDGET_MS,
+                                          text_featurizer=TEXT_FEATURIZER, feature_jobs=FEATURE_JOBS,
+                                          export_onnx=MODEL_RUNTIME == "onnx",
+                                          feature_cache_dir=FEATURE_CACHE_PATH or None)
+            if version:
+                self.activate_version(version)
+        return version
+    
+    def start_background_retrain(self, incremental: bool = False) -> bool:
+        """Reentrenar (completo o incremental) en un proceso aparte y activar el resultado al terminar"""
+        extra_args = ["--backend", MODEL_BACKEND, "--latency-budget-ms", str(MODEL_LATENCY_BUDGET_MS),
+                      "--text-featurizer", TEXT_FEATURIZER, "--feature-jobs", str(FEATURE_JOBS)]
+        if FEATURE_CACHE_PATH:
+            extra_args += ["--feature-cache", os.path.abspath(FEATURE_CACHE_PATH)]
+        if incremental:
+            bundle = self.active_model
+            if bundle is None:
+                return False
+            # Los modelos sin actualización incremental (gbt) incorporan los resultados reentrenando
+            if bundle.metadata.get("backend", "forest") in INCREMENTAL_BACKENDS:
+                extra_args = ["--incremental", "--base-version", bundle.version]
+            else:
+                incremental = False
+        if MODEL_RUNTIME == "onnx":
+            extra_args.append("--onnx")
         
-        # Vectorizar texto
-        self.vectorizer = TfidfVectorizer(max_features=1000, stop_words='english')
-        X_text_vectorized = self.vectorizer.fit_transform(X_text)
+        with self.model_lock:
+            if self.retrain_status["state"] == "running":
+                return False
+            self.retrain_status = {
+                "state": "running",
+                "mode": "incremental" if incremental else "full",
+                "started_at": datetime.now().isoformat()
+            }
         
-        # Combinar características
-        X = np.hstack([X_text_vectorized.toarray(), X_numerical.values])
-        y = df['resultado']
+        threading.Thread(target=self._run_retrain_process,
+                         args=(extra_args, self.registry.active_version()), daemon=True).start()
+        return True
+    
+    def _run_retrain_process(self, extra_args: List[str], requested_on: Optional[str]):
+        """Entrenar con el bloqueo del registro; si otro worker activó una versión mientras
+        se esperaba, se carga esa en lugar de entrenar otra vez"""
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_training.py")
+        try:
+            with self.registry.training_lock():
+                active = self.registry.active_version()
+                if active and active != requested_on:
+                    self.swap_model(self.registry.load(active, mmap_mode=MODEL_MMAP_MODE, runtime=MODEL_RUNTIME))
+                    logger.info(f"Otro proceso entrenó el modelo {active}; se carga sin reentrenar")
+                    status = {"state": "completed", "version": active, "trained_by_other_process": True}
+                else:
+                    result = subprocess.run(
+                        [sys.executable, script, "--db", os.path.abspath(PREDICTIONS_DB_PATH),
+                         "--models-dir", os.path.abspath(MODELS_DIR), *extra_args],
+                        capture_output=True, text=True
+                    )
+                    if result.returncode != 0:
+                        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "sin salida")
+                    
+                    version = json.loads(result.stdout.strip().splitlines()[-1])["version"]
+                    if version:
+                        self.activate_version(version)
+                    status = {"state": "completed", "version": version}
+        except Exception as e:
+            logger.error(f"Error en reentrenamiento en segundo plano: {e}")
+            status = {"state": "failed", "error": str(e)}
         
-        # Entrenar modelo
-        self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.model.fit(X, y)
+        status["finished_at"] = datetime.now().isoformat()
+        with self.model_lock:
+            self.retrain_status = {**self.retrain_status, **status}
+    
+    def model_success_probabilities(self, cases: List[CaseData],
+                                    bundle: Optional[ModelBundle] = None) -> Optional[np.ndarray]:
+        """Probabilidad de éxito según el modelo entrenado para varios casos (None si no hay modelo)"""
+        bundle = bundle or self.active_model
+        if bundle is None:
+            return None
         
-        # Guardar modelo
-        joblib.dump(self.model, 'sentence_prediction_model.pkl')
-        joblib.dump(self.vectorizer, 'text_vectorizer.pkl')
+        from prediction_features import cases_to_frame
+        X = bundle.feature_pipeline.transform(cases_to_frame(cases))
+        probabilities = bundle.model.predict_proba(X)
         
-        logger.info("Modelo entrenado y guardado exitosamente")
+        weights = np.array([OUTCOME_SUCCESS_WEIGHTS.get(label, 0.0) for label in bundle.model.classes_])
+        return probabilities @ weights
     
-    def predict_case_outcome(self, case_data: CaseData) -> PredictionResult:
-        """Predecir resultado de un caso"""
+    def base_success_probability(self, tipo_caso: str) -> float:
+        """Probabilidad base de un resultado favorable para el tipo de caso"""
+        base_probabilities = self.case_types.get(tipo_caso, self.case_types["civil"])["probabilidades_base"]
+        # En penal el resultado favorable para el cliente es la absolución
+        return base_probabilities.get("favorable", base_probabilities.get("absolutoria", 0.5))
+    
+    def predict_case_outcome(self, case_data: CaseData, modo: Optional[str] = None) -> PredictionResult:
+        """Predecir resultado de un caso (modo 'reglas' o 'modelo')"""
+        return self.predict_cases([case_data], modo)[0]
+    
+    def predict_cases(self, cases: List[CaseData], modo: Optional[str] = None) -> List[PredictionResult]:
+        """Predecir resultados de varios casos en una sola pasada vectorizada"""
         try:
-            # Obtener probabilidades base según tipo de caso
-            case_info = self.case_types.get(case_data.tipo_caso, self.case_types["civil"])
-            
-            # Factores que influyen en la probabilidad
-            probability_adjustments = 0.0
-            risk_factors = []
-            recommendations = []
+            modo = modo or DEFAULT_PREDICTION_MODE
+            if not cases:
+                return []
             
-            # Análisis de evidencias
-            evidence_score = len(case_data.evidencias) * 0.05
-            if evidence_score > 0.2:
-                evidence_score = 0.2
-            probability_adjustments += evidence_score
+            self.refresh_active_model()
             
-            if len(case_data.evidencias) < 2:
-                risk_factors.append("Evidencias insuficientes")
-                recommendations.append("Recopilar más evidencias documentales")
+            # Características de las reglas como arreglos
+            tipos = [case.tipo_caso if case.tipo_caso in self.case_types else "civil" for case in cases]
+            num_evidences = np.array([len(case.evidencias) for case in cases])
+            montos = np.array([case.monto_disputa or 0 for case in cases], dtype=float)
+            complejidad = np.array([case.complejidad for case in cases])
             
-            # Análisis de complejidad
-            complexity_impact = {
-                "baja": 0.1,
-                "media": 0.0,
-                "alta": -0.15
-            }
-            probability_adjustments += complexity_impact.get(case_data.complejidad, 0.0)
-            
-            if case_data.complejidad == "alta":
-                risk_factors.append("Caso de alta complejidad")
-                recommendations.append("Considerar especialización adicional")
+            high_complexity = complejidad == "alta"
+            high_amount = montos > 100000
+            few_evidences = num_evidences < 2
             
-            # Análisis de monto
-            if case_data.monto_disputa > 100000:
-                probability_adjustments -= 0.05
-                risk_factors.append("Alto monto en disputa aumenta escrutinio")
-                recommendations.append("Preparar documentación financiera detallada")
-            
-            # Calcular probabilidad final
-            base_probability = case_info["probabilidades_base"]["favorable"]
-            final_probability = max(0.1, min(0.95, base_probability + probability_adjustments))
+            # Análisis de evidencias, complejidad y monto
+            probability_adjustments = np.minimum(num_evidences * 0.05, 0.2)
+            probability_adjustments += np.select(
+                [complejidad == "baja", high_complexity], [0.1, -0.15], default=0.0
+            )
+            probability_adjustments -= 0.05 * high_amount
             
-            # Determinar tipo de sentencia probable
-            if final_probability > 0.7:
-                sentence_type = "Favorable"
-            elif final_probability > 0.4:
-                sentence_type = "Parcialmente favorable"
+            # Probabilidad base, combinada con el modelo entrenado si corresponde
+            base_probability = np.array([self.base_success_probability(tipo) for tipo in tipos])
+            # Una sola referencia: un cambio de versión a mitad de la predicción no la afecta
+            bundle = self.active_model if modo == "modelo" else None
+            model_probability = self.model_success_probabilities(cases, bundle) if bundle else None
+            if model_probability is not None:
+                base_probability = (MODEL_BLEND_WEIGHT * model_probability
+                                    + (1 - MODEL_BLEND_WEIGHT) * base_probability)
             else:
-                sentence_type = "Desfavorable"
+                modo = "reglas"
             
-            # Estimación de tiempo
-            base_time = case_info["tiempo_promedio"]
-            time_adjustment = 0
+            final_probability = np.clip(base_probability + probability_adjustments, 0.1, 0.95)
             
-            if case_data.complejidad == "alta":
-                time_adjustment += 2
-            if case_data.monto_disputa > 100000:
-                time_adjustment += 1
+            # Tipo de sentencia probable
+            sentence_types = np.select(
+                [final_probability > 0.7, final_probability > 0.4],
+                ["Favorable", "Parcialmente favorable"],
+                default="Desfavorable"
+            )
             
-            estimated_time = base_time + time_adjustment
+            # Estimación de tiempo
+            base_time = np.array([self.case_types[tipo]["tiempo_promedio"] for tipo in tipos])
+            estimated_time = base_time + 2 * high_complexity + high_amount
             
             # Confianza de la predicción
-            confidence = 0.7 + (len(case_data.evidencias) * 0.05)
-            confidence = min(0.95, confidence)
+            confidence = np.minimum(0.95, 0.7 + num_evidences * 0.05)
             
-            # Recomendaciones generales
-            if not recommendations:
-                recommendations = [
-                    "Revisar jurisprudencia similar",
-                    "Fortalecer argumentación legal",
-                    "Considerar mediación si es apropiado"
-                ]
+            results = []
+            for i in range(len(cases)):
+                risk_factors = []
+                recommendations = []
+                
+                if few_evidences[i]:
+                    risk_factors.append("Evidencias insuficientes")
+                    recommendations.append("Recopilar más evidencias documentales")
+                if high_complexity[i]:
+                    risk_factors.append("Caso de alta complejidad")
+                    recommendations.append("Considerar especialización adicional")
+                if high_amount[i]:
+                    risk_factors.append("Alto monto en disputa aumenta escrutinio")
+                    recommendations.append("Preparar documentación financiera detallada")
+                
+                # Recomendaciones generales
+                if not recommendations:
+                    recommendations = [
+                        "Revisar jurisprudencia similar",
+                        "Fortalecer argumentación legal",
+                        "Considerar mediación si es apropiado"
+                    ]
+                
+                results.append(PredictionResult(
+                    probabilidad_exito=round(float(final_probability[i]), 2),
+                    tipo_sentencia_probable=str(sentence_types[i]),
+                    factores_riesgo=risk_factors,
+                    recomendaciones=recommendations,
+                    tiempo_estimado_meses=int(estimated_time[i]),
+                    confianza_prediccion=round(float(confidence[i]), 2),
+                    modo_prediccion=modo,
+                    modelo_version=bundle.version if model_probability is not None else None
+                ))
             
-            return PredictionResult(
-                probabilidad_exito=round(final_probability, 2),
-                tipo_sentencia_probable=sentence_type,
-                factores_riesgo=risk_factors,
-                recomendaciones=recommendations,
-                tiempo_estimado_meses=estimated_time,
-                confianza_prediccion=round(confidence, 2)
-            )
+            return results
             
         except Exception as e:
             logger.error(f"Error en predicción: {e}")
             raise HTTPException(status_code=500, detail="Error en predicción")
     
+    def explain_cases(self, cases: List[CaseData],
+                      bundle: ModelBundle) -> List[Optional[PredictionExplanation]]:
+        """Aportes de cada característica a la probabilidad de éxito del modelo
+
+        Descomposición por caminos de los árboles (Saabas), vectorizada sobre
+        todos los casos y árboles; None para cada caso si el modelo no es un bosque.
+        """
+        forest = bundle.packed_forest
+        if forest is None or not cases:
+            return [None] * len(cases)
+        
+        from prediction_features import cases_to_frame
+        X = bundle.feature_pipeline.transform(cases_to_frame(cases))
+        weights = [OUTCOME_SUCCESS_WEIGHTS.get(label, 0.0) for label in forest.classes_]
+        base, contributions = forest.contributions(X, weights)
+        
+        n_top = min(EXPLANATION_TOP_FEATURES, contributions.shape[1])
+        top = np.argpartition(-np.abs(contributions), n_top - 1, axis=1)[:, :n_top]
+        names = bundle.feature_names
+        hashing = bundle.feature_pipeline.text_featurizer == "hashing"
+        explanations = []
+        for i, columns in enumerate(top):
+            columns = columns[np.argsort(-np.abs(contributions[i, columns]))]
+            values = X[i, columns].toarray().ravel()
+            # Con hashing las columnas de texto no tienen nombre: se usan los términos del caso
+            terms = bundle.feature_pipeline.hashed_terms(cases[i].descripcion, cases[i].evidencias) if hashing else {}
+            explanations.append(PredictionExplanation(
+                probabilidad_base=round(base, 4),
+                probabilidad_modelo=round(base + float(contributions[i].sum()), 4),
+                peso_modelo=MODEL_BLEND_WEIGHT,
+                aportes=[
+                    FeatureContribution(caracteristica=f"texto:{terms[j]}" if j in terms else names[j],
+                                        valor=round(float(v), 4),
+                                        aporte=round(float(contributions[i, j]), 4))
+                    for j, v in zip(columns, values) if contributions[i, j] != 0
+                ]
+            ))
+        return explanations
+    
+    def add_explanations(self, results: List[PredictionResult], cases: List[CaseData],
+                         bundle: Optional[ModelBundle]) -> List[int]:
+        """Completar la explicación de los resultados del modelo que no la tienen; devuelve sus índices"""
+        pending = [i for i, result in enumerate(results)
+                   if result.explicacion is None and bundle is not None
+                   and result.modelo_version == bundle.version]
+        if pending:
+            explanations = self.explain_cases([cases[i] for i in pending], bundle)
+            for i, explanation in zip(pending, explanations):
+                results[i].explicacion = explanation
+        return pending
+    
+    def predict_cached(self, cases: List[CaseData], modo: Optional[str] = None,
+                       explicar: bool = False) -> Tuple[List[PredictionResult], List[int]]:
+        """Predecir usando la caché; devuelve los resultados y los índices que se calcularon de nuevo
+
+        Con explicar=True los resultados del modelo incluyen los aportes por
+        característica, que se guardan en la caché junto a la predicción.
+        """
+        modo = modo or DEFAULT_PREDICTION_MODE
+        self.refresh_active_model()
+        bundle = self.active_model if modo == "modelo" else None
+        if not self.cache.enabled:
+            results = self.predict_cases(cases, modo)
+            if explicar:
+                self.add_explanations(results, cases, bundle)
+            return results, list(range(len(cases)))
+        
+        version = bundle.version if bundle else "reglas"
+        
+        case_dicts = [case.model_dump() for case in cases]
+        results: List[Optional[PredictionResult]] = [None] * len(cases)
+        misses = []
+        for i, case_dict in enumerate(case_dicts):
+            entry = self.cache.get(PredictionCache.make_key(case_dict, modo, version))
+            if entry is not None:
+                results[i] = PredictionResult(**entry)
+            else:
+                misses.append(i)
+        
+        if misses:
+            computed = self.predict_cases([cases[i] for i in misses], modo)
+            for i, prediction in zip(misses, computed):
+                results[i] = prediction
+        
+        # Se guardan los resultados nuevos y los que ganaron una explicación
+        changed = set(misses)
+        if explicar:
+            changed.update(self.add_explanations(results, cases, bundle))
+        if changed:
+            new_entries: Dict[str, Dict] = {}
+            for i in sorted(changed):
+                # Clave según la versión que realmente produjo el resultado (pudo cambiar entretanto)
+                key = PredictionCache.make_key(case_dicts[i], modo, results[i].modelo_version or "reglas")
+                new_entries[key] = results[i].model_dump()
+            self.cache.put_many(new_entries)
+        
+        if not explicar:
+            results = [result if result.explicacion is None else result.model_copy(update={"explicacion": None})
+                       for result in results]
+        return results, misses
+    
+    def predict_and_save(self, cases: List[CaseData], modo: Optional[str] = None,
+                         explicar: bool = False) -> Tuple[List[PredictionResult], Dict[str, float]]:
+        """Predecir y guardar lo calculado de nuevo; devuelve también los tiempos de cada etapa"""
+        started = time.perf_counter()
+        predictions, computed = self.predict_cached(cases, modo, explicar)
+        inferred = time.perf_counter()
+        if computed:
+            self.save_predictions([cases[i] for i in computed], [predictions[i] for i in computed])
+        saved = time.perf_counter()
+        return predictions, {
+            "inference_ms": (inferred - started) * 1000,
+            "persistence_ms": (saved - inferred) * 1000
+        }
+    
+    def record_outcomes(self, outcomes: List[OutcomeRecord]) -> int:
+        """Registrar resultados reales de predicciones en una sola transacción"""
+        conn = sqlite3.connect(PREDICTIONS_DB_PATH)
+        cursor = conn.cursor()
+        try:
+            # La secuencia se lee y se asigna bajo el mismo bloqueo de escritura
+            cursor.execute('BEGIN IMMEDIATE')
+            last_seq = cursor.execute(
+                'SELECT COALESCE(MAX(resultado_seq), 0) FROM case_predictions'
+            ).fetchone()[0]
+            cursor.executemany('''
+                UPDATE case_predictions
+                SET resultado_real = ?, fecha_resolucion = COALESCE(?, CURRENT_TIMESTAMP),
+                    resultado_seq = ?
+                WHERE id = ?
+            ''', [(o.resultado_real, o.fecha_resolucion, last_seq + i, o.id)
+                  for i, o in enumerate(outcomes, start=1)])
+            updated = cursor.rowcount
+            conn.commit()
+            return updated
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
     def save_prediction(self, case_data: CaseData, prediction: PredictionResult):
         """Guardar predicción en base de datos"""
+        self.save_predictions([case_data], [prediction])
+    
+    def save_predictions(self, cases: List[CaseData], predictions: List[PredictionResult]):
+        """Guardar varias predicciones en una sola transacción"""
         try:
-            conn = sqlite3.connect('predictions.db')
-            cursor = conn.cursor()
+            conn = sqlite3.connect(PREDICTIONS_DB_PATH)
+            self.insert_predictions(conn, cases, predictions)
+            conn.commit()
+            conn.close()
             
-            cursor.execute('''
-                INSERT INTO case_predictions 
-                (tipo_caso, descripcion, monto_disputa, complejidad, evidencias, 
-                 probabilidad_exito, tipo_sentencia_probable, tiempo_estimado)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
+        except Exception as e:
+            logger.error(f"Error guardando predicciones: {e}")
+    
+    def insert_predictions(self, conn: sqlite3.Connection, cases: List[CaseData],
+                           predictions: List[PredictionResult]):
+        """Insertar predicciones en la transacción abierta de conn (sin confirmarla)"""
+        conn.executemany('''
+            INSERT INTO case_predictions 
+            (tipo_caso, descripcion, monto_disputa, complejidad, evidencias, 
+             probabilidad_exito, tipo_sentencia_probable, tiempo_estimado, modelo_version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (
                 case_data.tipo_caso,
                 case_data.descripcion,
                 case_data.monto_disputa,
@@ -363,31 +780,357 @@ class SentencePredictionSystem:
                 json.dumps(case_data.evidencias),
                 prediction.probabilidad_exito,
                 prediction.tipo_sentencia_probable,
-                prediction.tiempo_estimado_meses
-            ))
-            
-            conn.commit()
-            conn.close()
-            
-        except Exception as e:
-            logger.error(f"Error guardando predicción: {e}")
+                prediction.tiempo_estimado_meses,
+                prediction.modelo_version
+            )
+            for case_data, prediction in zip(cases, predictions)
+        ])
 
-# Instancia global del sistema
+def process_memory() -> Dict:
+    """Memoria del proceso actual (con varios workers, cada uno responde por la suya)"""
+    info = {"pid": os.getpid(), "rss_mb": None, "shared_mb": None, "peak_rss_mb": None}
+    try:
+        # shared: páginas respaldadas por archivos, incluidos los artefactos mapeados
+        with open("/proc/self/statm") as f:
+            resident, shared = (int(v) for v in f.read().split()[1:3])
+        page_mb = os.sysconf("SC_PAGE_SIZE") / 2**20
+        info["rss_mb"] = round(resident * page_mb, 1)
+        info["shared_mb"] = round(shared * page_mb, 1)
+    except (OSError, ValueError, AttributeError):
+        try:
+            import psutil
+            info["rss_mb"] = round(psutil.Process().memory_info().rss / 2**20, 1)
+        except ImportError:
+            pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        info["peak_rss_mb"] = round(peak / (2**20 if sys.platform == "darwin" else 1024), 1)
+    except ImportError:
+        pass
+    return info
+
+# Instancia global del sistema (liviana; se prepara en el lifespan o con initialize)
 prediction_system = SentencePredictionSystem()
+prediction_pool = PredictionPool(PREDICTION_EXECUTOR, PREDICTION_WORKERS, PREDICTION_QUEUE_SIZE)
+
+async def run_predictions(cases: List[CaseData], modo: Optional[str],
+                          explicar: bool = False) -> List[PredictionResult]:
+    """Predecir y guardar en el pool de trabajadores sin bloquear el event loop"""
+    if prediction_pool.kind == "process":
+        results = await prediction_pool.run(predict_in_process, [case.model_dump() for case in cases],
+                                            modo, explicar)
+        return [PredictionResult(**result) for result in results]
+    return await prediction_pool.run(prediction_system.predict_and_save, cases, modo, explicar)
+
+job_manager = JobManager(PREDICTIONS_DB_PATH, workers=JOB_WORKERS, max_queued=MAX_QUEUED_JOBS,
+                         retention_seconds=JOB_RETENTION_HOURS * 3600,
+                         callback_allowed_hosts=PREDICTION_CALLBACK_ALLOWED_HOSTS)
+
+def predict_batch_job(params: Dict, items: List[Dict]) -> Tuple[List[Dict], Callable]:
+    """Bloque de un trabajo de predicción por lotes (en un hilo del pool de trabajos)
+
+    Las predicciones calculadas se guardan con el progreso del bloque (ver prediction_jobs),
+    no aparte como en predict_and_save, para que un bloque repetido no las duplique.
+    """
+    cases = [CaseData(**item) for item in items]
+    predictions, computed = prediction_system.predict_cached(cases, params["modo"], params["explicar"])
+    
+    def write(conn: sqlite3.Connection):
+        prediction_system.insert_predictions(conn, [cases[i] for i in computed],
+                                             [predictions[i] for i in computed])
+    
+    return [prediction.model_dump() for prediction in predictions], write
+
+def similar_cases_job(params: Dict, items: List[Dict]) -> Tuple[List[Dict], None]:
+    """Bloque de un trabajo de búsqueda de casos similares"""
+    index = prediction_system.similar_index
+    if not index.ready:
+        raise RuntimeError("El índice de casos similares no está disponible")
+    results = []
+    for item in items:
+        matches = index.query(item["descripcion"], item["evidencias"], params["k"],
+                              item["tipo_caso"] if params["mismo_tipo"] else None)
+        results.append({"casos": index.fetch_cases(matches)})
+    return results, None
+
+job_manager.register("predict_batch", predict_batch_job)
+job_manager.register("similar_cases", similar_cases_job)
+
+def pool_saturated_error() -> HTTPException:
+    return HTTPException(status_code=503, detail="Servicio de predicción saturado, reintente en unos segundos",
+                         headers={"Retry-After": "1"})
+
+async def incremental_training_loop():
+    """Tarea programada: actualización incremental periódica con los resultados reales"""
+    while True:
+        await asyncio.sleep(INCREMENTAL_TRAINING_HOURS * 3600)
+        if prediction_system.start_background_retrain(incremental=True):
+            logger.info("Actualización incremental programada iniciada")
+
+async def job_recovery_loop():
+    """Tarea programada: retomar trabajos huérfanos de procesos que dejaron de avanzar"""
+    while True:
+        await asyncio.sleep(JOB_STALE_SECONDS)
+        try:
+            await asyncio.to_thread(job_manager.recover)
+        except Exception as e:
+            logger.error(f"Error retomando trabajos: {e}")
 
 # === ENDPOINTS ===
 
 @app.post("/predict", response_model=PredictionResult)
-async def predict_sentence(case_data: CaseData):
-    """Predecir resultado de un caso legal"""
+async def predict_sentence(case_data: CaseData, modo: Optional[str] = None, explicar: bool = False):
+    """Predecir resultado de un caso legal (explicar=true agrega los aportes por característica)"""
+    if modo is not None and modo not in PREDICTION_MODES:
+        raise HTTPException(status_code=400, detail=f"Modo inválido. Use: {', '.join(PREDICTION_MODES)}")
+    
     try:
-        prediction = prediction_system.predict_case_outcome(case_data)
-        prediction_system.save_prediction(case_data, prediction)
-        return prediction
+        # Un caso ya enviado con los mismos datos no se recalcula ni se vuelve a guardar
+        predictions = await run_predictions([case_data], modo, explicar)
+        return predictions[0]
+    except PoolSaturated:
+        raise pool_saturated_error()
     except Exception as e:
         logger.error(f"Error en endpoint de predicción: {e}")
         raise HTTPException(status_code=500, detail="Error procesando predicción")
 
+@app.post("/predict/batch", response_model=List[PredictionResult])
+async def predict_sentence_batch(cases: List[CaseData], modo: Optional[str] = None,
+                                 explicar: bool = False):
+    """Predecir un portafolio de casos; los resultados respetan el orden de entrada"""
+    if modo is not None and modo not in PREDICTION_MODES:
+        raise HTTPException(status_code=400, detail=f"Modo inválido. Use: {', '.join(PREDICTION_MODES)}")
+    if len(cases) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_BATCH_SIZE} casos por solicitud")
+    
+    try:
+        return await run_predictions(cases, modo, explicar)
+    except PoolSaturated:
+        raise pool_saturated_error()
+    except Exception as e:
+        logger.error(f"Error en endpoint de predicción por lotes: {e}")
+        raise HTTPException(status_code=500, detail="Error procesando predicciones")
+
+@app.post("/predictions/outcomes")
+async def record_prediction_outcomes(outcomes: List[OutcomeRecord]):
+    """Registrar en bloque los resultados reales de predicciones anteriores"""
+    invalid = sorted({o.resultado_real for o in outcomes} - set(OUTCOME_SUCCESS_WEIGHTS))
+    if invalid:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Resultados no reconocidos: {', '.join(invalid)}. Use: {', '.join(OUTCOME_SUCCESS_WEIGHTS)}"
+        )
+    
+    try:
+        updated = prediction_system.record_outcomes(outcomes)
+        return {"received": len(outcomes), "updated": updated, "not_found": len(outcomes) - updated}
+    except Exception as e:
+        logger.error(f"Error registrando resultados reales: {e}")
+        raise HTTPException(status_code=500, detail="Error registrando resultados")
+
+@app.get("/predictions/drift")
+async def get_prediction_drift(bucket: str = "month"):
+    """Exactitud de las predicciones frente a los resultados reales a lo largo del tiempo"""
+    if bucket not in PERIOD_FORMATS:
+        raise HTTPException(status_code=400, detail="bucket debe ser: day, week o month")
+    
+    try:
+        # Nivel de éxito real y predicho: 1 (favorable), 0.5 (parcial), 0 (desfavorable)
+        real_level = "CASE resultado_real " + " ".join("WHEN ? THEN ?" for _ in OUTCOME_SUCCESS_WEIGHTS) + " END"
+        real_params = [value for item in OUTCOME_SUCCESS_WEIGHTS.items() for value in item]
+        
+        conn = sqlite3.connect(PREDICTIONS_DB_PATH)
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT strftime(?, fecha_prediccion) AS periodo,
+                   COALESCE(modelo_version, 'reglas') AS version,
+                   COUNT(*),
+                   SUM(nivel_predicho = nivel_real),
+                   AVG((probabilidad_exito - nivel_real) * (probabilidad_exito - nivel_real))
+            FROM (
+                SELECT fecha_prediccion, modelo_version, probabilidad_exito,
+                       CASE tipo_sentencia_probable
+                           WHEN 'Favorable' THEN 1.0
+                           WHEN 'Parcialmente favorable' THEN 0.5
+                           ELSE 0.0
+                       END AS nivel_predicho,
+                       {real_level} AS nivel_real
+                FROM case_predictions
+                WHERE resultado_real IS NOT NULL
+            )
+            GROUP BY periodo, version
+            ORDER BY periodo, version
+        ''', (PERIOD_FORMATS[bucket], *real_params))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {
+            "bucket": bucket,
+            "series": [
+                {
+                    "periodo": row[0],
+                    "modelo_version": row[1],
+                    "resueltos": row[2],
+                    "exactitud": round(row[3] / row[2], 4) if row[2] else None,
+                    "brier": round(row[4], 4) if row[4] is not None else None
+                }
+                for row in rows
+            ]
+        }
+        
+    except Exception as e:
+        logger.error(f"Error calculando drift: {e}")
+        raise HTTPException(status_code=500, detail="Error calculando drift")
+
+@app.post("/historical_cases/import")
+async def import_historical_cases(request: Request, formato: str = "csv", reentrenar: bool = False):
+    """Importar sentencias reales (cuerpo: archivo CSV, JSONL o Parquet) a historical_cases"""
+    from import_historical_cases import IMPORT_FORMATS, import_cases
+    
+    if formato not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato inválido. Use: {', '.join(IMPORT_FORMATS)}")
+    
+    # El cuerpo se copia a disco por partes y el importador lo lee por bloques
+    tmp = tempfile.NamedTemporaryFile(suffix=f".{formato}", delete=False)
+    try:
+        with tmp:
+            async for part in request.stream():
+                tmp.write(part)
+        stats = await asyncio.to_thread(import_cases, PREDICTIONS_DB_PATH, tmp.name, formato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error importando casos históricos: {e}")
+        raise HTTPException(status_code=500, detail="Error importando casos históricos")
+    finally:
+        os.unlink(tmp.name)
+    
+    if stats["inserted"]:
+        # Los casos nuevos se agregan al índice de similares como un segmento
+        prediction_system.similar_index.start_update()
+    if reentrenar and stats["inserted"]:
+        stats["retrain_started"] = prediction_system.start_background_retrain()
+    return stats
+
+@app.post("/similar_cases")
+async def get_similar_cases(case_data: CaseData, k: int = 10, mismo_tipo: bool = True):
+    """Casos históricos más parecidos (similitud coseno sobre TF-IDF) con su resultado y duración"""
+    if not 1 <= k <= MAX_SIMILAR_CASES:
+        raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {MAX_SIMILAR_CASES}")
+    index = prediction_system.similar_index
+    if not index.ready:
+        raise HTTPException(status_code=503, detail="El índice de casos similares se está construyendo",
+                            headers={"Retry-After": "5"})
+    
+    try:
+        started = time.perf_counter()
+        matches = await asyncio.to_thread(
+            index.query, case_data.descripcion, case_data.evidencias, k,
+            case_data.tipo_caso if mismo_tipo else None
+        )
+        search_ms = (time.perf_counter() - started) * 1000
+        cases = await asyncio.to_thread(index.fetch_cases, matches)
+        return {
+            "casos": cases,
+            "casos_indexados": index.n_cases,
+            "tiempo_busqueda_ms": round(search_ms, 2)
+        }
+    except Exception as e:
+        logger.error(f"Error buscando casos similares: {e}")
+        raise HTTPException(status_code=500, detail="Error buscando casos similares")
+
+@app.get("/similar_cases/index")
+async def get_similar_index_status():
+    """Estado del índice de casos similares"""
+    return prediction_system.similar_index.info()
+
+@app.post("/similar_cases/rebuild", status_code=202)
+async def rebuild_similar_index():
+    """Reconstruir el índice desde cero (vocabulario e idf nuevos) en segundo plano"""
+    index = prediction_system.similar_index
+    # Sin índice en memoria se intenta primero cargar el guardado
+    if not index.start_build(rebuild=index.ready):
+        raise HTTPException(status_code=409, detail="El índice ya se está construyendo")
+    return {"state": "building"}
+
+# === TRABAJOS ASÍNCRONOS ===
+
+def submit_job(kind: str, cases: List[CaseData], params: Dict, callback_url: Optional[str]) -> Dict:
+    if not cases:
+        raise HTTPException(status_code=400, detail="Envíe al menos un caso")
+    if len(cases) > MAX_JOB_CASES:
+        raise HTTPException(status_code=413, detail=f"Máximo {MAX_JOB_CASES} casos por trabajo")
+    try:
+        return job_manager.submit(kind, [case.model_dump() for case in cases], params, callback_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+@app.post("/jobs/predict/batch", status_code=202)
+async def submit_prediction_job(cases: List[CaseData], modo: Optional[str] = None, explicar: bool = False,
+                                callback_url: Optional[str] = None):
+    """Encolar un lote de predicciones; el resultado se consulta en /jobs/{id} o llega a callback_url"""
+    if modo is not None and modo not in PREDICTION_MODES:
+        raise HTTPException(status_code=400, detail=f"Modo inválido. Use: {', '.join(PREDICTION_MODES)}")
+    
+    try:
+        return await asyncio.to_thread(submit_job, "predict_batch", cases,
+                                       {"modo": modo, "explicar": explicar}, callback_url)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error encolando predicciones: {e}")
+        raise HTTPException(status_code=500, detail="Error encolando predicciones")
+
+@app.post("/jobs/similar_cases", status_code=202)
+async def submit_similar_cases_job(cases: List[CaseData], k: int = 10, mismo_tipo: bool = True,
+                                   callback_url: Optional[str] = None):
+    """Encolar búsquedas de casos similares para varios casos (un resultado por caso)"""
+    if not 1 <= k <= MAX_SIMILAR_CASES:
+        raise HTTPException(status_code=400, detail=f"k debe estar entre 1 y {MAX_SIMILAR_CASES}")
+    if not prediction_system.similar_index.ready:
+        raise HTTPException(status_code=503, detail="El índice de casos similares se está construyendo",
+                            headers={"Retry-After": "5"})
+    
+    try:
+        return await asyncio.to_thread(submit_job, "similar_cases", cases,
+                                       {"k": k, "mismo_tipo": mismo_tipo}, callback_url)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error encolando búsqueda de casos similares: {e}")
+        raise HTTPException(status_code=500, detail="Error encolando búsqueda de casos similares")
+
+@app.get("/jobs")
+async def list_jobs(state: Optional[str] = None, limit: int = 50):
+    """Trabajos más recientes (sin resultados)"""
+    if state is not None and state not in JOB_STATES:
+        raise HTTPException(status_code=400, detail=f"Estado inválido. Use: {', '.join(JOB_STATES)}")
+    if not 1 <= limit <= MAX_HISTORY_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit debe estar entre 1 y {MAX_HISTORY_LIMIT}")
+    return {"jobs": await asyncio.to_thread(job_manager.list_jobs, state, limit)}
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, resultados: bool = True):
+    """Estado y progreso de un trabajo; al completarse incluye los resultados en el orden de entrada"""
+    status = await asyncio.to_thread(job_manager.status, job_id, resultados)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo no encontrado: {job_id}")
+    return status
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancelar un trabajo; si está en curso se detiene al terminar el bloque actual"""
+    status = await asyncio.to_thread(job_manager.status, job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Trabajo no encontrado: {job_id}")
+    if status["state"] in FINISHED_STATES:
+        raise HTTPException(status_code=409, detail=f"El trabajo ya terminó ({status['state']})")
+    return await asyncio.to_thread(job_manager.cancel, job_id)
+
 @app.get("/case_types")
 async def get_case_types():
     """Obtener tipos de casos disponibles"""
@@ -397,54 +1140,112 @@ async def get_case_types():
     }
 
 @app.get("/predictions/history")
-async def get_prediction_history(limit: int = 50):
-    """Obtener historial de predicciones"""
+async def get_prediction_history(limit: int = 50, cursor: Optional[str] = None):
+    """Historial de predicciones, de la más reciente a la más antigua
+    
+    Paginado por conjunto de claves: next_cursor se pasa como cursor para la
+    página siguiente, que se lee con el índice de fecha_prediccion sin
+    importar cuántas predicciones haya antes.
+    """
+    if not 1 <= limit <= MAX_HISTORY_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit debe estar entre 1 y {MAX_HISTORY_LIMIT}")
+    position = None
+    if cursor:
+        try:
+            position = decode_history_cursor(cursor)
+        except Exception:
+            raise HTTPException(status_code=400, detail="cursor inválido")
+    
     try:
-        conn = sqlite3.connect('predictions.db')
-        cursor = conn.cursor()
+        conn = sqlite3.connect(PREDICTIONS_DB_PATH)
+        db_cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT * FROM case_predictions 
-            ORDER BY fecha_prediccion DESC 
-            LIMIT ?
-        ''', (limit,))
+        # Una fila de más para saber si hay página siguiente
+        if position:
+            db_cursor.execute('''
+                SELECT * FROM case_predictions
+                WHERE (fecha_prediccion, id) < (?, ?)
+                ORDER BY fecha_prediccion DESC, id DESC
+                LIMIT ?
+            ''', (*position, limit + 1))
+        else:
+            db_cursor.execute('''
+                SELECT * FROM case_predictions
+                ORDER BY fecha_prediccion DESC, id DESC
+                LIMIT ?
+            ''', (limit + 1,))
         
-        columns = [description[0] for description in cursor.description]
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        columns = [description[0] for description in db_cursor.description]
+        results = [dict(zip(columns, row)) for row in db_cursor.fetchall()]
         
         conn.close()
-        return {"predictions": results}
+        
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_cursor = encode_history_cursor(results[-1]["fecha_prediccion"], results[-1]["id"])
+        return {"predictions": results, "next_cursor": next_cursor}
         
     except Exception as e:
         logger.error(f"Error obteniendo historial: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo historial")
 
 @app.get("/predictions/stats")
-async def get_prediction_stats():
-    """Obtener estadísticas de predicciones"""
+async def get_prediction_stats(bucket: Optional[str] = None, desde: Optional[str] = None):
+    """Estadísticas de predicciones por tipo de caso y, con bucket, por período
+    
+    Se leen de los agregados que mantienen los triggers de case_predictions
+    (ver prediction_db.init_prediction_stats). desde (YYYY-MM-DD) acota la serie por período.
+    """
+    if bucket is not None and bucket not in PERIOD_FORMATS:
+        raise HTTPException(status_code=400, detail="bucket debe ser: day, week o month")
+    if desde is not None:
+        try:
+            datetime.strptime(desde, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail="desde debe tener formato YYYY-MM-DD")
+    
     try:
-        conn = sqlite3.connect('predictions.db')
+        conn = sqlite3.connect(PREDICTIONS_DB_PATH)
         cursor = conn.cursor()
         
-        # Estadísticas por tipo de caso
+        # Estadísticas por tipo de caso (se conservan filas en cero tras borrados)
         cursor.execute('''
-            SELECT tipo_caso, COUNT(*) as total, 
-                   AVG(probabilidad_exito) as probabilidad_promedio,
-                   AVG(tiempo_estimado) as tiempo_promedio
-            FROM case_predictions 
-            GROUP BY tipo_caso
+            SELECT tipo_caso, total,
+                   suma_probabilidad / NULLIF(n_probabilidad, 0) AS probabilidad_promedio,
+                   suma_tiempo / NULLIF(n_tiempo, 0) AS tiempo_promedio
+            FROM prediction_stats
+            WHERE total > 0
+            ORDER BY tipo_caso
         ''')
-        
         stats_by_type = cursor.fetchall()
         
-        # Total de predicciones
-        cursor.execute('SELECT COUNT(*) FROM case_predictions')
-        total_predictions = cursor.fetchone()[0]
+        series = None
+        if bucket is not None:
+            cursor.execute('''
+                SELECT strftime(?, dia) AS periodo, tipo_caso, SUM(total),
+                       SUM(suma_probabilidad) / NULLIF(SUM(n_probabilidad), 0),
+                       SUM(suma_tiempo) / NULLIF(SUM(n_tiempo), 0)
+                FROM prediction_stats_daily
+                WHERE dia >= COALESCE(?, '') AND total > 0
+                GROUP BY periodo, tipo_caso
+                ORDER BY periodo, tipo_caso
+            ''', (PERIOD_FORMATS[bucket], desde))
+            series = [
+                {
+                    "periodo": row[0],
+                    "tipo_caso": row[1],
+                    "total": row[2],
+                    "probabilidad_promedio": round(row[3], 2) if row[3] else 0,
+                    "tiempo_promedio": round(row[4], 1) if row[4] else 0
+                }
+                for row in cursor.fetchall()
+            ]
         
         conn.close()
         
-        return {
-            "total_predictions": total_predictions,
+        response = {
+            "total_predictions": sum(row[1] for row in stats_by_type),
             "stats_by_type": [
                 {
                     "tipo_caso": row[0],
@@ -455,11 +1256,81 @@ async def get_prediction_stats():
                 for row in stats_by_type
             ]
         }
+        if series is not None:
+            response["bucket"] = bucket
+            response["series"] = series
+        return response
         
     except Exception as e:
         logger.error(f"Error obteniendo estadísticas: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo estadísticas")
 
+@app.get("/metrics/prediction")
+async def get_prediction_metrics():
+    """Ocupación del pool y tiempos por etapa: espera en cola, inferencia y persistencia"""
+    return prediction_pool.metrics()
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Tasa de aciertos y tamaño de la caché de predicciones"""
+    return prediction_system.cache.metrics()
+
+@app.delete("/cache")
+async def clear_cache():
+    """Vaciar la caché de predicciones (memoria y SQLite)"""
+    prediction_system.cache.clear()
+    return {"cleared": True}
+
+# === REGISTRO DE MODELOS ===
+
+@app.get("/models")
+async def list_models():
+    """Listar versiones del modelo con sus metadatos"""
+    return {
+        "active": prediction_system.active_model.version if prediction_system.active_model else None,
+        "versions": prediction_system.registry.list_versions(),
+        "retrain": prediction_system.retrain_status
+    }
+
+@app.post("/models/retrain", status_code=202)
+async def retrain_model():
+    """Reentrenar en segundo plano; la nueva versión se activa al terminar"""
+    if not prediction_system.start_background_retrain():
+        raise HTTPException(status_code=409, detail="Ya hay un reentrenamiento en curso")
+    return prediction_system.retrain_status
+
+@app.post("/models/incremental", status_code=202)
+async def incremental_update_model():
+    """Incorporar los resultados reales nuevos a la versión activa, sin reentrenar desde cero"""
+    if prediction_system.active_model is None:
+        raise HTTPException(status_code=409, detail="No hay un modelo activo")
+    if not prediction_system.start_background_retrain(incremental=True):
+        raise HTTPException(status_code=409, detail="Ya hay un reentrenamiento en curso")
+    return prediction_system.retrain_status
+
+@app.get("/models/retrain")
+async def get_retrain_status():
+    """Estado del último reentrenamiento"""
+    return prediction_system.retrain_status
+
+@app.post("/models/rollback")
+async def rollback_model():
+    """Volver a la versión activa anterior"""
+    try:
+        bundle = await asyncio.to_thread(prediction_system.rollback_model)
+        return {"active": bundle.version, "metadata": bundle.metadata}
+    except KeyError as e:
+        raise HTTPException(status_code=409, detail=str(e.args[0]))
+
+@app.post("/models/{version}/activate")
+async def activate_model(version: str):
+    """Activar una versión específica del modelo"""
+    try:
+        bundle = await asyncio.to_thread(prediction_system.activate_version, version)
+        return {"active": bundle.version, "metadata": bundle.metadata}
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e.args[0]))
+
 @app.get("/health")
 async def health_check():
     """Verificar estado del servicio"""
@@ -467,8 +1338,34 @@ async def health_check():
         "status": "healthy",
         "timestamp": datetime.now().isoformat(),
         "model_loaded": prediction_system.model is not None,
-        "vectorizer_loaded": prediction_system.vectorizer is not None
+        "vectorizer_loaded": prediction_system.feature_pipeline is not None,
+        "model_version": prediction_system.active_model.version if prediction_system.active_model else None,
+        "model_mmap": MODEL_MMAP_MODE is not None,
+        "model_backend": MODEL_BACKEND,
+        "text_featurizer": TEXT_FEATURIZER,
+        "model_runtime": prediction_system.active_model.runtime if prediction_system.active_model else None,
+        "memory": process_memory()
+    }
+
+@app.get("/health/live")
+async def liveness_check():
+    """El proceso responde (no depende de la base de datos ni del modelo)"""
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Listo para recibir tráfico: base de datos preparada y carga del modelo terminada"""
+    body = {
+        "ready": prediction_system.ready,
+        "database_ready": prediction_system.database_ready,
+        "model_load_finished": prediction_system.model_load_finished.is_set(),
+        "model_loaded": prediction_system.model is not None,
+        "model_version": prediction_system.active_model.version if prediction_system.active_model else None,
+        "retrain": prediction_system.retrain_status,
+        "similar_index_ready": prediction_system.similar_index.ready,
+        "startup_timings_ms": prediction_system.startup_timings
     }
+    return JSONResponse(status_code=200 if body["ready"] else 503, content=body)
 
 if __name__ == "__main__":
     import uvicorn
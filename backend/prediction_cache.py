@@ -0,0 +1,187 @@
+"""
+Caché de Predicciones
+=====================
+Evita recalcular (y volver a guardar) la predicción de un caso que ya se
+envió con los mismos datos y la misma versión del modelo.
+
+- Clave: SHA-256 del CaseData canónico + modo + versión del modelo
+- Nivel 1: LRU en memoria por proceso
+- Nivel 2 (opcional): tabla prediction_cache en SQLite, compartida entre workers
+- Invalidación automática al cambiar la versión activa del modelo
+- Métricas de aciertos por nivel
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Cambiar al modificar las reglas de predicción para no servir resultados viejos del nivel SQLite
+CACHE_SCHEMA_VERSION = "1"
+
+def canonical_case(case: Dict) -> Dict:
+    """Normalizar los datos del caso para que envíos equivalentes tengan la misma clave"""
+    canonical = {}
+    for field, value in case.items():
+        if isinstance(value, str):
+            value = " ".join(value.split())
+            if field in ("tipo_caso", "complejidad", "jurisdiccion"):
+                value = value.lower()
+        elif isinstance(value, list):
+            # El orden de las evidencias no cambia la predicción
+            value = sorted(" ".join(str(v).split()) for v in value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        canonical[field] = value
+    return canonical
+
+def entry_version(entry: Dict) -> str:
+    """Versión que produjo el resultado guardado ('reglas' si no intervino el modelo)"""
+    return entry.get("modelo_version") or "reglas"
+
+class PredictionCache:
+    """LRU en memoria con un segundo nivel opcional en SQLite"""
+
+    def __init__(self, max_entries: int = 1024, db_path: Optional[str] = None,
+                 ttl_seconds: float = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.db_path: Optional[str] = None
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, Dict]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits_memory": 0, "hits_sqlite": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        if db_path:
+            self.enable_sqlite(db_path)
+
+    def enable_sqlite(self, db_path: str):
+        """Activar el nivel SQLite (crea la tabla si no existe)"""
+        conn = sqlite3.connect(db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS prediction_cache (
+                cache_key TEXT PRIMARY KEY,
+                modelo_version TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.commit()
+        conn.close()
+        self.db_path = db_path
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(case: Dict, modo: str, modelo_version: str) -> str:
+        payload = json.dumps(
+            {"v": CACHE_SCHEMA_VERSION, "modo": modo, "modelo": modelo_version, "caso": canonical_case(case)},
+            sort_keys=True, ensure_ascii=False, separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.stats["hits_memory"] += 1
+                return entry
+
+        if self.db_path:
+            conn = sqlite3.connect(self.db_path)
+            row = conn.execute(
+                'SELECT result FROM prediction_cache WHERE cache_key = ? AND created_at >= ?',
+                (key, time.time() - self.ttl_seconds)
+            ).fetchone()
+            conn.close()
+            if row:
+                entry = json.loads(row[0])
+                with self.lock:
+                    self.stats["hits_sqlite"] += 1
+                    self._store(key, entry)
+                return entry
+
+        with self.lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put_many(self, items: Dict[str, Dict]):
+        """Guardar varios resultados (una transacción en el nivel SQLite)
+
+        Cada resultado queda con su propia versión: un lote puede mezclar
+        predicciones del modelo y de reglas.
+        """
+        if not self.enabled or not items:
+            return
+
+        with self.lock:
+            for key, entry in items.items():
+                self._store(key, entry)
+
+        if self.db_path:
+            now = time.time()
+            conn = sqlite3.connect(self.db_path)
+            conn.executemany('''
+                INSERT OR REPLACE INTO prediction_cache (cache_key, modelo_version, result, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', [(key, entry_version(entry), json.dumps(entry, ensure_ascii=False), now)
+                  for key, entry in items.items()])
+            conn.commit()
+            conn.close()
+
+    def _store(self, key: str, entry: Dict):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, keep_version: Optional[str] = None):
+        """Descartar resultados de otras versiones del modelo (los de 'reglas' se conservan)"""
+        keep = {"reglas", keep_version}
+        with self.lock:
+            stale = [k for k, entry in self.entries.items() if entry_version(entry) not in keep]
+            for key in stale:
+                del self.entries[key]
+            self.stats["invalidations"] += 1
+
+        if self.db_path:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute(
+                'DELETE FROM prediction_cache WHERE modelo_version NOT IN (?, ?) OR created_at < ?',
+                ("reglas", keep_version or "reglas", time.time() - self.ttl_seconds)
+            )
+            conn.commit()
+            conn.close()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        if self.db_path:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('DELETE FROM prediction_cache')
+            conn.commit()
+            conn.close()
+
+    def metrics(self) -> Dict:
+        with self.lock:
+            stats = dict(self.stats)
+            size = len(self.entries)
+        lookups = stats["hits_memory"] + stats["hits_sqlite"] + stats["misses"]
+        hits = stats["hits_memory"] + stats["hits_sqlite"]
+        return {
+            "enabled": self.enabled,
+            "sqlite_tier": bool(self.db_path),
+            "size": size,
+            "max_entries": self.max_entries,
+            **stats,
+            "lookups": lookups,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+        }
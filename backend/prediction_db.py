@@ -0,0 +1,234 @@
+"""
+Esquema de la Base de Predicciones
+==================================
+Tablas, índices, migraciones y agregados de predictions.db, compartidos por
+predict_api y los scripts (importador, generador, entrenamiento, benchmark)
+sin importar la aplicación.
+
+- case_predictions: predicciones servidas y su resultado real
+- historical_cases: casos con resultado conocido para entrenar
+- prediction_stats / prediction_stats_daily: agregados mantenidos por triggers
+- CASE_TYPES y OUTCOME_SUCCESS_WEIGHTS: tipos de caso y resultados posibles
+
+init_predictions_db es idempotente y no inserta datos: los casos de ejemplo
+de una base vacía los agrega predict_api al arrancar.
+"""
+
+import sqlite3
+from typing import Dict
+
+# Tipos de caso: probabilidades base de cada resultado, duración promedio (meses) y factores de éxito
+CASE_TYPES = {
+    "civil": {
+        "probabilidades_base": {"favorable": 0.65, "parcial": 0.25, "desfavorable": 0.10},
+        "tiempo_promedio": 8,
+        "factores_exito": ["evidencia_documental", "testigos", "jurisprudencia_favorable"]
+    },
+    "penal": {
+        "probabilidades_base": {"absolutoria": 0.30, "condenatoria": 0.60, "atenuante": 0.10},
+        "tiempo_promedio": 12,
+        "factores_exito": ["coartada", "evidencia_exculpatoria", "testigos_favorables"]
+    },
+    "laboral": {
+        "probabilidades_base": {"favorable": 0.70, "parcial": 0.20, "desfavorable": 0.10},
+        "tiempo_promedio": 6,
+        "factores_exito": ["documentacion_laboral", "testigos", "historial_empresa"]
+    },
+    "familia": {
+        "probabilidades_base": {"favorable": 0.55, "acuerdo": 0.35, "desfavorable": 0.10},
+        "tiempo_promedio": 10,
+        "factores_exito": ["bienestar_menor", "estabilidad_economica", "entorno_familiar"]
+    },
+    "comercial": {
+        "probabilidades_base": {"favorable": 0.60, "transaccion": 0.30, "desfavorable": 0.10},
+        "tiempo_promedio": 14,
+        "factores_exito": ["contratos", "correspondencia", "historial_comercial"]
+    }
+}
+
+# Valor de éxito de cada resultado histórico (para convertir predict_proba en probabilidad de éxito)
+OUTCOME_SUCCESS_WEIGHTS = {
+    "favorable": 1.0,
+    "absolutoria": 1.0,
+    "parcial": 0.5,
+    "acuerdo": 0.5,
+    "transaccion": 0.5,
+    "atenuante": 0.5,
+    "condenatoria": 0.0,
+    "desfavorable": 0.0
+}
+
+# Agregados de /predictions/stats por tipo de caso y por día, mantenidos con triggers
+PREDICTION_STATS_TABLES = {
+    "prediction_stats": ("tipo_caso",),
+    "prediction_stats_daily": ("dia", "tipo_caso")
+}
+
+def stats_key_values(row: str) -> Dict[str, str]:
+    """Expresiones de la clave de los agregados para una fila (sin fecha cuenta como hoy)"""
+    return {"tipo_caso": f"{row}.tipo_caso",
+            "dia": f"COALESCE(date({row}.fecha_prediccion), date('now'))"}
+
+def stats_delta_sql(row: str, sign: int) -> str:
+    """Sumar (sign=1) o restar (sign=-1) la fila NEW u OLD en cada tabla de agregados"""
+    key_values = stats_key_values(row)
+    statements = []
+    for table, keys in PREDICTION_STATS_TABLES.items():
+        statements.append(f'''
+            INSERT INTO {table} ({", ".join(keys)}, total, n_probabilidad, suma_probabilidad,
+                                 n_tiempo, suma_tiempo)
+            VALUES ({", ".join(key_values[key] for key in keys)}, {sign},
+                    {sign} * ({row}.probabilidad_exito IS NOT NULL),
+                    {sign} * COALESCE({row}.probabilidad_exito, 0),
+                    {sign} * ({row}.tiempo_estimado IS NOT NULL),
+                    {sign} * COALESCE({row}.tiempo_estimado, 0))
+            ON CONFLICT ({", ".join(keys)}) DO UPDATE SET
+                total = total + excluded.total,
+                n_probabilidad = n_probabilidad + excluded.n_probabilidad,
+                suma_probabilidad = suma_probabilidad + excluded.suma_probabilidad,
+                n_tiempo = n_tiempo + excluded.n_tiempo,
+                suma_tiempo = suma_tiempo + excluded.suma_tiempo;''')
+    return "".join(statements)
+
+def init_predictions_db(db_path: str):
+    """Crear o migrar las tablas de predictions.db (idempotente, sin datos)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS case_predictions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo_caso TEXT NOT NULL,
+                descripcion TEXT NOT NULL,
+                monto_disputa REAL,
+                complejidad TEXT,
+                evidencias TEXT,
+                probabilidad_exito REAL,
+                tipo_sentencia_probable TEXT,
+                tiempo_estimado INTEGER,
+                fecha_prediccion DATETIME DEFAULT CURRENT_TIMESTAMP,
+                resultado_real TEXT DEFAULT NULL,
+                fecha_resolucion DATETIME DEFAULT NULL
+            )
+        ''')
+
+        # Tabla para casos históricos (importados o sintéticos, para entrenamiento)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS historical_cases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo_caso TEXT NOT NULL,
+                descripcion TEXT NOT NULL,
+                monto_disputa REAL,
+                complejidad TEXT,
+                evidencias TEXT,
+                resultado TEXT NOT NULL,
+                tiempo_resolucion INTEGER,
+                fecha_caso DATETIME
+            )
+        ''')
+
+        # Versión del modelo que produjo cada predicción (bases creadas antes no la tienen)
+        cursor.execute('PRAGMA table_info(case_predictions)')
+        if "modelo_version" not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE case_predictions ADD COLUMN modelo_version TEXT')
+
+        # Secuencia de registro del resultado real: la marca de agua del reentrenamiento
+        # incremental avanza sobre ella y no sobre el id, porque un resultado puede llegar
+        # después que los de predicciones posteriores. Las filas ya resueltas toman su id,
+        # que es lo que usaban como marca de agua las versiones anteriores.
+        cursor.execute('PRAGMA table_info(case_predictions)')
+        if "resultado_seq" not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute('ALTER TABLE case_predictions ADD COLUMN resultado_seq INTEGER')
+            cursor.execute('''
+                UPDATE case_predictions SET resultado_seq = id
+                WHERE resultado_real IS NOT NULL
+            ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_case_predictions_resultado_seq
+            ON case_predictions (resultado_seq)
+            WHERE resultado_seq IS NOT NULL
+        ''')
+
+        # Índice parcial para el seguimiento de exactitud sobre predicciones resueltas
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_case_predictions_resolved
+            ON case_predictions (fecha_prediccion)
+            WHERE resultado_real IS NOT NULL
+        ''')
+
+        # Índice del historial, paginado por (fecha_prediccion, id)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_case_predictions_fecha
+            ON case_predictions (fecha_prediccion)
+        ''')
+
+        conn.commit()
+        init_prediction_stats(conn)
+    finally:
+        conn.close()
+
+def init_prediction_stats(conn: sqlite3.Connection):
+    """Tablas de agregados y sus triggers; al crearlas se cargan con las predicciones existentes
+
+    Cada inserción, borrado o cambio en case_predictions ajusta las sumas en
+    la misma transacción, así /predictions/stats no recorre la tabla.
+    """
+    exists_query = "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_case_predictions_stats_update'"
+    cursor = conn.cursor()
+    if cursor.execute(exists_query).fetchone():
+        return
+
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        # Otro proceso pudo crearlas mientras se esperaba el bloqueo
+        if cursor.execute(exists_query).fetchone():
+            cursor.execute('ROLLBACK')
+            return
+
+        key_values = stats_key_values("case_predictions")
+        for table, keys in PREDICTION_STATS_TABLES.items():
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    {"".join(f"{key} TEXT NOT NULL, " for key in keys)}
+                    total INTEGER NOT NULL DEFAULT 0,
+                    n_probabilidad INTEGER NOT NULL DEFAULT 0,
+                    suma_probabilidad REAL NOT NULL DEFAULT 0,
+                    n_tiempo INTEGER NOT NULL DEFAULT 0,
+                    suma_tiempo REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY ({", ".join(keys)})
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(f'''
+                INSERT INTO {table}
+                SELECT {", ".join(key_values[key] for key in keys)}, COUNT(*),
+                       COUNT(probabilidad_exito), COALESCE(SUM(probabilidad_exito), 0),
+                       COUNT(tiempo_estimado), COALESCE(SUM(tiempo_estimado), 0)
+                FROM case_predictions
+                GROUP BY {", ".join(str(i + 1) for i in range(len(keys)))}
+            ''')
+
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_case_predictions_stats_insert
+            AFTER INSERT ON case_predictions
+            BEGIN {stats_delta_sql("NEW", 1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_case_predictions_stats_delete
+            AFTER DELETE ON case_predictions
+            BEGIN {stats_delta_sql("OLD", -1)}
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_case_predictions_stats_update
+            AFTER UPDATE OF tipo_caso, probabilidad_exito, tiempo_estimado, fecha_prediccion
+            ON case_predictions
+            BEGIN {stats_delta_sql("OLD", -1)}{stats_delta_sql("NEW", 1)}
+            END
+        ''')
+        cursor.execute('COMMIT')
+    except Exception:
+        cursor.execute('ROLLBACK')
+        raise
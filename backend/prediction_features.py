@@ -0,0 +1,279 @@
+"""
+Características para el Modelo de Predicción de Sentencias
+==========================================================
+Pipeline de características disperso (scipy.sparse) compartido por el
+entrenamiento y la inferencia de predict_api.
+
+Características:
+- Texto (descripción + evidencias) vectorizado con TF-IDF o, con
+  text_featurizer='hashing', con un HashingVectorizer sin vocabulario
+- Monto en disputa (log1p)
+- Complejidad (one-hot: baja, media, alta)
+- Cantidad de evidencias
+- Tipo de caso (one-hot)
+
+El vocabulario se puede ajustar por bloques (fit_chunks) para entrenar con
+tablas que no caben completas en memoria, o a partir de conteos de términos
+ya calculados (fit_counts y transform_counts, que usa feature_cache).
+
+El hashing no se ajusta (no guarda vocabulario ni idf, así que el artefacto
+es mínimo y la memoria de inferencia constante) y normaliza el texto en
+español: minúsculas, sin tildes, sin palabras vacías y con un stemming
+liviano de plurales y género. Al no tener estado, los bloques se pueden
+transformar en paralelo (transform_chunks).
+"""
+
+import json
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Mapping, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer, HashingVectorizer, TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+COMPLEJIDADES = ("baja", "media", "alta")
+TIPOS_CASO = ("civil", "penal", "laboral", "familia", "comercial")
+
+TEXT_FEATURIZERS = ("tfidf", "hashing")
+# Columnas del hashing (potencia de 2); las colisiones son raras con el léxico de los casos
+HASHING_N_FEATURES = 2 ** 14
+
+# Palabras vacías en español (artículos, preposiciones y conectores frecuentes)
+SPANISH_STOP_WORDS = [
+    "a", "al", "ante", "con", "contra", "de", "del", "desde", "el", "en", "entre", "es", "la",
+    "las", "lo", "los", "o", "para", "por", "que", "se", "sin", "sobre", "su", "sus", "un",
+    "una", "uno", "y"
+]
+
+# Tildes y diéresis; la ñ se conserva porque distingue palabras (año / ano)
+ACCENTS = str.maketrans("áéíóúüàèìòù", "aeiouuaeiou")
+TOKEN_PATTERN = re.compile(r"[a-zñ0-9]{2,}")
+NORMALIZED_STOP_WORDS = frozenset(word.translate(ACCENTS) for word in SPANISH_STOP_WORDS)
+VOWELS = frozenset("aeiou")
+
+def light_stem(token: str) -> str:
+    """Stemming liviano para español: plurales y vocal final de género (contratos -> contrat)"""
+    if len(token) > 5 and token.endswith("ces"):
+        token = token[:-3] + "z"
+    elif len(token) > 4 and token.endswith("es") and token[-3] not in VOWELS:
+        token = token[:-2]
+    elif len(token) > 3 and token.endswith("s") and token[-2] in VOWELS:
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in "aoe":
+        token = token[:-1]
+    return token
+
+def spanish_analyzer(text: str) -> List[str]:
+    """Tokens normalizados para el hashing (función de módulo para poder serializar el pipeline)"""
+    normalized = text.lower().translate(ACCENTS)
+    return [light_stem(token) for token in TOKEN_PATTERN.findall(normalized)
+            if token not in NORMALIZED_STOP_WORDS]
+
+def split_evidencias(evidencias) -> List[str]:
+    """Normalizar evidencias: lista (API), JSON (case_predictions) o texto separado por comas (historical_cases)"""
+    if evidencias is None:
+        return []
+    if isinstance(evidencias, str):
+        if evidencias.startswith("["):
+            return list(json.loads(evidencias))
+        return [e.strip() for e in evidencias.split(",") if e.strip()]
+    return list(evidencias)
+
+def case_text(descripcion: str, evidencias) -> str:
+    """Texto del caso tal como se vectoriza: descripción + evidencias separadas por comas"""
+    return f"{descripcion or ''} {','.join(split_evidencias(evidencias))}"
+
+class CaseFeaturePipeline:
+    """Convierte casos en una matriz CSR sin densificar nunca el texto"""
+
+    def __init__(self, max_features: int = 1000, stop_words=SPANISH_STOP_WORDS,
+                 text_featurizer: str = "tfidf", hash_features: int = HASHING_N_FEATURES):
+        if text_featurizer not in TEXT_FEATURIZERS:
+            raise ValueError(f"Featurizador de texto inválido: {text_featurizer}. "
+                             f"Use: {', '.join(TEXT_FEATURIZERS)}")
+        self.max_features = max_features
+        self.text_featurizer = text_featurizer
+        if text_featurizer == "hashing":
+            # Frecuencias con norma L2, sin idf: nada que ajustar ni guardar
+            self.vectorizer = HashingVectorizer(n_features=hash_features, analyzer=spanish_analyzer,
+                                                alternate_sign=False, dtype=np.float32)
+            self.fitted = True
+        else:
+            self.vectorizer = TfidfVectorizer(max_features=max_features, stop_words=stop_words,
+                                              dtype=np.float32)
+            self.fitted = False
+
+    def __setstate__(self, state):
+        # Pipelines guardados antes de que existiera la opción de hashing
+        state.setdefault("text_featurizer", "tfidf")
+        self.__dict__.update(state)
+
+    @property
+    def n_text_features(self) -> int:
+        if self.text_featurizer == "hashing":
+            return self.vectorizer.n_features
+        return len(self.vectorizer.vocabulary_)
+
+    @property
+    def n_features(self) -> int:
+        return self.n_text_features + 1 + len(COMPLEJIDADES) + 1 + len(TIPOS_CASO)
+
+    def feature_names(self) -> List[str]:
+        """Nombres de columnas en el mismo orden que transform"""
+        if self.text_featurizer == "hashing":
+            text_names = [f"texto_hash:{i}" for i in range(self.vectorizer.n_features)]
+        else:
+            text_names = [f"texto:{term}" for term in self.vectorizer.get_feature_names_out()]
+        return (
+            text_names
+            + ["monto_disputa_log"]
+            + [f"complejidad:{c}" for c in COMPLEJIDADES]
+            + ["num_evidencias"]
+            + [f"tipo_caso:{t}" for t in TIPOS_CASO]
+        )
+
+    def hashed_terms(self, descripcion: str, evidencias) -> Dict[int, str]:
+        """Columna de cada término de un caso con hashing (para nombrar sus aportes)"""
+        from sklearn.utils import murmurhash3_32
+
+        terms: Dict[int, List[str]] = {}
+        for term in dict.fromkeys(spanish_analyzer(case_text(descripcion, evidencias))):
+            # Mismo índice que FeatureHasher: |murmurhash3_32(término, semilla 0)| módulo n_features
+            column = abs(murmurhash3_32(term, seed=0)) % self.vectorizer.n_features
+            terms.setdefault(column, []).append(term)
+        return {column: "|".join(names) for column, names in terms.items()}
+
+    def fit(self, frame: Mapping[str, Sequence]) -> "CaseFeaturePipeline":
+        if self.text_featurizer != "hashing":
+            self.vectorizer.fit(self._texts(frame))
+        self.fitted = True
+        return self
+
+    def fit_chunks(self, chunks: Iterable[Mapping[str, Sequence]]) -> "CaseFeaturePipeline":
+        """Ajustar el vocabulario recorriendo los casos por bloques
+
+        Equivale a fit: se cuentan frecuencias de término (para elegir los
+        max_features más frecuentes) y de documento (para el idf) sin guardar
+        los textos; en memoria solo queda un contador por término. Con
+        hashing no hay nada que ajustar y los bloques no se leen.
+        """
+        if self.text_featurizer == "hashing":
+            return self
+
+        analyzer = self.vectorizer.build_analyzer()
+        term_counts: Counter = Counter()
+        document_counts: Counter = Counter()
+        n_documents = 0
+        for frame in chunks:
+            for text in self._texts(frame):
+                tokens = analyzer(text)
+                term_counts.update(tokens)
+                document_counts.update(set(tokens))
+                n_documents += 1
+        return self._fit_vocabulary(term_counts, document_counts, n_documents)
+
+    def fit_counts(self, counts: sp.csr_matrix, terms: Sequence[str]) -> "CaseFeaturePipeline":
+        """Como fit_chunks, a partir de una matriz de conteos (casos x terms) ya calculada"""
+        if self.text_featurizer == "hashing":
+            return self
+        counts = counts.tocsr()
+        counts.sum_duplicates()
+        term_totals = np.asarray(counts.sum(axis=0)).ravel()
+        document_totals = np.bincount(counts.indices, minlength=counts.shape[1])
+        present = np.flatnonzero(term_totals)
+        return self._fit_vocabulary(
+            {terms[i]: int(term_totals[i]) for i in present},
+            {terms[i]: int(document_totals[i]) for i in present},
+            counts.shape[0]
+        )
+
+    def _fit_vocabulary(self, term_counts: Mapping[str, int], document_counts: Mapping[str, int],
+                        n_documents: int) -> "CaseFeaturePipeline":
+        if not term_counts:
+            raise ValueError("No hay texto para construir el vocabulario")
+
+        # Los más frecuentes; en empate, orden alfabético. Índices en orden alfabético como sklearn
+        top_terms = sorted(term_counts.items(), key=lambda item: (-item[1], item[0]))[:self.max_features]
+        vocabulary = {term: i for i, term in enumerate(sorted(term for term, _ in top_terms))}
+        self.vectorizer.set_params(vocabulary=vocabulary)
+
+        # Mismo idf suavizado que TfidfTransformer: ln((1 + n) / (1 + df)) + 1
+        df = np.array([document_counts[term] for term in vocabulary], dtype=np.float64)
+        self.vectorizer.idf_ = (np.log((1 + n_documents) / (1 + df)) + 1).astype(self.vectorizer.dtype)
+        self.fitted = True
+        return self
+
+    def fit_transform(self, frame: Mapping[str, Sequence]) -> sp.csr_matrix:
+        X_text = self.vectorizer.fit_transform(self._texts(frame))
+        self.fitted = True
+        return self._combine(X_text, frame)
+
+    def transform(self, frame: Mapping[str, Sequence]) -> sp.csr_matrix:
+        return self._combine(self.vectorizer.transform(self._texts(frame)), frame)
+
+    def transform_chunks(self, chunks: Iterable[Mapping[str, Sequence]], n_jobs: int = 1) -> List[sp.csr_matrix]:
+        """Transformar bloques de casos, en paralelo (procesos) si n_jobs != 1; respeta el orden"""
+        if n_jobs == 1:
+            return [self.transform(chunk) for chunk in chunks]
+        from joblib import Parallel, delayed
+        return Parallel(n_jobs=n_jobs)(delayed(self.transform)(chunk) for chunk in chunks)
+
+    def transform_text(self, frame: Mapping[str, Sequence]) -> sp.csr_matrix:
+        """Solo las columnas de texto (TF-IDF con norma L2 por fila)"""
+        return self.vectorizer.transform(self._texts(frame))
+
+    def count_text(self, frame: Mapping[str, Sequence]) -> Tuple[sp.csr_matrix, np.ndarray]:
+        """Conteos de todos los términos del texto (sin tope de vocabulario) y los términos de cada columna"""
+        counter = CountVectorizer(analyzer=self.vectorizer.build_analyzer(), dtype=np.int32)
+        counts = counter.fit_transform(self._texts(frame))
+        return counts.tocsr(), counter.get_feature_names_out()
+
+    def transform_counts(self, counts: sp.csr_matrix, terms: Sequence[str]) -> sp.csr_matrix:
+        """Columnas TF-IDF a partir de conteos: igual que transform_text sobre los mismos casos"""
+        term_index = {term: i for i, term in enumerate(terms)}
+        vocabulary = sorted(self.vectorizer.vocabulary_.items(), key=lambda item: item[1])
+        columns = np.array([term_index[term] for term, _ in vocabulary], dtype=np.int64)
+        X_text = counts.tocsr()[:, columns].astype(self.vectorizer.dtype) @ sp.diags(self.vectorizer.idf_)
+        return normalize(X_text.tocsr(), norm="l2", copy=False)
+
+    def _texts(self, frame: Mapping[str, Sequence]):
+        return (case_text(d, e) for d, e in zip(frame["descripcion"], frame["evidencias"]))
+
+    def _combine(self, X_text: sp.spmatrix, frame: Mapping[str, Sequence]) -> sp.csr_matrix:
+        return sp.hstack([X_text, self.structured_features(frame)], format="csr", dtype=np.float32)
+
+    def structured_features(self, frame: Mapping[str, Sequence]) -> sp.csr_matrix:
+        """Columnas estructuradas (monto, complejidad, evidencias, tipo de caso) como bloques dispersos"""
+        n = len(frame["tipo_caso"])
+        montos = np.nan_to_num(np.asarray(frame["monto_disputa"], dtype=np.float64), nan=0.0)
+        monto_col = np.log1p(np.maximum(montos, 0)).astype(np.float32).reshape(-1, 1)
+
+        num_evidencias = np.fromiter((len(split_evidencias(e)) for e in frame["evidencias"]),
+                                     dtype=np.float32, count=n).reshape(-1, 1)
+
+        return sp.hstack([
+            sp.csr_matrix(monto_col),
+            self._one_hot(frame["complejidad"], COMPLEJIDADES, n),
+            sp.csr_matrix(num_evidencias),
+            self._one_hot(frame["tipo_caso"], TIPOS_CASO, n)
+        ], format="csr", dtype=np.float32)
+
+    @staticmethod
+    def _one_hot(values: Sequence, categories: Sequence[str], n: int) -> sp.csr_matrix:
+        index = {category: i for i, category in enumerate(categories)}
+        columns = np.fromiter((index.get(v, -1) for v in values), dtype=np.int64, count=n)
+        rows = np.flatnonzero(columns >= 0)
+        data = np.ones(rows.size, dtype=np.float32)
+        return sp.csr_matrix((data, (rows, columns[rows])), shape=(n, len(categories)))
+
+def cases_to_frame(cases) -> Dict[str, list]:
+    """Columnas del pipeline a partir de objetos CaseData"""
+    return {
+        "tipo_caso": [case.tipo_caso for case in cases],
+        "descripcion": [case.descripcion for case in cases],
+        "monto_disputa": [case.monto_disputa or 0 for case in cases],
+        "complejidad": [case.complejidad for case in cases],
+        "evidencias": [case.evidencias for case in cases]
+    }
@@ -0,0 +1,439 @@
+"""
+Trabajos Asíncronos de Predicción
+=================================
+Lotes grandes de predicciones y búsquedas de casos similares que se
+encolan y responden de inmediato con un id, en lugar de mantener abierta
+la solicitud HTTP.
+
+- Tabla prediction_jobs en SQLite: estado, parámetros, casos y progreso
+  (los trabajos sobreviven a un reinicio y se retoman donde quedaron)
+- Cada ejecución toma el trabajo con un claim_id; un trabajo 'running' sin
+  avances en JOB_STALE_SECONDS (updated_at es el latido) puede tomarlo otro
+  proceso, y el anterior deja de poder confirmar bloques
+- Tabla prediction_job_chunks: resultados por bloque de JOB_CHUNK_SIZE casos
+- Pool de hilos propio (JOB_WORKERS), separado del pool de predicciones
+  para no quitarle lugar a las solicitudes interactivas
+- Progreso por bloque, cancelación entre bloques y aviso opcional por
+  POST a una callback_url al terminar (con reintentos)
+- callback_url solo puede apuntar a hosts de la lista permitida
+  (PREDICTION_CALLBACK_ALLOWED_HOSTS) que resuelvan a direcciones públicas,
+  para que la API no sirva de puente hacia la red interna; sin lista, no
+  se aceptan callbacks
+
+Cada tipo de trabajo se registra con una función handler(params, items)
+que procesa un bloque y devuelve un resultado serializable por caso, y
+opcionalmente una función writer(conn) con lo que hay que guardar en la
+base: se ejecuta en la misma transacción que el progreso del bloque, así
+un bloque repetido tras retomar el trabajo no duplica filas.
+"""
+
+import ipaddress
+import json
+import logging
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "completed", "failed", "cancelled")
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+# Casos por bloque: cada bloque es una unidad de progreso, de cancelación y de reanudación
+JOB_CHUNK_SIZE = 100
+
+# Un trabajo 'running' sin avances en este tiempo se considera huérfano (proceso caído)
+JOB_STALE_SECONDS = 300
+
+# Aviso a callback_url: tiempo de espera por intento e intentos con espera creciente
+CALLBACK_TIMEOUT_SECONDS = 10
+CALLBACK_ATTEMPTS = 3
+
+ChunkWriter = Callable[[sqlite3.Connection], None]
+JobHandler = Callable[[Dict, List[Dict]], Tuple[List[Dict], Optional[ChunkWriter]]]
+
+class JobQueueFull(Exception):
+    """Hay demasiados trabajos pendientes"""
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Una redirección podría llevar el aviso a una dirección interna: se trata como error"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+def validate_callback_url(url: Optional[str], allowed_hosts: FrozenSet[str]) -> Optional[str]:
+    """callback_url debe ser http(s), con un host permitido que resuelva solo a direcciones públicas"""
+    if url is None:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("callback_url debe ser una URL http o https")
+    host = parsed.hostname.lower()
+    if host not in allowed_hosts:
+        raise ValueError(f"El host de callback_url no está permitido: {host}")
+
+    try:
+        addresses = socket.getaddrinfo(host, parsed.port or (443 if parsed.scheme == "https" else 80),
+                                       proto=socket.IPPROTO_TCP)
+    except socket.gaierror:
+        raise ValueError(f"No se pudo resolver el host de callback_url: {host}")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        # is_global excluye privadas, loopback, link-local, reservadas y compartidas (CGNAT)
+        if not address.is_global:
+            raise ValueError(f"callback_url resuelve a una dirección no pública: {address}")
+    return url
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+class JobManager:
+    """Cola persistente de trabajos con un pool de hilos"""
+
+    def __init__(self, db_path: str, workers: int = 2, max_queued: int = 100,
+                 retention_seconds: float = 7 * 24 * 3600, chunk_size: int = JOB_CHUNK_SIZE,
+                 callback_allowed_hosts: Iterable[str] = ()):
+        self.db_path = db_path
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.retention_seconds = retention_seconds
+        self.chunk_size = chunk_size
+        self.callback_allowed_hosts = frozenset(host.strip().lower() for host in callback_allowed_hosts
+                                                if host.strip())
+        self.handlers: Dict[str, JobHandler] = {}
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.lock = threading.Lock()
+        # Trabajos ya enviados al pool de este proceso (para no duplicarlos al retomar)
+        self.submitted = set()
+
+    def register(self, kind: str, handler: JobHandler):
+        """handler(params, items) -> (resultados, writer o None); ver el docstring del módulo"""
+        self.handlers[kind] = handler
+
+    def _connect(self) -> sqlite3.Connection:
+        # Los hilos del pool y el event loop escriben a la vez: esperar el bloqueo en vez de fallar
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def init_tables(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS prediction_jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                state TEXT NOT NULL,
+                params TEXT NOT NULL,
+                items TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                processed INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                callback_url TEXT,
+                callback_state TEXT,
+                claim_id TEXT,
+                next_start INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                updated_at REAL NOT NULL,
+                finished_at REAL
+            ) WITHOUT ROWID
+        ''')
+        # Bases creadas antes de que los trabajos guardaran su dueño y su posición
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(prediction_jobs)')]
+        if "claim_id" not in columns:
+            conn.execute('ALTER TABLE prediction_jobs ADD COLUMN claim_id TEXT')
+        if "next_start" not in columns:
+            conn.execute('ALTER TABLE prediction_jobs ADD COLUMN next_start INTEGER NOT NULL DEFAULT 0')
+            conn.execute('UPDATE prediction_jobs SET next_start = processed')
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_prediction_jobs_state
+            ON prediction_jobs (state, created_at)
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS prediction_job_chunks (
+                job_id TEXT NOT NULL,
+                start INTEGER NOT NULL,
+                results TEXT NOT NULL,
+                PRIMARY KEY (job_id, start)
+            ) WITHOUT ROWID
+        ''')
+        conn.commit()
+        conn.close()
+
+    def start(self):
+        """Crear las tablas y el pool, borrar trabajos vencidos y retomar los pendientes"""
+        self.init_tables()
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+
+        conn = self._connect()
+        expired = [row[0] for row in conn.execute(
+            'SELECT job_id FROM prediction_jobs WHERE finished_at < ?', (time.time() - self.retention_seconds,)
+        )]
+        conn.executemany('DELETE FROM prediction_job_chunks WHERE job_id = ?', [(j,) for j in expired])
+        conn.executemany('DELETE FROM prediction_jobs WHERE job_id = ?', [(j,) for j in expired])
+        conn.commit()
+        conn.close()
+        if expired:
+            logger.info(f"Trabajos vencidos eliminados: {len(expired)}")
+        self.recover()
+
+    def recover(self) -> int:
+        """Encolar en este proceso los trabajos pendientes y los huérfanos; devuelve cuántos
+
+        Solo se encolan: cada uno se toma en _process con un UPDATE condicional,
+        así dos procesos que retoman a la vez no lo ejecutan los dos.
+        """
+        conn = self._connect()
+        pending = [row[0] for row in conn.execute('''
+            SELECT job_id FROM prediction_jobs
+            WHERE state = 'queued' OR (state = 'running' AND updated_at < ?)
+            ORDER BY created_at
+        ''', (time.time() - JOB_STALE_SECONDS,))]
+        conn.close()
+
+        with self.lock:
+            pending = [job_id for job_id in pending if job_id not in self.submitted]
+        for job_id in pending:
+            self._enqueue(job_id)
+        if pending:
+            logger.info(f"Trabajos retomados: {len(pending)}")
+        return len(pending)
+
+    def _enqueue(self, job_id: str):
+        with self.lock:
+            self.submitted.add(job_id)
+        self.executor.submit(self._run, job_id)
+
+    def submit(self, kind: str, items: List[Dict], params: Dict,
+               callback_url: Optional[str] = None) -> Dict:
+        """Encolar un trabajo; ValueError si los datos no son válidos, JobQueueFull si hay demasiados pendientes"""
+        if kind not in self.handlers:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        if not items:
+            raise ValueError("El trabajo no tiene casos")
+        validate_callback_url(callback_url, self.callback_allowed_hosts)
+
+        conn = self._connect()
+        try:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM prediction_jobs WHERE state IN ('queued', 'running')"
+            ).fetchone()[0]
+            if pending >= self.max_queued:
+                raise JobQueueFull(f"Hay {pending} trabajos pendientes, reintente más tarde")
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            conn.execute('''
+                INSERT INTO prediction_jobs (job_id, kind, state, params, items, total, callback_url,
+                                             created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?)
+            ''', (job_id, kind, json.dumps(params), json.dumps(items, ensure_ascii=False), len(items),
+                  callback_url, now, now))
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._enqueue(job_id)
+        return self.status(job_id)
+
+    def _run(self, job_id: str):
+        try:
+            self._process(job_id)
+        finally:
+            with self.lock:
+                self.submitted.discard(job_id)
+
+    def _process(self, job_id: str):
+        conn = self._connect()
+        claim_id = uuid.uuid4().hex
+        try:
+            # Tomar el trabajo de forma atómica: pendiente, o huérfano de un proceso sin latido
+            now = time.time()
+            claimed = conn.execute('''
+                UPDATE prediction_jobs SET state = 'running', claim_id = ?, started_at = COALESCE(started_at, ?),
+                                           updated_at = ?
+                WHERE job_id = ? AND (state = 'queued' OR (state = 'running' AND updated_at < ?))
+            ''', (claim_id, now, now, job_id, now - JOB_STALE_SECONDS)).rowcount
+            conn.commit()
+            if not claimed:
+                # Cancelado mientras esperaba (solo queda avisar) o tomado por otro proceso
+                state = conn.execute('SELECT state FROM prediction_jobs WHERE job_id = ?', (job_id,)).fetchone()
+                if state and state[0] == "cancelled":
+                    self._notify(job_id)
+                return
+
+            kind, params, items, next_start = conn.execute(
+                'SELECT kind, params, items, next_start FROM prediction_jobs WHERE job_id = ?', (job_id,)
+            ).fetchone()
+            params, items = json.loads(params), json.loads(items)
+            handler = self.handlers[kind]
+
+            for start in range(next_start, len(items), self.chunk_size):
+                state = conn.execute('SELECT state FROM prediction_jobs WHERE job_id = ?', (job_id,)).fetchone()
+                if state is None or state[0] != "running":
+                    break
+                chunk = items[start:start + self.chunk_size]
+                results, writer = handler(params, chunk)
+                if len(results) != len(chunk):
+                    raise RuntimeError(f"El bloque {start} devolvió {len(results)} resultados para {len(chunk)} casos")
+
+                # Posición, resultado y escrituras del bloque en una transacción, solo si el
+                # trabajo sigue siendo de esta ejecución (el UPDATE toma el bloqueo de escritura)
+                end = start + len(chunk)
+                owned = conn.execute('''
+                    UPDATE prediction_jobs SET next_start = ?, processed = ?, updated_at = ?
+                    WHERE job_id = ? AND claim_id = ?
+                ''', (end, end, time.time(), job_id, claim_id)).rowcount
+                if not owned:
+                    conn.rollback()
+                    logger.warning(f"El trabajo {job_id} fue retomado por otro proceso; se descarta el bloque {start}")
+                    return
+                conn.execute('INSERT OR REPLACE INTO prediction_job_chunks (job_id, start, results) VALUES (?, ?, ?)',
+                             (job_id, start, json.dumps(results, ensure_ascii=False)))
+                if writer is not None:
+                    writer(conn)
+                conn.commit()
+
+            conn.execute('''
+                UPDATE prediction_jobs SET state = 'completed', finished_at = ?, updated_at = ?
+                WHERE job_id = ? AND claim_id = ? AND state = 'running'
+            ''', (time.time(), time.time(), job_id, claim_id))
+            conn.commit()
+        except Exception as e:
+            logger.error(f"Error en el trabajo {job_id}: {e}")
+            conn.rollback()
+            conn.execute('''
+                UPDATE prediction_jobs SET state = 'failed', error = ?, finished_at = ?, updated_at = ?
+                WHERE job_id = ? AND claim_id = ? AND state = 'running'
+            ''', (str(e), time.time(), time.time(), job_id, claim_id))
+            conn.commit()
+        finally:
+            conn.close()
+        self._notify(job_id)
+
+    def _notify(self, job_id: str):
+        """Enviar el estado final a callback_url (una sola vez por trabajo)"""
+        status = self.status(job_id)
+        if status is None or not status["callback_url"] or status["callback_state"]:
+            return
+
+        body = json.dumps(status, ensure_ascii=False).encode("utf-8")
+        callback_state = "failed"
+        for attempt in range(CALLBACK_ATTEMPTS):
+            try:
+                # Se valida de nuevo: la lista o el DNS pudieron cambiar desde que se encoló
+                validate_callback_url(status["callback_url"], self.callback_allowed_hosts)
+            except ValueError as e:
+                logger.warning(f"Aviso del trabajo {job_id} rechazado: {e}")
+                callback_state = "rejected"
+                break
+            try:
+                request = urllib.request.Request(status["callback_url"], data=body, method="POST",
+                                                 headers={"Content-Type": "application/json"})
+                with _callback_opener.open(request, timeout=CALLBACK_TIMEOUT_SECONDS):
+                    pass
+                callback_state = "delivered"
+                break
+            except (urllib.error.URLError, OSError) as e:
+                logger.warning(f"Aviso del trabajo {job_id} a {status['callback_url']} falló "
+                               f"(intento {attempt + 1}/{CALLBACK_ATTEMPTS}): {e}")
+                if attempt + 1 < CALLBACK_ATTEMPTS:
+                    time.sleep(2 ** attempt)
+
+        conn = self._connect()
+        conn.execute('UPDATE prediction_jobs SET callback_state = ? WHERE job_id = ?', (callback_state, job_id))
+        conn.commit()
+        conn.close()
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancelar un trabajo pendiente; uno en curso se detiene al terminar el bloque actual"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute('''
+            UPDATE prediction_jobs SET state = 'cancelled', finished_at = ?, updated_at = ?
+            WHERE job_id = ? AND state IN ('queued', 'running')
+        ''', (now, now, job_id))
+        conn.commit()
+        conn.close()
+        return self.status(job_id)
+
+    def status(self, job_id: str, include_results: bool = False) -> Optional[Dict]:
+        """Estado y progreso del trabajo (None si no existe); los resultados, si terminó bien"""
+        conn = self._connect()
+        try:
+            row = conn.execute('''
+                SELECT job_id, kind, state, params, total, processed, error, callback_url, callback_state,
+                       created_at, started_at, updated_at, finished_at
+                FROM prediction_jobs WHERE job_id = ?
+            ''', (job_id,)).fetchone()
+            if row is None:
+                return None
+            status = self._status_from_row(row)
+            if include_results and status["state"] == "completed":
+                status["results"] = [
+                    result
+                    for (chunk,) in conn.execute(
+                        'SELECT results FROM prediction_job_chunks WHERE job_id = ? ORDER BY start', (job_id,)
+                    )
+                    for result in json.loads(chunk)
+                ]
+            return status
+        finally:
+            conn.close()
+
+    def list_jobs(self, state: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Trabajos más recientes, opcionalmente de un estado"""
+        conn = self._connect()
+        rows = conn.execute(f'''
+            SELECT job_id, kind, state, params, total, processed, error, callback_url, callback_state,
+                   created_at, started_at, updated_at, finished_at
+            FROM prediction_jobs {"WHERE state = ?" if state else ""}
+            ORDER BY created_at DESC LIMIT ?
+        ''', (state, limit) if state else (limit,)).fetchall()
+        conn.close()
+        return [self._status_from_row(row) for row in rows]
+
+    @staticmethod
+    def _status_from_row(row) -> Dict:
+        (job_id, kind, state, params, total, processed, error, callback_url, callback_state,
+         created_at, started_at, updated_at, finished_at) = row
+        status = {
+            "id": job_id,
+            "kind": kind,
+            "state": state,
+            "params": json.loads(params),
+            "total": total,
+            "processed": processed,
+            "progress": round(processed / total, 4) if total else 0.0,
+            "eta_seconds": None,
+            "error": error,
+            "callback_url": callback_url,
+            "callback_state": callback_state,
+            "created_at": _iso(created_at),
+            "started_at": _iso(started_at),
+            "finished_at": _iso(finished_at)
+        }
+        # Estimación lineal con el ritmo de los bloques terminados
+        if state == "running" and started_at and 0 < processed < total:
+            elapsed = updated_at - started_at
+            status["eta_seconds"] = round(elapsed / processed * (total - processed), 1)
+        return status
+
+    def shutdown(self):
+        # Los trabajos en curso quedan 'running' y se retoman al arrancar (ver JOB_STALE_SECONDS)
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
@@ -0,0 +1,170 @@
+"""
+Pool de Trabajadores para Predicciones
+======================================
+Ejecuta la inferencia y el guardado de predicciones fuera del event loop
+de FastAPI, en hilos o en procesos, con una cola acotada.
+
+- PREDICTION_EXECUTOR: 'thread' (por defecto) o 'process'
+- PREDICTION_WORKERS: trabajadores simultáneos
+- PREDICTION_QUEUE_SIZE: solicitudes que pueden esperar; al superarlo se rechaza (503)
+- Tiempos por etapa: espera en cola, inferencia y persistencia
+
+En modo 'process' cada proceso carga su propia copia de predict_api y recoge
+los cambios de versión del modelo a través del registro (active.json).
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EXECUTOR_KINDS = ("thread", "process")
+
+# Muestras recientes conservadas por etapa para los percentiles
+TIMING_WINDOW = 2000
+
+class PoolSaturated(Exception):
+    """No hay lugar en la cola de predicciones"""
+
+def _timed_call(fn: Callable, submitted_at: float, *args) -> Tuple[object, Dict[str, float]]:
+    """Ejecutar en el trabajador y medir la espera en cola (reloj de pared, válido entre procesos)"""
+    queue_wait_ms = (time.time() - submitted_at) * 1000
+    result, timings = fn(*args)
+    return result, {"queue_wait_ms": queue_wait_ms, **timings}
+
+def _init_process_worker():
+    # Los procesos trabajadores no entrenan ni programan tareas; solo predicen
+    os.environ["PREDICTION_WORKER_PROCESS"] = "1"
+
+def predict_in_process(case_dicts: List[Dict], modo: Optional[str],
+                       explicar: bool = False) -> Tuple[List[Dict], Dict[str, float]]:
+    """Punto de entrada en modo 'process': datos simples de ida y vuelta para evitar problemas de pickle"""
+    from predict_api import CaseData, prediction_system
+
+    prediction_system.initialize()
+    try:
+        predictions, timings = prediction_system.predict_and_save([CaseData(**c) for c in case_dicts], modo,
+                                                                explicar)
+    except Exception as e:
+        # Las excepciones de FastAPI no siempre se pueden serializar entre procesos
+        raise RuntimeError(str(e)) from None
+    return [p.model_dump() for p in predictions], timings
+
+def _warm_process_worker() -> int:
+    from predict_api import prediction_system
+
+    prediction_system.initialize()
+    return os.getpid()
+
+class PredictionPool:
+    """Ejecutor acotado con métricas por etapa"""
+
+    def __init__(self, kind: str = "thread", workers: int = 4, queue_size: int = 64):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"PREDICTION_EXECUTOR inválido: {kind}. Use: {', '.join(EXECUTOR_KINDS)}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.executor: Optional[Executor] = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timings: Dict[str, deque] = {
+            stage: deque(maxlen=TIMING_WINDOW)
+            for stage in ("queue_wait_ms", "inference_ms", "persistence_ms", "total_ms")
+        }
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def _get_executor(self) -> Executor:
+        # Se crea al primer uso para no lanzar procesos al importar el módulo
+        if self.executor is None:
+            if self.kind == "process":
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_process_worker
+                )
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                   thread_name_prefix="prediction")
+        return self.executor
+
+    def start(self):
+        """Crear el ejecutor y, en modo 'process', cargar predict_api en cada proceso de antemano"""
+        executor = self._get_executor()
+        if self.kind == "process":
+            for _ in range(self.workers):
+                executor.submit(_warm_process_worker)
+
+    async def run(self, fn: Callable, *args):
+        """Ejecutar fn(*args) -> (resultado, tiempos) en el pool; PoolSaturated si la cola está llena"""
+        # El contador solo se modifica desde el event loop, no requiere lock
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise PoolSaturated()
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, timings = await loop.run_in_executor(
+                self._get_executor(), _timed_call, fn, time.time(), *args
+            )
+        except BrokenProcessPool:
+            # Un proceso murió (p. ej. sin memoria): se recrea el pool en la próxima solicitud
+            self.failed += 1
+            self.shutdown()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.in_flight -= 1
+
+        self.completed += 1
+        timings["total_ms"] = (time.perf_counter() - started) * 1000
+        for stage, value in timings.items():
+            if stage in self.timings:
+                self.timings[stage].append(value)
+        return result
+
+    def metrics(self) -> Dict:
+        stages = {}
+        for stage, samples in self.timings.items():
+            if not samples:
+                stages[stage] = {"n": 0}
+                continue
+            values = np.fromiter(samples, dtype=float)
+            stages[stage] = {
+                "n": int(values.size),
+                "mean": round(float(values.mean()), 3),
+                "p50": round(float(np.percentile(values, 50)), 3),
+                "p95": round(float(np.percentile(values, 95)), 3),
+                "p99": round(float(np.percentile(values, 99)), 3),
+                "max": round(float(values.max()), 3)
+            }
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "stages": stages
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
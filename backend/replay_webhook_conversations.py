@@ -0,0 +1,150 @@
+"""
+Replay de Conversaciones de Webhooks
+====================================
+Reproduce los mensajes reales guardados en webhook_messages a través del
+motor actual del chatbot (sin enviar nada por la red) y compara cada
+respuesta con la que se envió en su momento.
+
+Funcionalidades:
+- Lectura por bloques (keyset por id) en modo solo lectura
+- Conteo de respuestas iguales, cambiadas y sin comparar
+- Cambios agrupados por intención detectada
+- Throughput total y del motor del chatbot
+- Exportación de las diferencias en JSONL
+
+Uso:
+    py replay_webhook_conversations.py --db webhook_conversations.db --chunk-size 2000 --output cambios.jsonl
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Optional
+
+from chatbot_offline import analyze_message, generate_response
+
+# Respuestas que webhook_integrations guarda cuando el chatbot no respondió;
+# no reflejan el motor y no se comparan
+CHATBOT_FALLBACK_RESPONSES = {
+    "Servicio temporalmente no disponible. Por favor intenta más tarde.",
+    "Lo siento, hay un problema técnico. Contacta directamente con nosotros.",
+    "Lo siento, no pude procesar tu consulta."
+}
+
+def iter_message_chunks(db_path: str, chunk_size: int, platform: Optional[str] = None,
+                        since_id: int = 0, limit: Optional[int] = None) -> Iterator[List[tuple]]:
+    """Leer webhook_messages por bloques ordenados por id"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    cursor = conn.cursor()
+
+    query = '''
+        SELECT id, platform, sender_id, message, response
+        FROM webhook_messages
+        WHERE id > ? {platform_filter}
+        ORDER BY id
+        LIMIT ?
+    '''.format(platform_filter="AND platform = ?" if platform else "")
+
+    last_id = since_id
+    remaining = limit
+    try:
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            params = (last_id, platform, size) if platform else (last_id, size)
+            rows = cursor.execute(query, params).fetchall()
+            if not rows:
+                break
+            yield rows
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+    finally:
+        conn.close()
+
+def replay(db_path: str, chunk_size: int = 1000, platform: Optional[str] = None,
+           since_id: int = 0, limit: Optional[int] = None, output: Optional[str] = None,
+           examples: int = 5) -> Dict:
+    """Reproducir los mensajes guardados y comparar con las respuestas almacenadas"""
+    outcomes = Counter()
+    changed_by_intent = Counter()
+    sample_changes = []
+    engine_seconds = 0.0
+    started = time.perf_counter()
+
+    diff_file = open(output, "w", encoding="utf-8") if output else None
+    try:
+        for rows in iter_message_chunks(db_path, chunk_size, platform, since_id, limit):
+            for message_id, row_platform, sender_id, message, stored in rows:
+                engine_started = time.perf_counter()
+                analysis = analyze_message(message)
+                current = generate_response(message, analysis).respuesta
+                engine_seconds += time.perf_counter() - engine_started
+
+                outcomes["total"] += 1
+                if not stored or stored in CHATBOT_FALLBACK_RESPONSES:
+                    outcomes["not_compared"] += 1
+                    continue
+                if current == stored:
+                    outcomes["unchanged"] += 1
+                    continue
+
+                outcomes["changed"] += 1
+                changed_by_intent[analysis["intent"]] += 1
+                change = {
+                    "id": message_id,
+                    "platform": row_platform,
+                    "sender_id": sender_id,
+                    "intent": analysis["intent"],
+                    "message": message,
+                    "stored_response": stored,
+                    "current_response": current
+                }
+                if len(sample_changes) < examples:
+                    sample_changes.append(change)
+                if diff_file:
+                    diff_file.write(json.dumps(change, ensure_ascii=False) + "\n")
+    finally:
+        if diff_file:
+            diff_file.close()
+
+    elapsed = time.perf_counter() - started
+    total = outcomes["total"]
+    compared = outcomes["changed"] + outcomes["unchanged"]
+    return {
+        "messages": total,
+        "unchanged": outcomes["unchanged"],
+        "changed": outcomes["changed"],
+        "not_compared": outcomes["not_compared"],
+        "change_rate": round(outcomes["changed"] / compared, 4) if compared else 0.0,
+        "changed_by_intent": dict(changed_by_intent.most_common()),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_msgs_per_second": round(total / elapsed, 1) if elapsed > 0 else 0.0,
+        "engine_msgs_per_second": round(total / engine_seconds, 1) if engine_seconds > 0 else 0.0,
+        "sample_changes": sample_changes
+    }
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Replay de conversaciones de webhooks contra el chatbot actual")
+    parser.add_argument("--db", default="webhook_conversations.db", help="Base de datos de webhooks")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--platform", choices=["whatsapp", "messenger"], default=None)
+    parser.add_argument("--since-id", type=int, default=0, help="Procesar solo mensajes con id mayor")
+    parser.add_argument("--limit", type=int, default=None, help="Máximo de mensajes a procesar")
+    parser.add_argument("--examples", type=int, default=5, help="Cambios de ejemplo en el reporte")
+    parser.add_argument("--output", help="Guardar todas las diferencias en JSONL")
+    parser.add_argument("--report", help="Guardar el reporte en JSON")
+    args = parser.parse_args()
+
+    report = replay(args.db, args.chunk_size, args.platform, args.since_id,
+                    args.limit, args.output, args.examples)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    main()
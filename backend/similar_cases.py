@@ -0,0 +1,362 @@
+"""
+Índice de Casos Similares
+=========================
+Búsqueda top-k de casos históricos por similitud coseno sobre TF-IDF
+(descripción + evidencias), para mostrar qué casos pasados se parecen al
+que se está prediciendo.
+
+- Vocabulario propio del índice (no cambia con cada reentrenamiento)
+- Filas normalizadas (L2) guardadas en CSC: una consulta solo recorre las
+  columnas de sus términos, no todos los casos
+- Segmentos: los casos importados se agregan como un segmento nuevo y los
+  segmentos se compactan al superar MAX_SEGMENTS
+- Persistencia en .npz por segmento + manifest.json (SIMILAR_INDEX_PATH)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_MAX_FEATURES = 50000
+INDEX_CHUNK_ROWS = 50000
+MAX_SEGMENTS = 8
+MANIFEST_FILE = "manifest.json"
+PIPELINE_FILE = "text_pipeline.joblib"
+
+CASE_COLUMNS = "id, tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado"
+
+class IndexSegment:
+    """Bloque de casos: matriz CSC (casos x términos), ids y tipo de caso codificado"""
+
+    def __init__(self, matrix, ids: np.ndarray, tipos: np.ndarray):
+        self.matrix = matrix
+        self.ids = ids
+        self.tipos = tipos
+
+    @property
+    def n_rows(self) -> int:
+        return self.matrix.shape[0]
+
+    def save(self, path: str):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp.npz"
+        np.savez(tmp_path, data=self.matrix.data, indices=self.matrix.indices, indptr=self.matrix.indptr,
+                 shape=np.asarray(self.matrix.shape), ids=self.ids, tipos=self.tipos)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IndexSegment":
+        import scipy.sparse as sp
+
+        with np.load(path) as f:
+            matrix = sp.csc_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+            return cls(matrix, f["ids"], f["tipos"])
+
+class SimilarCaseIndex:
+    """Índice de similitud coseno sobre historical_cases, actualizable por incrementos"""
+
+    def __init__(self, index_dir: str, db_path: str, max_features: int = INDEX_MAX_FEATURES):
+        self.index_dir = index_dir
+        self.db_path = db_path
+        self.max_features = max_features
+        # (pipeline, segmentos): las consultas lo leen sin lock; se reemplaza completo, nunca se modifica
+        self.snapshot: Tuple[Optional[object], List[IndexSegment]] = (None, [])
+        self.segment_files: List[str] = []
+        self.last_id = 0
+        self.lock = threading.Lock()
+        # Protege el paso a "building" al lanzar una construcción (self.lock se toma durante toda ella)
+        self.state_lock = threading.Lock()
+        self.status: Dict = {"state": "empty"}
+
+    @property
+    def pipeline(self):
+        return self.snapshot[0]
+
+    @property
+    def segments(self) -> List[IndexSegment]:
+        return self.snapshot[1]
+
+    @property
+    def ready(self) -> bool:
+        return self.pipeline is not None
+
+    @property
+    def n_cases(self) -> int:
+        return sum(segment.n_rows for segment in self.segments)
+
+    # === CONSTRUCCIÓN ===
+
+    def _iter_chunks(self, min_id: int, max_id: int, chunk_rows: int):
+        import pandas as pd
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            last_id = min_id
+            while True:
+                chunk = pd.read_sql_query(
+                    f'SELECT {CASE_COLUMNS} FROM historical_cases WHERE id > ? AND id <= ? ORDER BY id LIMIT ?',
+                    conn, params=(last_id, max_id, chunk_rows)
+                )
+                if chunk.empty:
+                    return
+                last_id = int(chunk["id"].iloc[-1])
+                yield chunk
+        finally:
+            conn.close()
+
+    def _max_id(self) -> int:
+        conn = sqlite3.connect(self.db_path)
+        max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM historical_cases').fetchone()[0]
+        conn.close()
+        return max_id
+
+    def _build_segment(self, pipeline, min_id: int, max_id: int, chunk_rows: int) -> Optional[IndexSegment]:
+        import scipy.sparse as sp
+        from prediction_features import TIPOS_CASO
+
+        tipo_codes = {tipo: i for i, tipo in enumerate(TIPOS_CASO)}
+        blocks, ids, tipos = [], [], []
+        for chunk in self._iter_chunks(min_id, max_id, chunk_rows):
+            blocks.append(pipeline.transform_text(chunk))
+            ids.append(chunk["id"].to_numpy(dtype=np.int64))
+            tipos.append(np.fromiter((tipo_codes.get(t, -1) for t in chunk["tipo_caso"]),
+                                     dtype=np.int8, count=len(chunk)))
+        if not blocks:
+            return None
+        return IndexSegment(sp.vstack(blocks, format="csr").tocsc(), np.concatenate(ids), np.concatenate(tipos))
+
+    def build(self, chunk_rows: int = INDEX_CHUNK_ROWS):
+        """Reconstruir desde cero: vocabulario e idf nuevos con todos los casos"""
+        from prediction_features import CaseFeaturePipeline, SPANISH_STOP_WORDS
+
+        with self.lock:
+            started = time.perf_counter()
+            self.status = {"state": "building", "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            try:
+                max_id = self._max_id()
+
+                pipeline = CaseFeaturePipeline(max_features=self.max_features, stop_words=SPANISH_STOP_WORDS)
+                pipeline.fit_chunks(self._iter_chunks(0, max_id, chunk_rows))
+                segment = self._build_segment(pipeline, 0, max_id, chunk_rows)
+
+                self.snapshot = (pipeline, [segment] if segment else [])
+                self.last_id = max_id
+                self._save(full=True)
+            except Exception as e:
+                # Las consultas siguen con el índice anterior, si había uno
+                self.status = {"state": "failed", "error": str(e)}
+                raise
+            self.status = {"state": "ready", "mode": "build",
+                           "seconds": round(time.perf_counter() - started, 2), "cases": self.n_cases}
+            logger.info(f"Índice de casos similares construido con {self.n_cases} casos")
+
+    def update(self, chunk_rows: int = INDEX_CHUNK_ROWS) -> int:
+        """Agregar los casos nuevos (id mayor al último indexado) como un segmento"""
+        if not self.ready:
+            self.build(chunk_rows)
+            return self.n_cases
+
+        with self.lock:
+            max_id = self._max_id()
+            if max_id <= self.last_id:
+                return 0
+            started = time.perf_counter()
+            segment = self._build_segment(self.pipeline, self.last_id, max_id, chunk_rows)
+            self.last_id = max_id
+            if segment is None:
+                return 0
+
+            segments = self.segments + [segment]
+            compact = len(segments) > MAX_SEGMENTS
+            if compact:
+                segments = [self._merge(segments)]
+            self.snapshot = (self.pipeline, segments)
+            self._save(full=compact)
+            self.status = {"state": "ready", "mode": "update", "added": segment.n_rows,
+                           "seconds": round(time.perf_counter() - started, 2), "cases": self.n_cases}
+            return segment.n_rows
+
+    @staticmethod
+    def _merge(segments: List[IndexSegment]) -> IndexSegment:
+        import scipy.sparse as sp
+
+        return IndexSegment(
+            sp.vstack([s.matrix for s in segments], format="csc"),
+            np.concatenate([s.ids for s in segments]),
+            np.concatenate([s.tipos for s in segments])
+        )
+
+    # === PERSISTENCIA ===
+
+    def _save(self, full: bool):
+        """Guardar el segmento nuevo (o todos) y reemplazar el manifest de forma atómica"""
+        import joblib
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        previous_files = list(self.segment_files)
+        if full:
+            joblib.dump(self.pipeline, os.path.join(self.index_dir, PIPELINE_FILE))
+            files = []
+            to_write = self.segments
+        else:
+            files = list(self.segment_files)
+            to_write = self.segments[len(files):]
+
+        for segment in to_write:
+            name = f"segment-{uuid.uuid4().hex[:12]}.npz"
+            segment.save(os.path.join(self.index_dir, name))
+            files.append(name)
+
+        manifest = {"segments": files, "last_id": self.last_id, "cases": self.n_cases,
+                    "updated_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        tmp_path = os.path.join(self.index_dir, f"{MANIFEST_FILE}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.index_dir, MANIFEST_FILE))
+        self.segment_files = files
+
+        # Segmentos reemplazados por la compactación
+        for name in set(previous_files) - set(files):
+            try:
+                os.remove(os.path.join(self.index_dir, name))
+            except OSError:
+                pass
+
+    def load(self) -> bool:
+        """Cargar el índice guardado; False si no existe o está incompleto"""
+        import joblib
+
+        try:
+            with open(os.path.join(self.index_dir, MANIFEST_FILE), encoding="utf-8") as f:
+                manifest = json.load(f)
+            pipeline = joblib.load(os.path.join(self.index_dir, PIPELINE_FILE))
+            segments = [IndexSegment.load(os.path.join(self.index_dir, name)) for name in manifest["segments"]]
+        except (OSError, ValueError, KeyError) as e:
+            logger.info(f"No se pudo cargar el índice de casos similares: {e}")
+            return False
+
+        with self.lock:
+            self.snapshot = (pipeline, segments)
+            self.segment_files = list(manifest["segments"])
+            self.last_id = manifest["last_id"]
+            self.status = {"state": "ready", "mode": "load", "cases": self.n_cases}
+        return True
+
+    def load_or_build(self, rebuild: bool = False):
+        """Cargar de disco y agregar lo importado desde entonces, o construir (rebuild: siempre desde cero)"""
+        try:
+            if not rebuild and self.load():
+                self.update()
+            else:
+                self.build()
+        except Exception as e:
+            logger.error(f"Error preparando el índice de casos similares: {e}")
+            self.status = {"state": "failed", "error": str(e)}
+
+    def start_build(self, rebuild: bool = False) -> bool:
+        """load_or_build en segundo plano; False si ya hay una construcción en curso
+
+        El estado pasa a "building" antes de lanzar el hilo, así dos pedidos
+        simultáneos no inician dos construcciones.
+        """
+        with self.state_lock:
+            if self.status.get("state") == "building":
+                return False
+            self.status = {"state": "building", "started_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        threading.Thread(target=self.load_or_build, args=(rebuild,), daemon=True, name="similar-index").start()
+        return True
+
+    def start_update(self):
+        """Actualizar en segundo plano (después de una importación)"""
+        threading.Thread(target=self._safe_update, daemon=True, name="similar-index").start()
+
+    def _safe_update(self):
+        try:
+            self.update()
+        except Exception as e:
+            logger.error(f"Error actualizando el índice de casos similares: {e}")
+            self.status = {**self.status, "last_error": str(e)}
+
+    # === CONSULTA ===
+
+    def query(self, descripcion: str, evidencias, k: int = 10,
+              tipo_caso: Optional[str] = None) -> List[Tuple[int, float]]:
+        """(id, similitud) de los k casos más parecidos, de mayor a menor"""
+        from prediction_features import TIPOS_CASO
+
+        pipeline, segments = self.snapshot
+        q = pipeline.transform_text({"descripcion": [descripcion], "evidencias": [evidencias]})
+        if q.nnz == 0:
+            return []
+        terms, weights = q.indices, q.data
+        tipo_code = TIPOS_CASO.index(tipo_caso) if tipo_caso in TIPOS_CASO else None
+
+        candidate_ids, candidate_scores = [], []
+        for segment in segments:
+            M = segment.matrix
+            starts, ends = M.indptr[terms], M.indptr[terms + 1]
+            lengths = ends - starts
+            if lengths.sum() == 0:
+                continue
+            # Filas y contribuciones de las columnas de la consulta (producto punto disperso)
+            rows = np.concatenate([M.indices[s:e] for s, e in zip(starts, ends)])
+            contributions = np.concatenate([M.data[s:e] for s, e in zip(starts, ends)]) * np.repeat(weights, lengths)
+            if tipo_code is not None:
+                keep = segment.tipos[rows] == tipo_code
+                rows, contributions = rows[keep], contributions[keep]
+                if rows.size == 0:
+                    continue
+
+            if rows.size * 8 > segment.n_rows:
+                scores = np.bincount(rows, weights=contributions, minlength=segment.n_rows)
+                local_rows = np.flatnonzero(scores)
+                scores = scores[local_rows]
+            else:
+                local_rows, inverse = np.unique(rows, return_inverse=True)
+                scores = np.bincount(inverse, weights=contributions)
+
+            top = np.argpartition(-scores, k - 1)[:k] if scores.size > k else np.arange(scores.size)
+            candidate_ids.append(segment.ids[local_rows[top]])
+            candidate_scores.append(scores[top])
+
+        if not candidate_ids:
+            return []
+        ids, scores = np.concatenate(candidate_ids), np.concatenate(candidate_scores)
+        order = np.lexsort((ids, -scores))[:k]
+        return [(int(ids[i]), float(scores[i])) for i in order]
+
+    def fetch_cases(self, matches: List[Tuple[int, float]]) -> List[Dict]:
+        """Datos de los casos encontrados, en el orden de similitud"""
+        if not matches:
+            return []
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT id, tipo_caso, descripcion, monto_disputa, complejidad, evidencias,
+                   resultado, tiempo_resolucion, fecha_caso
+            FROM historical_cases
+            WHERE id IN (SELECT value FROM json_each(?))
+        ''', (json.dumps([case_id for case_id, _ in matches]),)).fetchall()
+        conn.close()
+
+        columns = ["id", "tipo_caso", "descripcion", "monto_disputa", "complejidad", "evidencias",
+                   "resultado", "tiempo_resolucion", "fecha_caso"]
+        by_id = {row[0]: dict(zip(columns, row)) for row in rows}
+        return [{**by_id[case_id], "similitud": round(score, 4)} for case_id, score in matches if case_id in by_id]
+
+    def info(self) -> Dict:
+        return {
+            **self.status,
+            "ready": self.ready,
+            "cases": self.n_cases,
+            "segments": len(self.segments),
+            "last_id": self.last_id,
+            "vocabulary": len(self.pipeline.vectorizer.vocabulary_) if self.pipeline else 0
+        }
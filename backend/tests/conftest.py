@@ -0,0 +1,79 @@
+"""
+Configuración común de las pruebas
+==================================
+Los módulos del backend se importan por nombre (from prediction_jobs import ...),
+como cuando se ejecutan desde backend/.
+
+predict_api y webhook_integrations leen sus rutas al importarse: aquí se
+apuntan a una carpeta temporal para no tocar las bases del directorio de
+trabajo, y cada prueba usa además su propia base en tmp_path.
+
+Uso (desde la raíz del repositorio):
+    python -m pytest -q backend/tests
+"""
+
+import atexit
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+TEST_DATA_DIR = tempfile.mkdtemp(prefix="abogado_ia_tests_")
+atexit.register(shutil.rmtree, TEST_DATA_DIR, ignore_errors=True)
+for name, path in {
+    "PREDICTIONS_DB_PATH": "predictions.db",
+    "MODEL_PATH": "models",
+    "SIMILAR_INDEX_PATH": "similar_index",
+    "FEATURE_CACHE_PATH": "feature_cache",
+    "WEBHOOK_DB_PATH": "webhook_conversations.db",
+}.items():
+    os.environ[name] = os.path.join(TEST_DATA_DIR, path)
+
+@pytest.fixture(scope="session")
+def case_profiles():
+    from generate_synthetic_cases import load_case_profiles
+    return load_case_profiles()
+
+@pytest.fixture
+def case_frame(case_profiles):
+    """Casos sintéticos reproducibles: case_frame(n, seed) -> DataFrame con resultado"""
+    from generate_synthetic_cases import generate_cases
+
+    def make(n: int, seed: int = 0) -> pd.DataFrame:
+        cases = generate_cases(n, np.random.default_rng(seed), case_profiles)
+        columns = ["tipo_caso", "descripcion", "monto_disputa", "complejidad", "evidencias", "resultado"]
+        return pd.DataFrame({column: cases[column] for column in columns})
+    return make
+
+@pytest.fixture
+def predictions_db(tmp_path, monkeypatch):
+    """Base de predicciones vacía con el esquema de predict_api, usada por prediction_system"""
+    import predict_api
+
+    path = str(tmp_path / "predictions.db")
+    monkeypatch.setattr(predict_api, "PREDICTIONS_DB_PATH", path)
+    # init_database no repite el trabajo una vez hecho
+    monkeypatch.setattr(predict_api.prediction_system, "database_ready", False)
+    predict_api.prediction_system.init_database()
+    return path
+
+@pytest.fixture
+def synthetic_db(predictions_db, case_profiles):
+    """predictions_db con casos históricos y predicciones (parte resueltas) sintéticos"""
+    from generate_synthetic_cases import generate_historical, generate_predictions
+
+    rng = np.random.default_rng(42)
+    conn = sqlite3.connect(predictions_db)
+    generate_historical(conn, 1500, rng, case_profiles, 365)
+    generate_predictions(conn, 300, rng, case_profiles, 365, 0.5)
+    conn.close()
+    return predictions_db
@@ -0,0 +1,52 @@
+"""Base que usan los comandos del benchmark"""
+
+import json
+import sys
+
+import pytest
+
+import benchmark_prediction
+
+def empty_workdir(tmp_path, monkeypatch):
+    workdir = tmp_path / "trabajo"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    return workdir
+
+def run_benchmark(monkeypatch, capsys, *argv):
+    monkeypatch.setattr(sys, "argv", ["benchmark_prediction.py", *argv])
+    benchmark_prediction.main()
+    return json.loads(capsys.readouterr().out)
+
+def test_features_reads_the_given_database(synthetic_db, tmp_path, monkeypatch, capsys):
+    # Otra base en PREDICTIONS_DB_PATH y el directorio de trabajo vacío: se usa --db
+    monkeypatch.setenv("PREDICTIONS_DB_PATH", str(tmp_path / "otra.db"))
+    workdir = empty_workdir(tmp_path, monkeypatch)
+
+    report = run_benchmark(monkeypatch, capsys, "features", "--rows", "300", "--chunk-rows", "100",
+                           "--max-features", "50", "--db", synthetic_db)
+    assert report["rows"] == 300
+    assert report["nnz"] > 0
+    assert not (tmp_path / "otra.db").exists()
+    assert not (workdir / "predictions.db").exists()
+
+def test_database_defaults_to_the_environment(synthetic_db, tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("PREDICTIONS_DB_PATH", synthetic_db)
+    workdir = empty_workdir(tmp_path, monkeypatch)
+
+    report = run_benchmark(monkeypatch, capsys, "evaluate", "--max-rows", "400", "--latency-cases", "5",
+                           "--warmup", "1", "--backend", "linear")
+    assert report["db"] == synthetic_db
+    assert report["rows"]["train"] + report["rows"]["test"] == 400
+    assert not (workdir / "predictions.db").exists()
+
+    cases = benchmark_prediction.load_benchmark_cases(synthetic_db, 3)
+    assert [case.tipo_caso for case in cases]
+
+def test_empty_database_is_reported(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("PREDICTIONS_DB_PATH", str(tmp_path / "vacia.db"))
+    empty_workdir(tmp_path, monkeypatch)
+    with pytest.raises(SystemExit, match="No hay casos en historical_cases"):
+        run_benchmark(monkeypatch, capsys, "features", "--rows", "10")
+    # Sin los casos de ejemplo de predict_api
+    assert (tmp_path / "vacia.db").exists()
@@ -0,0 +1,103 @@
+"""Reutilización de la caché de características frente a la lectura completa de la base"""
+
+import sqlite3
+
+import numpy as np
+import pytest
+import scipy.sparse as sp
+
+from feature_cache import FeatureCache
+from model_registry import ModelRegistry
+from model_training import iter_training_chunks, train_model_version, training_bounds
+from prediction_features import CaseFeaturePipeline
+
+CHUNK_ROWS = 400
+
+def bounds_of(db_path: str):
+    conn = sqlite3.connect(db_path)
+    bounds = training_bounds(conn)
+    conn.close()
+    return bounds
+
+def historical_rows(db_path: str) -> int:
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT COUNT(*) FROM historical_cases').fetchone()[0]
+    conn.close()
+    return rows
+
+def full_read_matrix(db_path: str, text_featurizer: str):
+    """Matriz y etiquetas como en train_model_version sin caché"""
+    bounds = bounds_of(db_path)
+    pipeline = CaseFeaturePipeline(max_features=300, text_featurizer=text_featurizer)
+    pipeline.fit_chunks(iter_training_chunks(db_path, bounds, CHUNK_ROWS))
+    chunks = list(iter_training_chunks(db_path, bounds, CHUNK_ROWS))
+    X = sp.vstack(pipeline.transform_chunks(chunks), format="csr")
+    return X, np.concatenate([chunk["resultado"].to_numpy() for chunk in chunks])
+
+def cached_matrix(cache_dir: str, db_path: str, text_featurizer: str):
+    pipeline = CaseFeaturePipeline(max_features=300, text_featurizer=text_featurizer)
+    return FeatureCache(cache_dir, pipeline).training_matrix(db_path, bounds_of(db_path), CHUNK_ROWS)
+
+def assert_same_matrix(cached, expected):
+    X, y, _ = cached
+    X_expected, y_expected = expected
+    assert X.shape == X_expected.shape
+    np.testing.assert_allclose(X.toarray(), X_expected.toarray(), rtol=0, atol=1e-6)
+    assert list(y) == list(y_expected)
+
+def add_historical(db_path: str, case_profiles, n: int, seed: int):
+    from generate_synthetic_cases import generate_historical
+
+    conn = sqlite3.connect(db_path)
+    generate_historical(conn, n, np.random.default_rng(seed), case_profiles, 30)
+    conn.close()
+
+@pytest.mark.parametrize("text_featurizer", ["tfidf", "hashing"])
+def test_cache_reuses_featurized_cases(synthetic_db, case_profiles, tmp_path, text_featurizer):
+    cache_dir = str(tmp_path / "feature_cache")
+    rows = historical_rows(synthetic_db)
+
+    first = cached_matrix(cache_dir, synthetic_db, text_featurizer)
+    assert first[2]["rebuilt"]
+    assert (first[2]["cached_rows"], first[2]["new_rows"]) == (0, rows)
+    assert first[2]["feedback_rows"] > 0
+    assert_same_matrix(first, full_read_matrix(synthetic_db, text_featurizer))
+
+    # Sin casos nuevos no se featuriza ningún caso histórico
+    second = cached_matrix(cache_dir, synthetic_db, text_featurizer)
+    assert not second[2]["rebuilt"]
+    assert (second[2]["cached_rows"], second[2]["new_rows"]) == (rows, 0)
+    assert_same_matrix(second, full_read_matrix(synthetic_db, text_featurizer))
+
+    # Solo se featurizan los casos agregados, con el mismo resultado que releer todo
+    add_historical(synthetic_db, case_profiles, 250, seed=3)
+    third = cached_matrix(cache_dir, synthetic_db, text_featurizer)
+    assert not third[2]["rebuilt"]
+    assert (third[2]["cached_rows"], third[2]["new_rows"]) == (rows, 250)
+    assert_same_matrix(third, full_read_matrix(synthetic_db, text_featurizer))
+
+def test_deleted_case_rebuilds_the_cache(synthetic_db, tmp_path):
+    cache_dir = str(tmp_path / "feature_cache")
+    cached_matrix(cache_dir, synthetic_db, "tfidf")
+
+    conn = sqlite3.connect(synthetic_db)
+    conn.execute('DELETE FROM historical_cases WHERE id = 10')
+    conn.commit()
+    conn.close()
+
+    result = cached_matrix(cache_dir, synthetic_db, "tfidf")
+    assert result[2]["rebuilt"]
+    assert (result[2]["cached_rows"], result[2]["new_rows"]) == (0, historical_rows(synthetic_db))
+    assert_same_matrix(result, full_read_matrix(synthetic_db, "tfidf"))
+
+def test_training_records_cache_stats(synthetic_db, case_profiles, tmp_path):
+    models_dir, cache_dir = str(tmp_path / "models"), str(tmp_path / "feature_cache")
+    rows = historical_rows(synthetic_db)
+
+    train_model_version(synthetic_db, models_dir, CHUNK_ROWS, backend="linear", feature_cache_dir=cache_dir)
+    add_historical(synthetic_db, case_profiles, 50, seed=5)
+    version = train_model_version(synthetic_db, models_dir, CHUNK_ROWS, backend="linear", feature_cache_dir=cache_dir)
+
+    stats = ModelRegistry(models_dir).metadata(version)["feature_cache"]
+    assert not stats["rebuilt"]
+    assert (stats["cached_rows"], stats["new_rows"]) == (rows, 50)
@@ -0,0 +1,41 @@
+"""Generación reproducible de casos sintéticos en una base nueva"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+
+from conftest import BACKEND_DIR
+
+# Las fechas dependen de la hora de ejecución; el resto lo fija --seed
+COLUMNS = {
+    "historical_cases": "id, tipo_caso, descripcion, monto_disputa, complejidad, evidencias, resultado, tiempo_resolucion",
+    "case_predictions": "id, tipo_caso, descripcion, probabilidad_exito, resultado_real, resultado_seq",
+}
+
+def generate(tmp_path, name: str):
+    db_path = str(tmp_path / name)
+    script = ("import sys, generate_synthetic_cases; generate_synthetic_cases.main(); "
+              "assert 'predict_api' not in sys.modules, 'el generador importó predict_api'")
+    result = subprocess.run(
+        [sys.executable, "-c", script, "--historical", "500", "--predictions", "200", "--seed", "7", "--db", db_path],
+        cwd=str(tmp_path), env={**os.environ, "PYTHONPATH": BACKEND_DIR},
+        capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stderr
+
+    conn = sqlite3.connect(db_path)
+    contents = {table: conn.execute(f'SELECT {columns} FROM {table} ORDER BY id').fetchall()
+                for table, columns in COLUMNS.items()}
+    conn.close()
+    return contents
+
+def test_seed_determines_a_fresh_database(tmp_path):
+    first, second = generate(tmp_path, "a.db"), generate(tmp_path, "b.db")
+
+    # Solo los casos generados, sin los de ejemplo de predict_api
+    assert len(first["historical_cases"]) == 500
+    assert len(first["case_predictions"]) == 200
+    assert first == second
+    # Sin efectos secundarios de construir la aplicación (registro de modelos)
+    assert not os.path.exists(tmp_path / "models")
@@ -0,0 +1,47 @@
+"""Importación de casos históricos en una base nueva"""
+
+import json
+import sqlite3
+import sys
+
+import import_historical_cases
+from import_historical_cases import import_cases
+from prediction_db import init_predictions_db
+
+def test_fresh_database_holds_only_imported_cases(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "predictions.db")
+    source = tmp_path / "sentencias.jsonl"
+    records = [
+        {"tipo_caso": "Civil", "descripcion": "Cobro de deuda", "resultado": "favorable",
+         "monto_disputa": "1200", "evidencias": ["facturas", "contrato"]},
+        {"tipo_caso": "laboral", "descripcion": "Despido", "resultado": "parcial", "evidencias": "testigos, correo"},
+        {"tipo_caso": "penal", "descripcion": "", "resultado": "absolutoria"},
+        {"tipo_caso": "penal", "descripcion": "Estafa", "resultado": "condenatoria", "complejidad": "extrema"},
+    ]
+    source.write_text("\n".join(json.dumps(record) for record in records), encoding="utf-8")
+
+    monkeypatch.setattr(sys, "argv", ["import_historical_cases.py", str(source), "--db", db_path])
+    import_historical_cases.main()
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('SELECT tipo_caso, descripcion, monto_disputa, evidencias FROM historical_cases').fetchall()
+    predictions = conn.execute('SELECT COUNT(*) FROM case_predictions').fetchone()[0]
+    conn.close()
+    # Sin los casos de ejemplo que predict_api agrega a una base vacía
+    assert rows == [("civil", "Cobro de deuda", 1200.0, "facturas,contrato"), ("laboral", "Despido", 0.0, "testigos,correo")]
+    assert predictions == 0
+
+def test_rejected_records_are_counted(tmp_path):
+    db_path = str(tmp_path / "predictions.db")
+    init_predictions_db(db_path)
+    source = tmp_path / "sentencias.csv"
+    source.write_text("tipo_caso,descripcion,resultado,complejidad\n"
+                      "civil,Arrendamiento,favorable,alta\n"
+                      "civil,,favorable,media\n"
+                      "familia,Custodia,acuerdo,\n", encoding="utf-8")
+
+    stats = import_cases(db_path, str(source), chunk_size=1)
+
+    assert (stats["read"], stats["inserted"], stats["rejected"]) == (3, 2, 1)
+    assert stats["errors"][0]["registro"] == 2
+    assert stats["last_id"] - stats["first_id"] == 1
@@ -0,0 +1,55 @@
+"""Paridad de PackedForest y del modelo ONNX con predict_proba de sklearn en una muestra fija"""
+
+import numpy as np
+import pytest
+
+from model_backends import build_model
+from packed_forest import PackedForest
+from prediction_features import CaseFeaturePipeline
+
+@pytest.fixture
+def features(case_frame):
+    """Entrenamiento y muestra de comparación con el pipeline real (matrices dispersas)"""
+    train, sample = case_frame(1200, seed=7), case_frame(300, seed=8)
+    pipeline = CaseFeaturePipeline(max_features=300)
+    return pipeline.fit_transform(train), train["resultado"].to_numpy(), pipeline.transform(sample)
+
+@pytest.fixture
+def forest(features):
+    X, y, _ = features
+    model = build_model("forest")
+    model.set_params(n_estimators=20)
+    return model.fit(X, y)
+
+def test_packed_forest_matches_sklearn(forest, features, tmp_path):
+    _, _, X_sample = features
+    expected = forest.predict_proba(X_sample)
+
+    packed = PackedForest.from_forest(forest)
+    np.testing.assert_allclose(packed.predict_proba(X_sample), expected, rtol=0, atol=1e-12)
+    assert list(packed.predict(X_sample)) == list(forest.predict(X_sample))
+
+    # Cargado con mmap, como lo usa la API
+    packed.save(str(tmp_path / "forest"))
+    loaded = PackedForest.load(str(tmp_path / "forest"), mmap_mode="r")
+    np.testing.assert_allclose(loaded.predict_proba(X_sample), expected, rtol=0, atol=1e-12)
+
+@pytest.mark.parametrize("backend", ["forest", "gbt", "linear"])
+def test_onnx_matches_sklearn(backend, features, tmp_path):
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("skl2onnx")
+    from model_onnx import PARITY_TOLERANCE, OnnxModel, export_onnx
+
+    X, y, X_sample = features
+    model = build_model(backend)
+    if backend == "forest":
+        model.set_params(n_estimators=20)
+    model.fit(X, y)
+
+    path = str(tmp_path / "model.onnx")
+    export_onnx(model, X, path)
+    onnx_model = OnnxModel.load(path, model.classes_)
+
+    expected = model.predict_proba(X_sample)
+    np.testing.assert_allclose(onnx_model.predict_proba(X_sample), expected, rtol=0, atol=PARITY_TOLERANCE)
+    assert np.mean(onnx_model.predict(X_sample) == model.predict(X_sample)) >= 0.99
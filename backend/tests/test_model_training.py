@@ -0,0 +1,64 @@
+"""Entrenamiento desde la línea de comandos sobre una base sin migrar"""
+
+import json
+import sqlite3
+import subprocess
+import sys
+
+import numpy as np
+
+from conftest import BACKEND_DIR
+from model_registry import ModelRegistry
+
+def legacy_db(path: str, case_profiles):
+    """Base con el esquema anterior a resultado_seq y casos históricos"""
+    from generate_synthetic_cases import generate_historical
+
+    conn = sqlite3.connect(path)
+    conn.execute('''
+        CREATE TABLE case_predictions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, tipo_caso TEXT NOT NULL, descripcion TEXT NOT NULL,
+            monto_disputa REAL, complejidad TEXT, evidencias TEXT, probabilidad_exito REAL,
+            tipo_sentencia_probable TEXT, tiempo_estimado INTEGER,
+            fecha_prediccion DATETIME DEFAULT CURRENT_TIMESTAMP,
+            resultado_real TEXT DEFAULT NULL, fecha_resolucion DATETIME DEFAULT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE historical_cases (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, tipo_caso TEXT NOT NULL, descripcion TEXT NOT NULL,
+            monto_disputa REAL, complejidad TEXT, evidencias TEXT, resultado TEXT NOT NULL,
+            tiempo_resolucion INTEGER, fecha_caso DATETIME
+        )
+    ''')
+    conn.executemany('''
+        INSERT INTO case_predictions (tipo_caso, descripcion, complejidad, evidencias, resultado_real)
+        VALUES ('civil', 'Cobro de deuda', 'media', '[]', ?)
+    ''', [("favorable",), (None,), ("desfavorable",)])
+    conn.commit()
+    generate_historical(conn, 300, np.random.default_rng(0), case_profiles, 30)
+    conn.close()
+
+def test_cli_migrates_and_trains_without_the_api(tmp_path, case_profiles):
+    db_path, models_dir = str(tmp_path / "legacy.db"), str(tmp_path / "models")
+    legacy_db(db_path, case_profiles)
+
+    # En un proceso aparte para ver qué módulos importa el entrenamiento
+    script = ("import sys, model_training; model_training.main(); "
+              "assert 'predict_api' not in sys.modules, 'model_training importó predict_api'")
+    result = subprocess.run(
+        [sys.executable, "-c", script, "--db", db_path, "--models-dir", models_dir, "--backend", "linear"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stderr
+    version = json.loads(result.stdout.strip().splitlines()[-1])["version"]
+
+    metadata = ModelRegistry(models_dir).metadata(version)
+    # Los casos de ejemplo de predict_api no se agregan a la base de entrenamiento
+    assert metadata["training_rows"] == 300 + 2
+    assert metadata["feedback_watermark"] == 3
+
+    conn = sqlite3.connect(db_path)
+    sequences = conn.execute('SELECT id, resultado_seq FROM case_predictions ORDER BY id').fetchall()
+    conn.close()
+    assert sequences == [(1, 1), (2, None), (3, 3)]
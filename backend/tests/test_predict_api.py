@@ -0,0 +1,169 @@
+"""Agregados por trigger de /predictions/stats, historial paginado y resultados reales de predict_api"""
+
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import predict_api
+
+STATS_COLUMNS = "total, n_probabilidad, suma_probabilidad, n_tiempo, suma_tiempo"
+GROUP_BY_COLUMNS = '''COUNT(*), COUNT(probabilidad_exito), COALESCE(SUM(probabilidad_exito), 0),
+                      COUNT(tiempo_estimado), COALESCE(SUM(tiempo_estimado), 0)'''
+
+@pytest.fixture
+def client(predictions_db):
+    # Sin "with": el lifespan arrancaría el reentrenamiento en segundo plano
+    return TestClient(predict_api.app)
+
+def insert_predictions(db_path: str, rows):
+    """rows: (tipo_caso, probabilidad_exito, tiempo_estimado, fecha_prediccion)"""
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''
+        INSERT INTO case_predictions (tipo_caso, descripcion, probabilidad_exito, tiempo_estimado, fecha_prediccion)
+        VALUES (?, 'caso de prueba', ?, ?, ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+def sample_predictions():
+    rows = []
+    for i in range(90):
+        tipo = ("civil", "laboral", "penal")[i % 3]
+        probabilidad = None if i % 11 == 0 else 0.3 + (i % 7) / 10
+        tiempo = None if i % 13 == 0 else 30 + i
+        rows.append((tipo, probabilidad, tiempo, f"2026-0{1 + i % 3}-{1 + i % 5:02d} 09:00:00"))
+    return rows
+
+def assert_stats_match_group_by(db_path: str):
+    conn = sqlite3.connect(db_path)
+    by_type = conn.execute(f'SELECT tipo_caso, {STATS_COLUMNS} FROM prediction_stats WHERE total > 0 ORDER BY 1').fetchall()
+    daily = conn.execute(f'SELECT dia, tipo_caso, {STATS_COLUMNS} FROM prediction_stats_daily WHERE total > 0 ORDER BY 1, 2').fetchall()
+    expected_by_type = conn.execute(f'SELECT tipo_caso, {GROUP_BY_COLUMNS} FROM case_predictions GROUP BY 1 ORDER BY 1').fetchall()
+    expected_daily = conn.execute(f'''
+        SELECT date(fecha_prediccion), tipo_caso, {GROUP_BY_COLUMNS} FROM case_predictions GROUP BY 1, 2 ORDER BY 1, 2
+    ''').fetchall()
+    conn.close()
+
+    # Las sumas de los triggers se acumulan en otro orden que SUM()
+    def rounded(rows):
+        return [tuple(round(value, 6) if isinstance(value, float) else value for value in row) for row in rows]
+    assert rounded(by_type) == rounded(expected_by_type)
+    assert rounded(daily) == rounded(expected_daily)
+
+def test_trigger_aggregates_follow_inserts_updates_and_deletes(predictions_db, client):
+    insert_predictions(predictions_db, sample_predictions())
+    assert_stats_match_group_by(predictions_db)
+
+    conn = sqlite3.connect(predictions_db)
+    conn.execute("UPDATE case_predictions SET tipo_caso = 'familia', probabilidad_exito = NULL WHERE id % 4 = 0")
+    conn.execute("UPDATE case_predictions SET fecha_prediccion = '2026-05-20 12:00:00', tiempo_estimado = 7 WHERE id % 5 = 0")
+    conn.execute("DELETE FROM case_predictions WHERE tipo_caso = 'penal'")
+    conn.commit()
+    conn.close()
+    assert_stats_match_group_by(predictions_db)
+
+    stats = client.get("/predictions/stats", params={"bucket": "month", "desde": "2026-02-01"}).json()
+    conn = sqlite3.connect(predictions_db)
+    total = conn.execute('SELECT COUNT(*) FROM case_predictions').fetchone()[0]
+    since = conn.execute("SELECT COUNT(*) FROM case_predictions WHERE fecha_prediccion >= '2026-02-01'").fetchone()[0]
+    conn.close()
+    assert stats["total_predictions"] == total
+    assert "penal" not in [row["tipo_caso"] for row in stats["stats_by_type"]]
+    assert sum(row["total"] for row in stats["series"]) == since
+    assert {row["periodo"] for row in stats["series"]} == {"2026-02", "2026-03", "2026-05"}
+
+def test_aggregates_are_built_for_existing_predictions(predictions_db, monkeypatch):
+    insert_predictions(predictions_db, sample_predictions())
+    conn = sqlite3.connect(predictions_db)
+    for name in ("insert", "delete", "update"):
+        conn.execute(f'DROP TRIGGER trg_case_predictions_stats_{name}')
+    conn.execute('DELETE FROM prediction_stats')
+    conn.execute('DELETE FROM prediction_stats_daily')
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(predict_api.prediction_system, "database_ready", False)
+    predict_api.prediction_system.init_database()
+    assert_stats_match_group_by(predictions_db)
+
+def test_history_pages_have_no_duplicates_or_gaps(predictions_db, client):
+    # Muchas predicciones con la misma fecha: el desempate por id debe mantener el orden
+    insert_predictions(predictions_db, [("civil", 0.5, 30, f"2026-03-01 10:00:{i // 6:02d}") for i in range(47)])
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/predictions/history", params=params).json()
+        assert len(page["predictions"]) <= 10
+        seen.extend(prediction["id"] for prediction in page["predictions"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    conn = sqlite3.connect(predictions_db)
+    expected = [row[0] for row in conn.execute('SELECT id FROM case_predictions ORDER BY fecha_prediccion DESC, id DESC')]
+    conn.close()
+    assert seen == expected
+
+    assert client.get("/predictions/history", params={"cursor": "no-es-un-cursor"}).status_code == 400
+    assert client.get("/predictions/history", params={"limit": 0}).status_code == 400
+    assert client.get("/predictions/history", params={"limit": predict_api.MAX_HISTORY_LIMIT + 1}).status_code == 400
+
+def resolved(db_path: str):
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute('''
+        SELECT id, resultado_real, resultado_seq FROM case_predictions
+        WHERE resultado_real IS NOT NULL ORDER BY id
+    ''').fetchall()
+    conn.close()
+    return rows
+
+def test_outcomes_get_increasing_sequence_in_arrival_order(predictions_db, client):
+    from model_training import load_feedback_frame, training_bounds
+
+    insert_predictions(predictions_db, [("civil", 0.5, 30, f"2026-03-0{i} 10:00:00") for i in range(1, 6)])
+
+    response = client.post("/predictions/outcomes", json=[
+        {"id": 4, "resultado_real": "favorable"}, {"id": 1, "resultado_real": "parcial"},
+        {"id": 99, "resultado_real": "favorable"}
+    ])
+    assert response.json() == {"received": 3, "updated": 2, "not_found": 1}
+    assert resolved(predictions_db) == [(1, "parcial", 2), (4, "favorable", 1)]
+
+    conn = sqlite3.connect(predictions_db)
+    watermark = training_bounds(conn)[1]
+    conn.close()
+
+    # Un resultado tardío de una predicción vieja queda por encima de la marca de agua
+    client.post("/predictions/outcomes", json=[{"id": 2, "resultado_real": "desfavorable"}])
+    conn = sqlite3.connect(predictions_db)
+    feedback = load_feedback_frame(conn, watermark)
+    conn.close()
+    assert feedback["resultado_seq"].tolist() == [3]
+    assert feedback["resultado"].tolist() == ["desfavorable"]
+
+    assert client.post("/predictions/outcomes", json=[{"id": 3, "resultado_real": "ganado"}]).status_code == 400
+
+def test_failed_outcome_batch_rolls_back_and_releases_the_lock(predictions_db):
+    insert_predictions(predictions_db, [("civil", 0.5, 30, "2026-03-01 10:00:00")] * 3)
+    conn = sqlite3.connect(predictions_db)
+    conn.execute('''
+        CREATE TRIGGER reject_outcome BEFORE UPDATE OF resultado_real ON case_predictions
+        WHEN NEW.id = 3 BEGIN SELECT RAISE(ABORT, 'resultado rechazado'); END
+    ''')
+    conn.commit()
+    conn.close()
+
+    with pytest.raises(sqlite3.IntegrityError):
+        predict_api.prediction_system.record_outcomes([
+            predict_api.OutcomeRecord(id=1, resultado_real="favorable"),
+            predict_api.OutcomeRecord(id=3, resultado_real="favorable"),
+        ])
+
+    assert resolved(predictions_db) == []
+    # Sin transacción abierta: otro escritor obtiene el bloqueo sin esperar
+    other = sqlite3.connect(predictions_db, timeout=0)
+    other.execute('BEGIN IMMEDIATE')
+    other.rollback()
+    other.close()
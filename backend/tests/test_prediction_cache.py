@@ -0,0 +1,97 @@
+"""Claves, niveles e invalidación de la caché de predicciones"""
+
+import sqlite3
+
+import prediction_cache
+from prediction_cache import PredictionCache
+
+CASE = {"tipo_caso": "civil", "descripcion": "Incumplimiento  de contrato", "monto_disputa": 5000,
+        "complejidad": "media", "evidencias": ["contrato", "facturas"]}
+
+def entry(version: str, probabilidad: float = 0.5):
+    return {"probabilidad_exito": probabilidad, "modelo_version": version}
+
+def test_equivalent_cases_share_a_key():
+    key = PredictionCache.make_key(CASE, "modelo", "v1")
+    same = {**CASE, "tipo_caso": "CIVIL", "descripcion": " Incumplimiento de  contrato ",
+            "monto_disputa": 5000.0, "evidencias": ["facturas", "contrato"]}
+    assert PredictionCache.make_key(same, "modelo", "v1") == key
+
+    assert PredictionCache.make_key({**CASE, "monto_disputa": 5001}, "modelo", "v1") != key
+    assert PredictionCache.make_key(CASE, "reglas", "v1") != key
+    assert PredictionCache.make_key(CASE, "modelo", "v2") != key
+
+def test_lru_eviction_and_hit_rate():
+    cache = PredictionCache(max_entries=2)
+    cache.put_many({"a": entry("v1"), "b": entry("v1")})
+    assert cache.get("a") is not None
+    cache.put_many({"c": entry("v1")})
+
+    # "b" era la menos usada
+    assert cache.get("b") is None
+    metrics = cache.metrics()
+    assert metrics["size"] == 2
+    assert metrics["evictions"] == 1
+    assert (metrics["hits_memory"], metrics["misses"]) == (1, 1)
+    assert metrics["hit_rate"] == 0.5
+
+def test_sqlite_tier_is_shared_between_instances(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    PredictionCache(db_path=db_path).put_many({"a": entry("v1")})
+
+    other = PredictionCache(db_path=db_path)
+    assert other.get("a") == entry("v1")
+    assert other.get("a") == entry("v1")
+    metrics = other.metrics()
+    assert (metrics["hits_sqlite"], metrics["hits_memory"]) == (1, 1)
+
+def test_sqlite_entries_expire(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "cache.db")
+    PredictionCache(db_path=db_path, ttl_seconds=60).put_many({"a": entry("v1")})
+
+    now = prediction_cache.time.time()
+    monkeypatch.setattr(prediction_cache.time, "time", lambda: now + 61)
+    assert PredictionCache(db_path=db_path, ttl_seconds=60).get("a") is None
+
+def test_invalidate_drops_other_model_versions(tmp_path):
+    db_path = str(tmp_path / "cache.db")
+    cache = PredictionCache(db_path=db_path)
+    # Un solo lote con resultados de dos versiones y de reglas (el modelo no atendió un caso)
+    cache.put_many({"viejo": entry("v1"), "nuevo": entry("v2"), "reglas": entry(None)})
+    conn = sqlite3.connect(db_path)
+    stored = dict(conn.execute('SELECT cache_key, modelo_version FROM prediction_cache'))
+    conn.close()
+    assert stored == {"viejo": "v1", "nuevo": "v2", "reglas": "reglas"}
+
+    cache.invalidate(keep_version="v2")
+
+    # Nivel en memoria
+    assert set(cache.entries) == {"nuevo", "reglas"}
+    # Nivel SQLite, visto desde otro proceso
+    other = PredictionCache(db_path=db_path)
+    assert other.get("viejo") is None
+    assert other.get("nuevo") == entry("v2")
+    assert other.get("reglas") == entry(None)
+    assert cache.metrics()["invalidations"] == 1
+
+def test_repeated_submission_is_served_from_cache(predictions_db, monkeypatch):
+    import predict_api
+
+    system = predict_api.prediction_system
+    monkeypatch.setattr(system, "cache", PredictionCache(max_entries=16))
+    cases = [predict_api.CaseData(**CASE), predict_api.CaseData(**{**CASE, "complejidad": "alta"})]
+
+    first, _ = system.predict_and_save(cases, "reglas")
+    resubmitted = [predict_api.CaseData(**{**CASE, "evidencias": ["facturas", "contrato"]}), cases[1]]
+    second, computed = system.predict_cached(resubmitted, "reglas")
+    system.predict_and_save(resubmitted, "reglas")
+
+    assert computed == []
+    assert [p.model_dump() for p in second] == [p.model_dump() for p in first]
+    conn = sqlite3.connect(predictions_db)
+    assert conn.execute('SELECT COUNT(*) FROM case_predictions').fetchone()[0] == 2
+    conn.close()
+
+    # Un cambio real en el caso no se sirve de la caché
+    _, computed = system.predict_cached([predict_api.CaseData(**{**CASE, "monto_disputa": 9e6})], "reglas")
+    assert len(computed) == 1
@@ -0,0 +1,170 @@
+"""Pruebas de la cola de trabajos (prediction_jobs) sobre una base SQLite temporal"""
+
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+
+import prediction_jobs
+from prediction_jobs import JobManager, validate_callback_url
+
+def wait_for_state(manager: JobManager, job_id: str, states, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = manager.status(job_id)
+        if status["state"] in states:
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"El trabajo {job_id} no llegó a {states}: {manager.status(job_id)}")
+
+def doubling_handler(gate=None):
+    """Duplica n; las escrituras van a la tabla effects con el progreso del bloque"""
+    def handler(params, items):
+        if gate is not None:
+            gate(items)
+
+        def write(conn):
+            conn.executemany('INSERT INTO effects (n) VALUES (?)', [(item["n"],) for item in items])
+
+        return [{"doble": item["n"] * 2} for item in items], write
+    return handler
+
+def make_manager(db_path: str, handler, **kwargs) -> JobManager:
+    manager = JobManager(db_path, workers=1, chunk_size=2, **kwargs)
+    manager.register("doble", handler)
+    manager.start()
+    return manager
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE effects (n INTEGER NOT NULL)')
+    conn.commit()
+    conn.close()
+    return path
+
+def effects(db_path: str):
+    conn = sqlite3.connect(db_path)
+    rows = sorted(n for (n,) in conn.execute('SELECT n FROM effects'))
+    conn.close()
+    return rows
+
+def test_job_runs_to_completion(db_path):
+    manager = make_manager(db_path, doubling_handler())
+    try:
+        job = manager.submit("doble", [{"n": n} for n in range(5)], {})
+        assert job["state"] in ("queued", "running")
+
+        status = wait_for_state(manager, job["id"], prediction_jobs.FINISHED_STATES)
+        assert status["state"] == "completed"
+        assert status["processed"] == status["total"] == 5
+        assert status["progress"] == 1.0
+
+        results = manager.status(job["id"], include_results=True)["results"]
+        assert results == [{"doble": n * 2} for n in range(5)]
+        assert effects(db_path) == list(range(5))
+        assert [j["id"] for j in manager.list_jobs("completed")] == [job["id"]]
+    finally:
+        manager.shutdown()
+
+def test_cancel_queued_job(db_path):
+    release = threading.Event()
+    manager = make_manager(db_path, doubling_handler(lambda items: release.wait(10)))
+    try:
+        running = manager.submit("doble", [{"n": 1}], {})
+        queued = manager.submit("doble", [{"n": 2}], {})
+        wait_for_state(manager, running["id"], ("running",))
+
+        assert manager.cancel(queued["id"])["state"] == "cancelled"
+        release.set()
+        assert wait_for_state(manager, running["id"], prediction_jobs.FINISHED_STATES)["state"] == "completed"
+        assert manager.status(queued["id"])["processed"] == 0
+        assert effects(db_path) == [1]
+    finally:
+        release.set()
+        manager.shutdown()
+
+def test_unknown_kind_and_empty_jobs_are_rejected(db_path):
+    manager = make_manager(db_path, doubling_handler())
+    try:
+        with pytest.raises(ValueError):
+            manager.submit("otro", [{"n": 1}], {})
+        with pytest.raises(ValueError):
+            manager.submit("doble", [], {})
+    finally:
+        manager.shutdown()
+
+def test_stale_job_taken_over_runs_each_chunk_once(db_path, monkeypatch):
+    """Un proceso retoma un trabajo sin latido; el dueño anterior no confirma su bloque en curso"""
+    # Cualquier trabajo 'running' cuenta como huérfano
+    monkeypatch.setattr(prediction_jobs, "JOB_STALE_SECONDS", 0)
+    stalled, release = threading.Event(), threading.Event()
+
+    def stall_second_chunk(items):
+        if items[0]["n"] == 2:
+            stalled.set()
+            release.wait(10)
+
+    first = make_manager(db_path, doubling_handler(stall_second_chunk))
+    second = None
+    try:
+        job = first.submit("doble", [{"n": n} for n in range(5)], {})
+        assert stalled.wait(10)
+        assert first.status(job["id"])["processed"] == 2
+
+        second = make_manager(db_path, doubling_handler())
+        status = wait_for_state(second, job["id"], ("completed",))
+        release.set()
+        first.shutdown()
+        time.sleep(0.2)
+
+        assert status["processed"] == 5
+        status = second.status(job["id"], include_results=True)
+        assert status["processed"] == 5
+        assert status["results"] == [{"doble": n * 2} for n in range(5)]
+        assert effects(db_path) == list(range(5))
+    finally:
+        release.set()
+        first.shutdown()
+        if second is not None:
+            second.shutdown()
+
+def fake_resolver(address: str):
+    def getaddrinfo(host, port, *args, **kwargs):
+        return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (address, port))]
+    return getaddrinfo
+
+@pytest.mark.parametrize("address, allowed", [
+    ("93.184.216.34", True),
+    ("127.0.0.1", False),
+    ("10.1.2.3", False),
+    ("192.168.0.10", False),
+    ("169.254.169.254", False),
+    ("100.64.0.1", False),
+])
+def test_callback_url_must_resolve_to_public_address(monkeypatch, address, allowed):
+    monkeypatch.setattr(socket, "getaddrinfo", fake_resolver(address))
+    hosts = frozenset({"hooks.example.com"})
+    if allowed:
+        assert validate_callback_url("https://hooks.example.com/cb", hosts) == "https://hooks.example.com/cb"
+    else:
+        with pytest.raises(ValueError):
+            validate_callback_url("https://hooks.example.com/cb", hosts)
+
+def test_callback_url_host_must_be_allowed(monkeypatch, db_path):
+    monkeypatch.setattr(socket, "getaddrinfo", fake_resolver("93.184.216.34"))
+    with pytest.raises(ValueError):
+        validate_callback_url("https://otro.example.com/cb", frozenset({"hooks.example.com"}))
+    with pytest.raises(ValueError):
+        validate_callback_url("file:///etc/passwd", frozenset({"hooks.example.com"}))
+
+    # Sin lista de hosts permitidos no se aceptan callbacks
+    manager = make_manager(db_path, doubling_handler())
+    try:
+        with pytest.raises(ValueError):
+            manager.submit("doble", [{"n": 1}], {}, callback_url="https://hooks.example.com/cb")
+    finally:
+        manager.shutdown()
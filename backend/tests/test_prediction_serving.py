@@ -0,0 +1,172 @@
+"""Predicción con el modelo combinado con reglas, lotes, explicaciones, saturación del pool y disponibilidad"""
+
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import predict_api
+from model_registry import ModelRegistry
+from model_training import train_model_version
+from prediction_cache import PredictionCache
+from prediction_workers import PredictionPool
+
+# Civil, complejidad media, dos evidencias y monto bajo: ajuste de las reglas +0.1, sin recorte
+CASE = {"tipo_caso": "civil", "descripcion": "Demanda por incumplimiento de contrato de arrendamiento",
+        "monto_disputa": 5000, "complejidad": "media", "evidencias": ["contrato", "testigos"]}
+RULES_ADJUSTMENT = 0.1
+
+@pytest.fixture
+def system(predictions_db, monkeypatch):
+    system = predict_api.prediction_system
+    monkeypatch.setattr(system, "cache", PredictionCache(max_entries=64))
+    monkeypatch.setattr(system, "active_model", None)
+    # Sin recoger versiones del registro compartido de las pruebas
+    monkeypatch.setattr(system, "last_refresh_check", float("inf"))
+    return system
+
+def train_bundle(db_path: str, models_dir: str, backend: str):
+    version = train_model_version(db_path, models_dir, backend=backend)
+    return ModelRegistry(models_dir).load(version)
+
+@pytest.fixture(scope="module")
+def trained(tmp_path_factory, case_profiles):
+    """Bosque y modelo lineal entrenados una vez sobre casos sintéticos"""
+    from generate_synthetic_cases import generate_historical
+    from prediction_db import init_predictions_db
+
+    base = tmp_path_factory.mktemp("modelos")
+    db_path = str(base / "train.db")
+    init_predictions_db(db_path)
+    conn = sqlite3.connect(db_path)
+    generate_historical(conn, 1500, np.random.default_rng(3), case_profiles, 365)
+    conn.close()
+    return {backend: train_bundle(db_path, str(base / backend), backend) for backend in ("forest", "linear")}
+
+@pytest.fixture
+def forest(system, trained, monkeypatch):
+    monkeypatch.setattr(system, "active_model", trained["forest"])
+    return trained["forest"]
+
+@pytest.fixture
+def client(system):
+    # Sin "with": el lifespan arrancaría la carga del modelo y el reentrenamiento
+    return TestClient(predict_api.app)
+
+def saved_predictions(db_path: str) -> int:
+    conn = sqlite3.connect(db_path)
+    count = conn.execute('SELECT COUNT(*) FROM case_predictions').fetchone()[0]
+    conn.close()
+    return count
+
+def test_model_probability_is_blended_with_rules(system, forest):
+    case = predict_api.CaseData(**CASE)
+    model_probability = float(system.model_success_probabilities([case], forest)[0])
+    base = system.base_success_probability("civil")
+
+    result = system.predict_cases([case], "modelo")[0]
+    expected = (predict_api.MODEL_BLEND_WEIGHT * model_probability
+                + (1 - predict_api.MODEL_BLEND_WEIGHT) * base + RULES_ADJUSTMENT)
+    assert result.probabilidad_exito == round(expected, 2)
+    assert (result.modo_prediccion, result.modelo_version) == ("modelo", forest.version)
+
+    rules = system.predict_cases([case], "reglas")[0]
+    assert rules.probabilidad_exito == round(base + RULES_ADJUSTMENT, 2)
+    assert (rules.modo_prediccion, rules.modelo_version) == ("reglas", None)
+
+def test_model_mode_falls_back_to_rules_without_a_model(system):
+    result = system.predict_cases([predict_api.CaseData(**CASE)], "modelo")[0]
+    assert (result.modo_prediccion, result.modelo_version) == ("reglas", None)
+    assert result.probabilidad_exito == round(system.base_success_probability("civil") + RULES_ADJUSTMENT, 2)
+
+def test_batch_matches_single_predictions_in_order(predictions_db, forest, client):
+    cases = [CASE, {**CASE, "tipo_caso": "penal", "descripcion": "Hurto simple", "evidencias": []},
+             {**CASE, "complejidad": "alta", "monto_disputa": 250000}]
+    saved = saved_predictions(predictions_db)
+
+    response = client.post("/predict/batch", params={"modo": "modelo"}, json=cases)
+    assert response.status_code == 200
+    batch = response.json()
+    assert saved_predictions(predictions_db) == saved + len(cases)
+
+    singles = [client.post("/predict", params={"modo": "modelo"}, json=case).json() for case in cases]
+    assert batch == singles
+    assert len({result["probabilidad_exito"] for result in batch}) == len(cases)
+    # Los repetidos salen de la caché y no se vuelven a guardar
+    assert saved_predictions(predictions_db) == saved + len(cases)
+
+def test_batch_rejects_invalid_requests(system, client, monkeypatch):
+    assert client.post("/predict/batch", params={"modo": "otro"}, json=[CASE]).status_code == 400
+    monkeypatch.setattr(predict_api, "MAX_BATCH_SIZE", 2)
+    assert client.post("/predict/batch", json=[CASE] * 3).status_code == 413
+    assert client.post("/predict/batch", json=[]).json() == []
+
+def test_contributions_add_up_to_the_model_probability(system, forest, client):
+    response = client.post("/predict", params={"modo": "modelo", "explicar": True}, json=CASE)
+    explanation = response.json()["explicacion"]
+    model_probability = float(system.model_success_probabilities([predict_api.CaseData(**CASE)], forest)[0])
+
+    assert explanation["probabilidad_modelo"] == pytest.approx(model_probability, abs=1e-4)
+    assert explanation["peso_modelo"] == predict_api.MODEL_BLEND_WEIGHT
+    aportes = [item["aporte"] for item in explanation["aportes"]]
+    assert 0 < len(aportes) <= predict_api.EXPLANATION_TOP_FEATURES
+    assert [abs(a) for a in aportes] == sorted((abs(a) for a in aportes), reverse=True)
+
+    # Sin explicar no se devuelve aunque esté en la caché
+    assert client.post("/predict", params={"modo": "modelo"}, json=CASE).json()["explicacion"] is None
+
+def test_linear_model_has_no_explanation(system, trained, client, monkeypatch):
+    monkeypatch.setattr(system, "active_model", trained["linear"])
+    result = client.post("/predict", params={"modo": "modelo", "explicar": True}, json=CASE).json()
+    assert result["modelo_version"] == trained["linear"].version
+    assert result["explicacion"] is None
+
+def test_saturated_pool_returns_503(system, client, monkeypatch):
+    pool = PredictionPool("thread", workers=1, queue_size=0)
+    monkeypatch.setattr(predict_api, "prediction_pool", pool)
+    release = threading.Event()
+    predict_and_save = system.predict_and_save
+
+    def blocked(*args):
+        release.wait(30)
+        return predict_and_save(*args)
+    monkeypatch.setattr(system, "predict_and_save", blocked)
+
+    first = {}
+    thread = threading.Thread(target=lambda: first.update(response=client.post("/predict", json=CASE)))
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while pool.in_flight < 1:
+            assert time.monotonic() < deadline, "la primera predicción no llegó al pool"
+            time.sleep(0.01)
+
+        for response in (client.post("/predict", json=CASE), client.post("/predict/batch", json=[CASE])):
+            assert response.status_code == 503
+            assert response.headers["Retry-After"] == "1"
+    finally:
+        release.set()
+        thread.join(30)
+        pool.shutdown()
+
+    assert first["response"].status_code == 200
+    assert (pool.rejected, pool.completed, pool.in_flight) == (2, 1, 0)
+
+def test_readiness_waits_for_the_model(system, client, monkeypatch):
+    monkeypatch.setattr(system, "model_load_finished", threading.Event())
+
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["database_ready"] and not response.json()["model_load_finished"]
+    assert client.get("/health/live").status_code == 200
+
+    system.model_load_finished.set()
+    response = client.get("/health/ready")
+    assert response.status_code == 200
+    assert response.json()["ready"]
+
+    monkeypatch.setattr(system, "database_ready", False)
+    assert client.get("/health/ready").status_code == 503
@@ -0,0 +1,90 @@
+"""Búsqueda de casos similares y estados de la reconstrucción del índice"""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import predict_api
+from similar_cases import SimilarCaseIndex
+
+def wait_until_settled(index: SimilarCaseIndex, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while index.status.get("state") == "building":
+        assert time.monotonic() < deadline, "la construcción no terminó"
+        time.sleep(0.02)
+    return index.status
+
+@pytest.fixture
+def index(synthetic_db, tmp_path, monkeypatch):
+    index = SimilarCaseIndex(str(tmp_path / "similar_index"), synthetic_db)
+    monkeypatch.setattr(predict_api.prediction_system, "similar_index", index)
+    return index
+
+@pytest.fixture
+def client(index):
+    return TestClient(predict_api.app)
+
+def test_query_ranks_the_same_case_first(index, synthetic_db):
+    index.build(chunk_rows=500)
+    conn = sqlite3.connect(synthetic_db)
+    case_id, tipo, descripcion, evidencias = conn.execute(
+        'SELECT id, tipo_caso, descripcion, evidencias FROM historical_cases ORDER BY id DESC LIMIT 1'
+    ).fetchone()
+    conn.close()
+
+    matches = index.query(descripcion, evidencias, k=5, tipo_caso=tipo)
+    assert len(matches) == 5
+    assert matches[0][1] == pytest.approx(1.0)
+    assert case_id in [match_id for match_id, score in matches if score == pytest.approx(1.0)]
+    assert [score for _, score in matches] == sorted((score for _, score in matches), reverse=True)
+
+    cases = index.fetch_cases(matches)
+    assert {case["tipo_caso"] for case in cases} == {tipo}
+
+    # Se recarga de disco con el mismo resultado
+    reloaded = SimilarCaseIndex(index.index_dir, synthetic_db)
+    assert reloaded.load()
+    assert reloaded.query(descripcion, evidencias, k=5, tipo_caso=tipo) == matches
+
+def test_failed_rebuild_can_be_retried(index, client, monkeypatch):
+    index.build(chunk_rows=500)
+    calls = []
+    max_id = index._max_id
+
+    def locked_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return max_id()
+    monkeypatch.setattr(index, "_max_id", locked_once)
+
+    assert client.post("/similar_cases/rebuild").status_code == 202
+    status = wait_until_settled(index)
+    assert status == {"state": "failed", "error": "database is locked"}
+    # El índice anterior sigue atendiendo consultas
+    assert client.post("/similar_cases", json={"tipo_caso": "civil", "descripcion": "Cobro de deuda"}).status_code == 200
+
+    assert client.post("/similar_cases/rebuild").status_code == 202
+    assert wait_until_settled(index)["state"] == "ready"
+
+def test_concurrent_rebuild_requests_start_one_build(index, client, monkeypatch):
+    index.build(chunk_rows=500)
+    release, builds = threading.Event(), []
+    max_id = index._max_id
+
+    def blocked():
+        builds.append(1)
+        release.wait(30)
+        return max_id()
+    monkeypatch.setattr(index, "_max_id", blocked)
+
+    try:
+        responses = [client.post("/similar_cases/rebuild").status_code for _ in range(3)]
+    finally:
+        release.set()
+    assert responses == [202, 409, 409]
+    assert wait_until_settled(index)["state"] == "ready"
+    assert len(builds) == 1
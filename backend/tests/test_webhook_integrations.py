@@ -0,0 +1,153 @@
+"""Contadores por trigger, historial paginado y exportación de webhook_integrations"""
+
+import csv
+import io
+import json
+import sqlite3
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import webhook_integrations
+
+@pytest.fixture
+def webhook_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "webhook.db")
+    monkeypatch.setattr(webhook_integrations, "WEBHOOK_DB_PATH", path)
+    webhook_integrations.init_webhook_db()
+    return path
+
+@pytest.fixture
+def client(webhook_db):
+    return TestClient(webhook_integrations.app)
+
+def insert_messages(db_path: str, rows):
+    """rows: (platform, sender_id, message, timestamp)"""
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''
+        INSERT INTO webhook_messages (platform, sender_id, message, response, timestamp)
+        VALUES (?, ?, ?, '', ?)
+    ''', rows)
+    conn.commit()
+    conn.close()
+
+def counters(db_path: str):
+    conn = sqlite3.connect(db_path)
+    result = {
+        "platform": conn.execute(
+            'SELECT platform, total_messages, unique_users FROM webhook_platform_stats ORDER BY platform'
+        ).fetchall(),
+        "daily": conn.execute(
+            'SELECT day, platform, total_messages, unique_users FROM webhook_daily_stats ORDER BY day, platform'
+        ).fetchall(),
+    }
+    expected = {
+        "platform": conn.execute('''
+            SELECT platform, COUNT(*), COUNT(DISTINCT sender_id) FROM webhook_messages
+            GROUP BY platform ORDER BY platform
+        ''').fetchall(),
+        "daily": conn.execute('''
+            SELECT DATE(timestamp), platform, COUNT(*), COUNT(DISTINCT sender_id) FROM webhook_messages
+            GROUP BY DATE(timestamp), platform ORDER BY 1, 2
+        ''').fetchall(),
+    }
+    conn.close()
+    return result, expected
+
+def sample_messages():
+    rows = []
+    for i in range(120):
+        platform = "whatsapp" if i % 3 else "messenger"
+        rows.append((platform, f"s{i % 7}", f"mensaje {i}", f"2026-03-{1 + i % 4:02d} 10:{i % 60:02d}:00"))
+    return rows
+
+def test_trigger_counters_match_group_by(webhook_db, client):
+    insert_messages(webhook_db, sample_messages())
+    webhook_integrations.save_webhook_message("whatsapp", "nuevo", "hola", "respuesta")
+
+    result, expected = counters(webhook_db)
+    assert result == expected
+
+    stats = client.get("/webhook/stats", params={"days": 100000}).json()
+    assert [(p["platform"], p["total_messages"], p["unique_users"]) for p in stats["platform_stats"]] \
+        == expected["platform"]
+    assert sum(d["total_messages"] for d in stats["daily_stats"]) == 121
+    assert stats["recent_messages"][0]["sender_id"] == "nuevo"
+
+def test_backfill_rebuilds_counters_for_existing_messages(webhook_db):
+    insert_messages(webhook_db, sample_messages())
+    conn = sqlite3.connect(webhook_db)
+    for table in ("webhook_platform_stats", "webhook_daily_stats", "webhook_senders", "webhook_daily_senders"):
+        conn.execute(f'DELETE FROM {table}')
+    conn.commit()
+    conn.close()
+
+    webhook_integrations.init_webhook_db()
+    result, expected = counters(webhook_db)
+    assert result == expected
+
+def sender_history(db_path: str, sender_id: str, descending: bool = True):
+    order = "DESC" if descending else "ASC"
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute(
+        f'SELECT id FROM webhook_messages WHERE sender_id = ? ORDER BY timestamp {order}, id {order}',
+        (sender_id,)
+    )]
+    conn.close()
+    return ids
+
+def test_history_pages_have_no_duplicates_or_gaps(webhook_db, client):
+    # Muchos mensajes con el mismo timestamp: el desempate por id debe mantener el orden
+    insert_messages(webhook_db, [("whatsapp", "s1", f"m{i}", f"2026-03-01 10:00:{i // 5:02d}") for i in range(57)]
+                    + [("messenger", "otro", "x", "2026-03-01 10:00:00")])
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 10, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/webhook/conversations/s1", params=params).json()
+        seen.extend(message["id"] for message in page["messages"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == sender_history(webhook_db, "s1")
+    assert client.get("/webhook/conversations/s1", params={"cursor": "no-es-un-cursor"}).status_code == 400
+    assert client.get("/webhook/conversations/s1", params={"limit": 0}).status_code == 400
+
+def test_export_streams_full_history_in_order(webhook_db, client):
+    insert_messages(webhook_db, [("whatsapp", "s1", f"m{i}", f"2026-03-01 10:{i // 3:02d}:00") for i in range(40)])
+    expected = sender_history(webhook_db, "s1", descending=False)
+
+    response = client.get("/webhook/conversations/s1/export")
+    assert response.status_code == 200
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == expected
+
+    response = client.get("/webhook/conversations/s1/export", params={"format": "csv"})
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0][0] == "id"
+    assert [int(row[0]) for row in rows[1:]] == expected
+
+def test_export_generator_can_move_between_threads(webhook_db):
+    """StreamingResponse puede pedir cada bloque desde un hilo distinto del threadpool"""
+    insert_messages(webhook_db, [("whatsapp", "s1", f"m{i}", f"2026-03-01 10:00:{i:02d}") for i in range(25)])
+    export = webhook_integrations.iter_conversation_export("s1", None, "ndjson", chunk_size=4)
+
+    chunks, errors = [], []
+
+    def next_chunk():
+        try:
+            chunks.append(next(export))
+        except StopIteration:
+            pass
+        except Exception as e:
+            errors.append(e)
+
+    for _ in range(8):
+        thread = threading.Thread(target=next_chunk)
+        thread.start()
+        thread.join()
+
+    assert errors == []
+    ids = [json.loads(line)["id"] for chunk in chunks for line in chunk.splitlines()]
+    assert ids == sender_history(webhook_db, "s1", descending=False)
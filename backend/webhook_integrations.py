@@ -10,19 +10,25 @@ Funcionalidades:
 - Verificación de tokens
 - Envío de respuestas automáticas
 - Logging de conversaciones
+- Estados de entrega y métricas de latencia
 """
 
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import requests
 import sqlite3
 import json
+import base64
+import csv
+import io
 import hmac
 import hashlib
 import os
+import time
 from datetime import datetime
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional
 import logging
 
 # Configurar logging
@@ -50,9 +56,16 @@ WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "test_verify_token")
 MESSENGER_PAGE_TOKEN = os.getenv("MESSENGER_PAGE_TOKEN", "")
 MESSENGER_VERIFY_TOKEN = os.getenv("MESSENGER_VERIFY_TOKEN", "test_verify_token")
 MESSENGER_APP_SECRET = os.getenv("MESSENGER_APP_SECRET", "")
+WHATSAPP_PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID", "YOUR_PHONE_NUMBER_ID")
+
+# Graph API (se puede apuntar a graph_api_stub.py para pruebas de carga)
+GRAPH_API_URL = os.getenv("GRAPH_API_URL", "https://graph.facebook.com/v17.0")
 
 # URL del chatbot local
-CHATBOT_URL = "http://localhost:8000/chat"
+CHATBOT_URL = os.getenv("CHATBOT_URL", "http://localhost:8000/chat")
+
+# Base de datos de conversaciones
+WEBHOOK_DB_PATH = os.getenv("WEBHOOK_DB_PATH", "webhook_conversations.db")
 
 # Modelos de datos
 class WhatsAppMessage(BaseModel):
@@ -65,7 +78,7 @@ class MessengerMessage(BaseModel):
 
 def init_webhook_db():
     """Inicializar base de datos para webhooks"""
-    conn = sqlite3.connect('webhook_conversations.db')
+    conn = sqlite3.connect(WEBHOOK_DB_PATH)
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -79,13 +92,173 @@ def init_webhook_db():
         )
     ''')
     
+    # Índice para los mensajes recientes del dashboard
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_webhook_messages_timestamp
+        ON webhook_messages (timestamp)
+    ''')
+    
+    # Índice para el historial por remitente (paginación keyset)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_webhook_messages_sender
+        ON webhook_messages (sender_id, timestamp)
+    ''')
+    
+    # Contadores por plataforma y por día, mantenidos en cada inserción
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_platform_stats (
+            platform TEXT PRIMARY KEY,
+            total_messages INTEGER NOT NULL DEFAULT 0,
+            unique_users INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_daily_stats (
+            day TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            total_messages INTEGER NOT NULL DEFAULT 0,
+            unique_users INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, platform)
+        )
+    ''')
+    
+    # Remitentes conocidos (global y por día) para contar usuarios únicos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_senders (
+            platform TEXT NOT NULL,
+            sender_id TEXT NOT NULL,
+            first_seen DATETIME,
+            PRIMARY KEY (platform, sender_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_daily_senders (
+            day TEXT NOT NULL,
+            platform TEXT NOT NULL,
+            sender_id TEXT NOT NULL,
+            PRIMARY KEY (day, platform, sender_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # El trigger actualiza los contadores dentro de la misma transacción del INSERT.
+    # El orden importa: el usuario se cuenta antes de registrarlo como conocido.
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_webhook_messages_stats
+        AFTER INSERT ON webhook_messages
+        BEGIN
+            INSERT INTO webhook_platform_stats (platform, total_messages, unique_users)
+            VALUES (NEW.platform, 0, 0)
+            ON CONFLICT (platform) DO NOTHING;
+            
+            UPDATE webhook_platform_stats
+            SET total_messages = total_messages + 1,
+                unique_users = unique_users + NOT EXISTS (
+                    SELECT 1 FROM webhook_senders
+                    WHERE platform = NEW.platform AND sender_id = NEW.sender_id
+                )
+            WHERE platform = NEW.platform;
+            
+            INSERT OR IGNORE INTO webhook_senders (platform, sender_id, first_seen)
+            VALUES (NEW.platform, NEW.sender_id, NEW.timestamp);
+            
+            INSERT INTO webhook_daily_stats (day, platform, total_messages, unique_users)
+            VALUES (DATE(NEW.timestamp), NEW.platform, 0, 0)
+            ON CONFLICT (day, platform) DO NOTHING;
+            
+            UPDATE webhook_daily_stats
+            SET total_messages = total_messages + 1,
+                unique_users = unique_users + NOT EXISTS (
+                    SELECT 1 FROM webhook_daily_senders
+                    WHERE day = DATE(NEW.timestamp)
+                      AND platform = NEW.platform AND sender_id = NEW.sender_id
+                )
+            WHERE day = DATE(NEW.timestamp) AND platform = NEW.platform;
+            
+            INSERT OR IGNORE INTO webhook_daily_senders (day, platform, sender_id)
+            VALUES (DATE(NEW.timestamp), NEW.platform, NEW.sender_id);
+        END
+    ''')
+    
+    # Mensajes enviados por nosotros y eventos de entrega reportados por la plataforma
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_outbound_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            webhook_message_id INTEGER,
+            platform TEXT NOT NULL,
+            recipient_id TEXT NOT NULL,
+            outbound_message_id TEXT UNIQUE,
+            inbound_at REAL,
+            sent_at REAL NOT NULL
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_webhook_outbound_sent_at
+        ON webhook_outbound_messages (sent_at)
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_message_statuses (
+            outbound_message_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            status_at REAL NOT NULL,
+            recipient_id TEXT,
+            error_code INTEGER,
+            error_title TEXT,
+            PRIMARY KEY (outbound_message_id, status)
+        ) WITHOUT ROWID
+    ''')
+    
+    backfill_webhook_stats(cursor)
+    
     conn.commit()
     conn.close()
 
-def save_webhook_message(platform: str, sender_id: str, message: str, response: str = ""):
-    """Guardar mensaje de webhook en la base de datos"""
+def backfill_webhook_stats(cursor):
+    """Poblar los contadores a partir de mensajes guardados antes de que existieran"""
+    cursor.execute('SELECT COUNT(*) FROM webhook_platform_stats')
+    if cursor.fetchone()[0] > 0:
+        return
+    
+    cursor.execute('SELECT COUNT(*) FROM webhook_messages')
+    if cursor.fetchone()[0] == 0:
+        return
+    
+    logger.info("Reconstruyendo contadores de webhooks a partir del histórico...")
+    
+    cursor.execute('''
+        INSERT OR IGNORE INTO webhook_senders (platform, sender_id, first_seen)
+        SELECT platform, sender_id, MIN(timestamp)
+        FROM webhook_messages
+        GROUP BY platform, sender_id
+    ''')
+    
+    cursor.execute('''
+        INSERT OR IGNORE INTO webhook_daily_senders (day, platform, sender_id)
+        SELECT DISTINCT DATE(timestamp), platform, sender_id
+        FROM webhook_messages
+    ''')
+    
+    cursor.execute('''
+        INSERT INTO webhook_platform_stats (platform, total_messages, unique_users)
+        SELECT platform, COUNT(*), COUNT(DISTINCT sender_id)
+        FROM webhook_messages
+        GROUP BY platform
+    ''')
+    
+    cursor.execute('''
+        INSERT INTO webhook_daily_stats (day, platform, total_messages, unique_users)
+        SELECT DATE(timestamp), platform, COUNT(*), COUNT(DISTINCT sender_id)
+        FROM webhook_messages
+        GROUP BY DATE(timestamp), platform
+    ''')
+
+def save_webhook_message(platform: str, sender_id: str, message: str, response: str = "") -> Optional[int]:
+    """Guardar mensaje de webhook en la base de datos y devolver su id"""
     try:
-        conn = sqlite3.connect('webhook_conversations.db')
+        conn = sqlite3.connect(WEBHOOK_DB_PATH)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -93,10 +266,86 @@ def save_webhook_message(platform: str, sender_id: str, message: str, response:
             VALUES (?, ?, ?, ?)
         ''', (platform, sender_id, message, response))
         
+        message_id = cursor.lastrowid
         conn.commit()
         conn.close()
+        return message_id
     except Exception as e:
         logger.error(f"Error guardando mensaje: {e}")
+        return None
+
+def save_outbound_message(webhook_message_id: Optional[int], platform: str, recipient_id: str,
+                          outbound_message_id: str, inbound_at: Optional[float], sent_at: float):
+    """Registrar una respuesta enviada para poder unirla con sus estados de entrega"""
+    try:
+        conn = sqlite3.connect(WEBHOOK_DB_PATH)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            INSERT OR IGNORE INTO webhook_outbound_messages
+            (webhook_message_id, platform, recipient_id, outbound_message_id, inbound_at, sent_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (webhook_message_id, platform, recipient_id, outbound_message_id, inbound_at, sent_at))
+        
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        logger.error(f"Error guardando mensaje saliente: {e}")
+
+def save_message_statuses(statuses: List[Dict]) -> int:
+    """Guardar en bloque los eventos de estado (sent, delivered, read, failed) de WhatsApp"""
+    rows = []
+    for status in statuses:
+        outbound_message_id = status.get("id")
+        status_name = status.get("status")
+        if not outbound_message_id or not status_name:
+            continue
+        
+        errors = status.get("errors") or [{}]
+        rows.append((
+            outbound_message_id,
+            status_name,
+            float(status.get("timestamp") or time.time()),
+            status.get("recipient_id"),
+            errors[0].get("code"),
+            errors[0].get("title")
+        ))
+    
+    if not rows:
+        return 0
+    
+    try:
+        conn = sqlite3.connect(WEBHOOK_DB_PATH)
+        cursor = conn.cursor()
+        
+        # WhatsApp puede reenviar el mismo evento; se conserva el primero
+        cursor.executemany('''
+            INSERT OR IGNORE INTO webhook_message_statuses
+            (outbound_message_id, status, status_at, recipient_id, error_code, error_title)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        
+        conn.commit()
+        conn.close()
+        return len(rows)
+    except Exception as e:
+        logger.error(f"Error guardando estados de mensajes: {e}")
+        return 0
+
+def percentiles(values: List[float], points=(50, 90, 95, 99)) -> Dict:
+    """Calcular percentiles (interpolación lineal) de una lista de valores"""
+    if not values:
+        return {"count": 0}
+    
+    ordered = sorted(values)
+    result = {"count": len(ordered), "avg": round(sum(ordered) / len(ordered), 3)}
+    for point in points:
+        rank = (len(ordered) - 1) * point / 100
+        lower = int(rank)
+        upper = min(lower + 1, len(ordered) - 1)
+        value = ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+        result[f"p{point}"] = round(value, 3)
+    return result
 
 async def get_chatbot_response(message: str) -> str:
     """Obtener respuesta del chatbot local"""
@@ -117,13 +366,13 @@ async def get_chatbot_response(message: str) -> str:
         logger.error(f"Error obteniendo respuesta del chatbot: {e}")
         return "Lo siento, hay un problema técnico. Contacta directamente con nosotros."
 
-def send_whatsapp_message(phone_number: str, message: str) -> bool:
-    """Enviar mensaje via WhatsApp Business Cloud API"""
+def send_whatsapp_message(phone_number: str, message: str) -> Optional[str]:
+    """Enviar mensaje via WhatsApp Business Cloud API y devolver el id del mensaje (wamid)"""
     if not WHATSAPP_TOKEN:
         logger.error("Token de WhatsApp no configurado")
-        return False
+        return None
     
-    url = f"https://graph.facebook.com/v17.0/YOUR_PHONE_NUMBER_ID/messages"
+    url = f"{GRAPH_API_URL}/{WHATSAPP_PHONE_NUMBER_ID}/messages"
     headers = {
         "Authorization": f"Bearer {WHATSAPP_TOKEN}",
         "Content-Type": "application/json"
@@ -139,19 +388,22 @@ def send_whatsapp_message(phone_number: str, message: str) -> bool:
     }
     
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        return response.status_code == 200
+        response = requests.post(url, headers=headers, json=payload, timeout=10)
+        if response.status_code != 200:
+            return None
+        messages = response.json().get("messages") or [{}]
+        return messages[0].get("id") or ""
     except Exception as e:
         logger.error(f"Error enviando WhatsApp: {e}")
-        return False
+        return None
 
-def send_messenger_message(sender_id: str, message: str) -> bool:
-    """Enviar mensaje via Facebook Messenger"""
+def send_messenger_message(sender_id: str, message: str) -> Optional[str]:
+    """Enviar mensaje via Facebook Messenger y devolver el id del mensaje (mid)"""
     if not MESSENGER_PAGE_TOKEN:
         logger.error("Token de Messenger no configurado")
-        return False
+        return None
     
-    url = f"https://graph.facebook.com/v17.0/me/messages"
+    url = f"{GRAPH_API_URL}/me/messages"
     headers = {
         "Content-Type": "application/json"
     }
@@ -163,11 +415,13 @@ def send_messenger_message(sender_id: str, message: str) -> bool:
     }
     
     try:
-        response = requests.post(url, json=payload)
-        return response.status_code == 200
+        response = requests.post(url, json=payload, timeout=10)
+        if response.status_code != 200:
+            return None
+        return response.json().get("message_id") or ""
     except Exception as e:
         logger.error(f"Error enviando Messenger: {e}")
-        return False
+        return None
 
 # === WEBHOOKS DE WHATSAPP ===
 
@@ -197,20 +451,30 @@ async def whatsapp_webhook(request: Request):
                     if change.get("field") == "messages":
                         value = change.get("value", {})
                         
+                        # Procesar estados de entrega de nuestras respuestas
+                        statuses = value.get("statuses", [])
+                        if statuses:
+                            saved = save_message_statuses(statuses)
+                            logger.info(f"Estados de WhatsApp registrados: {saved}")
+                        
                         # Procesar mensajes entrantes
                         for message in value.get("messages", []):
                             phone_number = message.get("from")
                             message_text = message.get("text", {}).get("body", "")
+                            inbound_at = float(message.get("timestamp") or time.time())
                             
                             if phone_number and message_text:
                                 # Obtener respuesta del chatbot
                                 response = await get_chatbot_response(message_text)
                                 
                                 # Guardar en base de datos
-                                save_webhook_message("whatsapp", phone_number, message_text, response)
+                                message_id = save_webhook_message("whatsapp", phone_number, message_text, response)
                                 
                                 # Enviar respuesta
-                                if send_whatsapp_message(phone_number, response):
+                                outbound_id = send_whatsapp_message(phone_number, response)
+                                if outbound_id is not None:
+                                    save_outbound_message(message_id, "whatsapp", phone_number,
+                                                          outbound_id or None, inbound_at, time.time())
                                     logger.info(f"Respuesta enviada a WhatsApp: {phone_number}")
                                 else:
                                     logger.error(f"Error enviando respuesta a WhatsApp: {phone_number}")
@@ -249,16 +513,21 @@ async def messenger_webhook(request: Request):
                     sender_id = messaging.get("sender", {}).get("id")
                     message = messaging.get("message", {})
                     message_text = message.get("text", "")
+                    # Messenger reporta el timestamp en milisegundos
+                    inbound_at = messaging.get("timestamp", time.time() * 1000) / 1000
                     
                     if sender_id and message_text:
                         # Obtener respuesta del chatbot
                         response = await get_chatbot_response(message_text)
                         
                         # Guardar en base de datos
-                        save_webhook_message("messenger", sender_id, message_text, response)
+                        message_id = save_webhook_message("messenger", sender_id, message_text, response)
                         
                         # Enviar respuesta
-                        if send_messenger_message(sender_id, response):
+                        outbound_id = send_messenger_message(sender_id, response)
+                        if outbound_id is not None:
+                            save_outbound_message(message_id, "messenger", sender_id,
+                                                  outbound_id or None, inbound_at, time.time())
                             logger.info(f"Respuesta enviada a Messenger: {sender_id}")
                         else:
                             logger.error(f"Error enviando respuesta a Messenger: {sender_id}")
@@ -272,23 +541,32 @@ async def messenger_webhook(request: Request):
 # === ENDPOINTS ADMINISTRATIVOS ===
 
 @app.get("/webhook/stats")
-async def get_webhook_stats():
+async def get_webhook_stats(days: int = 7):
     """Obtener estadísticas de conversaciones por webhook"""
     try:
-        conn = sqlite3.connect('webhook_conversations.db')
+        conn = sqlite3.connect(WEBHOOK_DB_PATH)
         cursor = conn.cursor()
         
-        # Estadísticas por plataforma
+        # Estadísticas por plataforma (contadores mantenidos por trigger)
         cursor.execute('''
-            SELECT platform, COUNT(*) as total_messages,
-                   COUNT(DISTINCT sender_id) as unique_users
-            FROM webhook_messages
-            GROUP BY platform
+            SELECT platform, total_messages, unique_users
+            FROM webhook_platform_stats
+            ORDER BY platform
         ''')
         
         platform_stats = cursor.fetchall()
         
-        # Mensajes recientes
+        # Estadísticas diarias de los últimos días
+        cursor.execute('''
+            SELECT day, platform, total_messages, unique_users
+            FROM webhook_daily_stats
+            WHERE day >= DATE('now', ?)
+            ORDER BY day DESC, platform
+        ''', (f"-{max(days, 0)} days",))
+        
+        daily_stats = cursor.fetchall()
+        
+        # Mensajes recientes (usa idx_webhook_messages_timestamp)
         cursor.execute('''
             SELECT platform, sender_id, message, response, timestamp
             FROM webhook_messages
@@ -305,6 +583,10 @@ async def get_webhook_stats():
                 {"platform": row[0], "total_messages": row[1], "unique_users": row[2]}
                 for row in platform_stats
             ],
+            "daily_stats": [
+                {"day": row[0], "platform": row[1], "total_messages": row[2], "unique_users": row[3]}
+                for row in daily_stats
+            ],
             "recent_messages": [
                 {
                     "platform": row[0],
@@ -321,6 +603,197 @@ async def get_webhook_stats():
         logger.error(f"Error obteniendo estadísticas: {e}")
         raise HTTPException(status_code=500, detail="Error obteniendo estadísticas")
 
+def encode_cursor(timestamp: str, message_id: int) -> str:
+    """Cursor opaco para paginación keyset sobre (timestamp, id)"""
+    return base64.urlsafe_b64encode(f"{timestamp}|{message_id}".encode()).decode()
+
+def decode_cursor(cursor: str):
+    """Decodificar un cursor generado por encode_cursor"""
+    try:
+        timestamp, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+        return timestamp, int(message_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def fetch_conversation_page(cursor, sender_id: str, limit: int, after=None,
+                            platform: Optional[str] = None, ascending: bool = False) -> List[tuple]:
+    """Leer una página del historial de un remitente usando idx_webhook_messages_sender"""
+    direction = "ASC" if ascending else "DESC"
+    comparison = ">" if ascending else "<"
+    conditions = ["sender_id = ?"]
+    params: List = [sender_id]
+    
+    if platform:
+        conditions.append("platform = ?")
+        params.append(platform)
+    if after:
+        conditions.append(f"(timestamp, id) {comparison} (?, ?)")
+        params.extend(after)
+    
+    cursor.execute(f'''
+        SELECT id, platform, sender_id, message, response, timestamp
+        FROM webhook_messages
+        WHERE {" AND ".join(conditions)}
+        ORDER BY timestamp {direction}, id {direction}
+        LIMIT ?
+    ''', (*params, limit))
+    
+    return cursor.fetchall()
+
+def message_row_to_dict(row: tuple) -> Dict:
+    return {
+        "id": row[0],
+        "platform": row[1],
+        "sender_id": row[2],
+        "message": row[3],
+        "response": row[4],
+        "timestamp": row[5]
+    }
+
+@app.get("/webhook/conversations/{sender_id}")
+async def get_conversation_history(sender_id: str, limit: int = 50, cursor: Optional[str] = None,
+                                   platform: Optional[str] = None):
+    """Historial de un remitente, del más reciente al más antiguo, paginado por cursor"""
+    if not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="limit debe estar entre 1 y 500")
+    after = decode_cursor(cursor) if cursor else None
+    
+    try:
+        conn = sqlite3.connect(WEBHOOK_DB_PATH)
+        rows = fetch_conversation_page(conn.cursor(), sender_id, limit + 1, after, platform)
+        conn.close()
+        
+        # Se lee una fila extra para saber si hay otra página
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        return {
+            "sender_id": sender_id,
+            "messages": [message_row_to_dict(row) for row in rows],
+            "next_cursor": encode_cursor(rows[-1][5], rows[-1][0]) if has_more else None
+        }
+        
+    except Exception as e:
+        logger.error(f"Error obteniendo historial de {sender_id}: {e}")
+        raise HTTPException(status_code=500, detail="Error obteniendo historial")
+
+def iter_conversation_export(sender_id: str, platform: Optional[str], export_format: str,
+                             chunk_size: int = 500) -> Iterator[str]:
+    """Generar el historial completo de un remitente en orden cronológico, por bloques"""
+    # StreamingResponse avanza el generador con hilos del threadpool que pueden cambiar
+    # entre bloques (y cerrarlo desde otro al desconectarse el cliente); el acceso es
+    # secuencial, así que basta con desactivar la verificación de hilo de sqlite3
+    conn = sqlite3.connect(WEBHOOK_DB_PATH, check_same_thread=False)
+    cursor = conn.cursor()
+    columns = ["id", "platform", "sender_id", "message", "response", "timestamp"]
+    
+    try:
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+        
+        after = None
+        while True:
+            rows = fetch_conversation_page(cursor, sender_id, chunk_size, after, platform, ascending=True)
+            if not rows:
+                break
+            
+            if export_format == "csv":
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+            else:
+                yield "".join(json.dumps(message_row_to_dict(row), ensure_ascii=False) + "\n" for row in rows)
+            
+            after = (rows[-1][5], rows[-1][0])
+        
+        if export_format == "csv" and buffer.tell():
+            yield buffer.getvalue()
+    finally:
+        conn.close()
+
+@app.get("/webhook/conversations/{sender_id}/export")
+async def export_conversation_history(sender_id: str, format: str = "ndjson", platform: Optional[str] = None):
+    """Exportar en streaming el historial completo de un remitente (ndjson o csv)"""
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="Formato no soportado. Use: ndjson o csv")
+    
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        iter_conversation_export(sender_id, platform, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="conversacion_{sender_id}.{format}"'}
+    )
+
+@app.get("/webhook/metrics/latency")
+async def get_latency_metrics(hours: int = 24):
+    """Percentiles de latencia por plataforma: entrante→respuesta y respuesta→entregado"""
+    try:
+        since = time.time() - hours * 3600
+        conn = sqlite3.connect(WEBHOOK_DB_PATH)
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT o.platform,
+                   o.sent_at - o.inbound_at,
+                   d.status_at - o.sent_at,
+                   r.status_at - o.sent_at
+            FROM webhook_outbound_messages o
+            LEFT JOIN webhook_message_statuses d
+                ON d.outbound_message_id = o.outbound_message_id AND d.status = 'delivered'
+            LEFT JOIN webhook_message_statuses r
+                ON r.outbound_message_id = o.outbound_message_id AND r.status = 'read'
+            WHERE o.sent_at >= ?
+        ''', (since,))
+        
+        latencies: Dict[str, Dict[str, List[float]]] = {}
+        for platform, inbound_to_reply, reply_to_delivered, reply_to_read in cursor.fetchall():
+            series = latencies.setdefault(platform, {
+                "inbound_to_reply": [], "reply_to_delivered": [], "reply_to_read": []
+            })
+            if inbound_to_reply is not None:
+                series["inbound_to_reply"].append(inbound_to_reply)
+            if reply_to_delivered is not None:
+                series["reply_to_delivered"].append(reply_to_delivered)
+            if reply_to_read is not None:
+                series["reply_to_read"].append(reply_to_read)
+        
+        # Conteo de estados de las respuestas enviadas en la ventana
+        cursor.execute('''
+            SELECT o.platform, s.status, COUNT(*)
+            FROM webhook_message_statuses s
+            JOIN webhook_outbound_messages o ON o.outbound_message_id = s.outbound_message_id
+            WHERE o.sent_at >= ?
+            GROUP BY o.platform, s.status
+        ''', (since,))
+        
+        status_counts: Dict[str, Dict[str, int]] = {}
+        for platform, status, count in cursor.fetchall():
+            status_counts.setdefault(platform, {})[status] = count
+        
+        conn.close()
+        
+        return {
+            "window_hours": hours,
+            "unit": "seconds",
+            "platforms": [
+                {
+                    "platform": platform,
+                    "inbound_to_reply": percentiles(series["inbound_to_reply"]),
+                    "reply_to_delivered": percentiles(series["reply_to_delivered"]),
+                    "reply_to_read": percentiles(series["reply_to_read"]),
+                    "status_counts": status_counts.get(platform, {})
+                }
+                for platform, series in sorted(latencies.items())
+            ]
+        }
+        
+    except Exception as e:
+        logger.error(f"Error obteniendo métricas de latencia: {e}")
+        raise HTTPException(status_code=500, detail="Error obteniendo métricas de latencia")
+
 @app.get("/health")
 async def health_check():
     """Verificar estado del servicio"""
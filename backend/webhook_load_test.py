@@ -0,0 +1,226 @@
+"""
+Generador de Carga para Webhooks
+================================
+Envía payloads realistas de WhatsApp y Facebook Messenger a
+webhook_integrations a una tasa objetivo (RPS) y reporta rendimiento.
+
+Funcionalidades:
+- Carga de lazo abierto: las solicitudes se programan a la tasa objetivo
+  aunque el servidor se atrase
+- Mezcla configurable de WhatsApp y Messenger
+- Throughput, latencias p50/p95/p99 medidas desde la hora programada y
+  conteo de errores por tipo
+- Reporte en JSON para comparar corridas
+
+Uso (con graph_api_stub.py y chatbot_offline.py en ejecución):
+    py webhook_load_test.py --url http://localhost:8002 --rps 50 --duration 30 --platform mixed
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+
+# Consultas típicas que llegan por redes sociales
+SAMPLE_MESSAGES = [
+    "Hola, buenos días",
+    "¿Qué servicios ofrecen?",
+    "¿Cuánto cuesta una consulta?",
+    "Necesito agendar una cita para la próxima semana",
+    "¿Cuál es la dirección del despacho?",
+    "Tengo una urgencia, me están desalojando",
+    "Me despidieron sin justa causa, ¿qué puedo hacer?",
+    "Quiero información sobre divorcio",
+    "¿Atienden casos penales?",
+    "¿Cuáles son los honorarios por representación laboral?",
+    "Gracias por la información",
+    "¿Tienen horarios los sábados?"
+]
+
+def whatsapp_payload(sender_id: str, text: str) -> Dict:
+    """Payload con la forma de WhatsApp Business Cloud API"""
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{
+            "id": "WHATSAPP_BUSINESS_ACCOUNT_ID",
+            "changes": [{
+                "field": "messages",
+                "value": {
+                    "messaging_product": "whatsapp",
+                    "metadata": {"display_phone_number": "15550000000", "phone_number_id": "PHONE_NUMBER_ID"},
+                    "contacts": [{"profile": {"name": "Cliente Prueba"}, "wa_id": sender_id}],
+                    "messages": [{
+                        "from": sender_id,
+                        "id": f"wamid.{uuid.uuid4().hex.upper()}",
+                        "timestamp": str(int(time.time())),
+                        "type": "text",
+                        "text": {"body": text}
+                    }]
+                }
+            }]
+        }]
+    }
+
+def messenger_payload(sender_id: str, text: str) -> Dict:
+    """Payload con la forma de Facebook Messenger"""
+    now_ms = int(time.time() * 1000)
+    return {
+        "object": "page",
+        "entry": [{
+            "id": "PAGE_ID",
+            "time": now_ms,
+            "messaging": [{
+                "sender": {"id": sender_id},
+                "recipient": {"id": "PAGE_ID"},
+                "timestamp": now_ms,
+                "message": {"mid": f"m_{uuid.uuid4().hex}", "text": text}
+            }]
+        }]
+    }
+
+def percentile(ordered: List[float], point: float) -> float:
+    """Percentil con interpolación lineal sobre una lista ordenada"""
+    if not ordered:
+        return 0.0
+    rank = (len(ordered) - 1) * point / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+class LoadTest:
+    """Ejecuta una prueba de carga de lazo abierto contra los webhooks"""
+
+    def __init__(self, url: str, rps: float, duration: float, platform: str,
+                 senders: int, concurrency: int, timeout: float):
+        self.url = url.rstrip("/")
+        self.rps = rps
+        self.duration = duration
+        self.platform = platform
+        self.senders = senders
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.outcomes = Counter()
+        self.lag_max = 0.0
+
+    def session(self) -> requests.Session:
+        # Una sesión por hilo para reutilizar conexiones
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def build_request(self, index: int):
+        platform = self.platform
+        if platform == "mixed":
+            platform = random.choice(["whatsapp", "messenger"])
+
+        text = random.choice(SAMPLE_MESSAGES)
+        if platform == "whatsapp":
+            sender_id = f"57300{random.randrange(self.senders):07d}"
+            return platform, whatsapp_payload(sender_id, text)
+        sender_id = f"{random.randrange(self.senders):016d}"
+        return platform, messenger_payload(sender_id, text)
+
+    def send(self, index: int, scheduled_at: float):
+        platform, payload = self.build_request(index)
+        started = time.perf_counter()
+        try:
+            response = self.session().post(f"{self.url}/webhook/{platform}", json=payload,
+                                           timeout=self.timeout)
+            outcome = str(response.status_code)
+        except requests.exceptions.Timeout:
+            outcome = "timeout"
+        except requests.exceptions.ConnectionError:
+            outcome = "connection_error"
+        except requests.exceptions.RequestException as e:
+            outcome = type(e).__name__
+        # Desde la hora programada y no desde el envío: si el generador se atrasa, esa
+        # espera también la sufre el cliente (evita la omisión coordinada)
+        elapsed_ms = (time.perf_counter() - scheduled_at) * 1000
+
+        with self.lock:
+            self.latencies.append(elapsed_ms)
+            self.outcomes[outcome] += 1
+            self.outcomes[f"{platform}_total"] += 1
+            self.lag_max = max(self.lag_max, started - scheduled_at)
+
+    def run(self) -> Dict:
+        total = int(self.rps * self.duration)
+        interval = 1.0 / self.rps
+        started = time.perf_counter()
+
+        futures = []
+        for index in range(total):
+            scheduled_at = started + index * interval
+            delay = scheduled_at - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(self.executor.submit(self.send, index, scheduled_at))
+
+        for future in futures:
+            future.result()
+        self.executor.shutdown()
+        elapsed = time.perf_counter() - started
+
+        return self.report(total, elapsed)
+
+    def report(self, total: int, elapsed: float) -> Dict:
+        ordered = sorted(self.latencies)
+        ok = self.outcomes.get("200", 0)
+        errors = {k: v for k, v in self.outcomes.items() if k != "200" and not k.endswith("_total")}
+        return {
+            "target_rps": self.rps,
+            "duration_seconds": round(elapsed, 2),
+            "requests": total,
+            "successful": ok,
+            "throughput_rps": round(total / elapsed, 2) if elapsed > 0 else 0,
+            "successful_rps": round(ok / elapsed, 2) if elapsed > 0 else 0,
+            "latency_ms": {
+                "p50": round(percentile(ordered, 50), 2),
+                "p95": round(percentile(ordered, 95), 2),
+                "p99": round(percentile(ordered, 99), 2),
+                "max": round(ordered[-1], 2) if ordered else 0.0
+            },
+            "errors": errors,
+            "by_platform": {k[:-6]: v for k, v in self.outcomes.items() if k.endswith("_total")},
+            "max_schedule_lag_ms": round(self.lag_max * 1000, 2)
+        }
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Prueba de carga de webhooks de WhatsApp y Messenger")
+    parser.add_argument("--url", default="http://localhost:8002", help="URL base de webhook_integrations")
+    parser.add_argument("--rps", type=float, default=20, help="Solicitudes por segundo objetivo")
+    parser.add_argument("--duration", type=float, default=30, help="Duración en segundos")
+    parser.add_argument("--platform", choices=["whatsapp", "messenger", "mixed"], default="mixed")
+    parser.add_argument("--senders", type=int, default=500, help="Cantidad de remitentes distintos simulados")
+    parser.add_argument("--concurrency", type=int, default=64, help="Máximo de solicitudes simultáneas")
+    parser.add_argument("--timeout", type=float, default=15)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Guardar el reporte en un archivo JSON")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    print(f"🚀 Enviando {args.rps} RPS durante {args.duration}s a {args.url} ({args.platform})")
+    report = LoadTest(args.url, args.rps, args.duration, args.platform,
+                      args.senders, args.concurrency, args.timeout).run()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Reporte guardado en: {args.output}")
+
+if __name__ == "__main__":
+    main()